@@ -0,0 +1,159 @@
+# analytics.py
+import json
+import os
+import secrets
+import shutil
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from scoring import DIMENSIONS
+from storage import iter_runs
+
+ANALYTICS_DIR = Path(os.getenv("AGENTEVAL_ANALYTICS_DIR", "runs/analytics"))
+WATERMARK_PATH = ANALYTICS_DIR / "_watermark.json"
+SCORE_COLUMNS = [f"score_{d}" for d in DIMENSIONS]
+PERCENTILES = (10, 50, 90)
+# bump when flatten_run's columns change: the next compact() rebuilds the dataset
+SCHEMA_VERSION = 2
+
+def _read_watermark() -> tuple[float, str] | None:
+    if not WATERMARK_PATH.exists():
+        return None
+    with open(WATERMARK_PATH, "r", encoding="utf-8") as f:
+        wm = json.load(f)
+    if wm.get("version") != SCHEMA_VERSION:
+        return None
+    return wm["ts"], wm["run_id"]
+
+def _write_watermark(ts: float, run_id: str) -> None:
+    tmp = WATERMARK_PATH.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"ts": ts, "run_id": run_id, "version": SCHEMA_VERSION}, f)
+    os.replace(tmp, WATERMARK_PATH)
+
+def flatten_run(run_id: str, ts: float, payload: dict) -> dict | None:
+    """One analytics row per scored run; other records (e.g. failed cells) are skipped.
+
+    `kind` tells single-shot runs ("single") from records whose scores mean
+    something else: "consistency" (a mean over N samples) and "episode" (a
+    multi-turn final answer). Aggregates never pool different kinds.
+    """
+    scores = payload.get("scores_100")
+    if not scores:
+        return None
+    row = {
+        "run_id": run_id,
+        "ts": ts,
+        "date": datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d"),
+        "kind": payload.get("kind") or "single",
+        "scenario_key": payload.get("scenario_key"),
+        "persona": payload.get("persona"),
+        "temperature": payload.get("temperature"),
+        "model": payload.get("model"),
+        "judge_model": payload.get("judge_model"),
+        "overall_100": payload.get("overall_100"),
+        "rank": payload.get("rank"),
+        "demo_mode_used": bool(payload.get("demo_mode_used")),
+    }
+    for d in DIMENSIONS:
+        row[f"score_{d}"] = scores.get(d)
+    return row
+
+def compact(batch: int = 50_000) -> int:
+    """Append runs saved since the last compaction to the date-partitioned Parquet dataset.
+
+    Existing part files are never rewritten. Each part is written under a
+    temporary name and renamed into place, and the (ts, run_id) watermark is
+    only advanced after that, so an interrupted compaction is re-done. Rows
+    it had already exported then appear in two parts; load_frame keeps one
+    row per run_id. Without a current-version watermark the dataset is
+    rebuilt from scratch.
+    """
+    ANALYTICS_DIR.mkdir(parents=True, exist_ok=True)
+    cursor = _read_watermark()
+    if cursor is None:
+        for part_dir in ANALYTICS_DIR.glob("date=*"):
+            shutil.rmtree(part_dir)
+    written = 0
+    rows, last = [], None
+
+    def flush():
+        nonlocal rows, written
+        if rows:
+            df = pd.DataFrame(rows)
+            stamp = f"{int(time.time())}-{secrets.token_hex(3)}"
+            for date, part in df.groupby("date", sort=False):
+                out = ANALYTICS_DIR / f"date={date}"
+                out.mkdir(exist_ok=True)
+                tmp = out / f".part-{stamp}.parquet.tmp"  # readers skip dot-files; the rename is atomic
+                part.drop(columns=["date"]).to_parquet(tmp, index=False)
+                os.replace(tmp, out / f"part-{stamp}.parquet")
+            written += len(rows)
+            rows = []
+        if last is not None:
+            _write_watermark(*last)
+
+    for run_id, ts, payload in iter_runs(after=cursor, text=False):
+        row = flatten_run(run_id, ts, payload)
+        if row is not None:
+            rows.append(row)
+        last = (ts, run_id)
+        if len(rows) >= batch:
+            flush()
+    flush()
+    return written
+
+def load_frame(columns: list[str] | None = None, since: str | None = None, until: str | None = None, **equals) -> pd.DataFrame:
+    """Read the compacted dataset, pruning date partitions and pushing filters down to Parquet.
+
+    `since`/`until` are YYYY-MM-DD dates (inclusive/exclusive); other keyword
+    arguments are equality filters, e.g. load_frame(persona="Ethics-First").
+    A run exported twice (by an interrupted compaction) is returned once.
+    """
+    if not ANALYTICS_DIR.exists() or not any(ANALYTICS_DIR.glob("date=*")):
+        return pd.DataFrame(columns=["run_id", "ts", "date", "kind", "scenario_key", "persona", "temperature", "overall_100", *SCORE_COLUMNS])
+    filters = [(k, "==", v) for k, v in equals.items() if v is not None]
+    if since:
+        filters.append(("date", ">=", since))
+    if until:
+        filters.append(("date", "<", until))
+    read = columns if columns is None or "run_id" in columns else [*columns, "run_id"]
+    df = pd.read_parquet(ANALYTICS_DIR, columns=read, filters=filters or None, engine="pyarrow")
+    df = df.drop_duplicates(subset="run_id", keep="last", ignore_index=True)
+    if read is not columns:
+        df = df.drop(columns=["run_id"])
+    if "date" in df.columns:
+        df["date"] = df["date"].astype(str)
+    return df
+
+def summarize(df: pd.DataFrame, by: str | list[str] = "persona", metrics: list[str] | None = None) -> pd.DataFrame:
+    """Per-group count, mean, variance and percentiles of overall_100 and every dimension score.
+
+    When `df` holds several record kinds, "kind" becomes the first group key.
+    """
+    metrics = metrics or ["overall_100", *SCORE_COLUMNS]
+    keys = [by] if isinstance(by, str) else list(by)
+    if df.empty:
+        return pd.DataFrame()
+    if "kind" in df.columns and "kind" not in keys and df["kind"].nunique() > 1:
+        keys = ["kind", *keys]
+
+    grouped = df.groupby(keys, observed=True, sort=True)[metrics]
+    out = grouped.agg(["count", "mean", "var"])
+    # one vectorised quantile pass for all groups × metrics
+    q = grouped.quantile(np.array(PERCENTILES) / 100.0).unstack(level=-1)
+    q.columns = pd.MultiIndex.from_tuples([(m, f"p{int(round(p * 100))}") for m, p in q.columns])
+    return pd.concat([out, q], axis=1).sort_index(axis=1, level=0, sort_remaining=False)
+
+def persona_summary(kind: str = "single", **filters) -> pd.DataFrame:
+    return summarize(load_frame(kind=kind, **filters), by="persona")
+
+def scenario_summary(kind: str = "single", **filters) -> pd.DataFrame:
+    return summarize(load_frame(kind=kind, **filters), by="scenario_key")
+
+if __name__ == "__main__":
+    print(f"Compacted {compact()} run(s) into {ANALYTICS_DIR}")
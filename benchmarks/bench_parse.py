@@ -0,0 +1,120 @@
+# benchmarks/bench_parse.py
+"""Judge-output parser microbenchmark: success rate and throughput, legacy vs current.
+
+    python -m benchmarks.bench_parse [--repeat 200] [--runs 0] [--save | --compare parse]
+
+The corpus is the demo scorecard, fake-judge scorecards and up to `--runs`
+judge outputs from the run store (re-serialised), each also mangled the ways real judge replies go wrong:
+markdown fences, surrounding prose, trailing commas, string / float scores,
+renamed keys and truncation.
+"""
+import argparse
+import json
+import random
+import re
+import time
+
+from prompts import DEMO_EVAL_JSON_TEXT
+from scoring import safe_parse_json
+from storage import query_runs, load_run
+
+from benchmarks.common import DEFAULT_TOLERANCE, report_and_check
+from benchmarks.fake_gemini import FakeGemini
+
+def legacy_parse(text: str) -> dict:
+    """The parser scoring.py shipped with before the single-pass rewrite, kept as the baseline."""
+    from scoring import DIMENSIONS
+    cleaned = text.strip()
+    if cleaned.startswith("```"):
+        cleaned = cleaned.strip("`")
+        cleaned = cleaned.replace("json", "", 1).strip()
+    start = cleaned.find("{")
+    end = cleaned.rfind("}")
+    if start == -1 or end == -1:
+        raise ValueError("No JSON object found.")
+    data = json.loads(cleaned[start:end + 1])
+    for d in DIMENSIONS:
+        if d not in data or "score" not in data[d] or "justification" not in data[d]:
+            raise ValueError(f"Missing keys for {d}.")
+        if not isinstance(data[d]["score"], int) or not (1 <= data[d]["score"] <= 5):
+            raise ValueError(f"Invalid score for {d}.")
+    if "overall_summary" not in data:
+        raise ValueError("Missing overall_summary.")
+    return data
+
+def _variants(text: str) -> dict:
+    data = json.loads(text)
+    first = next(iter(data))
+    return {
+        "clean": text,
+        "fenced": f"```json\n{text}\n```",
+        "prose": f"Sure! Here is my evaluation {{as requested}}:\n{text}\nLet me know if you need more detail.",
+        "trailing_commas": re.sub(r'(["\d])(\s*)}', r"\1,\2}", text),
+        "string_scores": json.dumps({k: ({**v, "score": str(v["score"])} if isinstance(v, dict) else v) for k, v in data.items()}),
+        "float_scores": json.dumps({k: ({**v, "score": float(v["score"])} if isinstance(v, dict) else v) for k, v in data.items()}),
+        "renamed_keys": text.replace(f'"{first}"', '"' + first.replace("_", " ").title() + '"', 1),
+        "truncated": text[: int(len(text) * 0.93)],
+    }
+
+def build_corpus(runs: int = 0, synthetic: int = 50) -> list[tuple[str, str]]:
+    """[(variant, text), ...] from the demo scorecard, fake-judge scorecards and saved judge outputs."""
+    sources = [json.dumps(json.loads(DEMO_EVAL_JSON_TEXT), indent=2)]
+    fake, rng = FakeGemini(), random.Random(0)
+    sources += [fake.reply(f"You are evaluating an AI agent. #{i}", rng) for i in range(synthetic)]
+    for row in (query_runs(limit=runs) if runs else []):
+        evaluation = load_run(row["run_id"]).get("evaluation")
+        if isinstance(evaluation, dict):
+            sources.append(json.dumps(evaluation, ensure_ascii=False, indent=2))
+    return [(name, text) for src in sources for name, text in _variants(src).items()]
+
+def bench(parse, corpus: list[tuple[str, str]], repeat: int) -> dict:
+    ok = {}
+    for name, text in corpus:
+        try:
+            parse(text)
+            ok[name] = ok.get(name, 0) + 1
+        except Exception:
+            ok.setdefault(name, 0)
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for _, text in corpus:
+            try:
+                parse(text)
+            except Exception:
+                pass
+    elapsed = time.perf_counter() - t0
+    per_variant = len(corpus) // len(ok)
+    return {
+        "parsed": sum(ok.values()),
+        "total": len(corpus),
+        "by_variant": {name: f"{n}/{per_variant}" for name, n in ok.items()},
+        "parses_per_s": round(repeat * len(corpus) / elapsed),
+        "mb_per_s": round(repeat * sum(len(t) for _, t in corpus) / elapsed / 1e6, 2),
+    }
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_parse")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=0, help="also add up to N saved runs from the run store (not reproducible across machines)")
+    parser.add_argument("--save", action="store_true", help="save the report as benchmarks/baselines/parse.json")
+    parser.add_argument("--compare", metavar="BASELINE", help="baseline name or path to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+    corpus = build_corpus(args.runs)
+    legacy = bench(legacy_parse, corpus, args.repeat)
+    current = bench(safe_parse_json, corpus, args.repeat)
+    report = {
+        "benchmark": "parse",
+        "corpus": len(corpus),
+        "legacy": legacy,
+        "current": current,
+        "metrics": {
+            "parses_per_s": current["parses_per_s"],
+            "parse_failed_rate": round(1 - current["parsed"] / current["total"], 3),
+            "legacy_parse_failed_rate": round(1 - legacy["parsed"] / legacy["total"], 3),
+        },
+    }
+    return report_and_check("parse", report, save=args.save, against=args.compare, tolerance=args.tolerance)
+
+if __name__ == "__main__":
+    raise SystemExit(main())
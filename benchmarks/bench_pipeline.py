@@ -0,0 +1,204 @@
+# benchmarks/bench_pipeline.py
+"""End-to-end pipeline benchmark against the local fake Gemini server.
+
+    python -m benchmarks.bench_pipeline                       # print a report
+    python -m benchmarks.bench_pipeline --save                # ... and store it as benchmarks/baselines/pipeline.json
+    python -m benchmarks.bench_pipeline --compare pipeline    # exit 1 if a metric regressed past --tolerance
+
+Three parts:
+  sweep    engine.run_sweep over scenario × persona × temperature × repeat cells:
+           throughput, p50/p95/p99 per-call and time-to-result latency, errors,
+           429 retries and judge re-asks
+  stages   CPU cost of each non-network stage: prompt formatting, judge-output
+           parsing (clean and mangled replies), scoring and save_run
+  storage  save_run write throughput, one writer and several threads
+
+Runs use a throwaway run store and no response cache, so nothing touches
+runs/ or spends quota.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import blobs
+import storage
+from gemini_client import generate_text
+from engine import agent_prompt, judge_prompt, build_cells, build_payload, run_sweep, score_evaluation
+from judging import parse_judge
+from prompts import DEFAULT_SCENARIOS
+from ratelimit import RateLimiter
+from scoring import ScorecardError, safe_parse_json
+from tracing import find_span
+
+from benchmarks.common import DEFAULT_TOLERANCE, percentiles, report_and_check, timed
+from benchmarks.fake_gemini import FakeGemini
+
+def _ms(seconds: float | None) -> float | None:
+    return None if seconds is None else round(seconds * 1000, 2)
+
+def bench_sweep(fake: FakeGemini, cells: list[dict], concurrency: int) -> dict:
+    arrivals = []
+
+    def on_result(res: dict) -> None:
+        arrivals.append(time.perf_counter() - started)
+
+    # generous quota: the limiter is here to retry the fake's 429s, not to pace
+    limiter = RateLimiter(rpm=1_000_000, tpm=1_000_000_000, base_delay=0.05, max_delay=1.0)
+    # build the pooled client outside the timed window, like a long-running worker
+    warm = fake.quota_rate, fake.error_rate
+    fake.quota_rate = fake.error_rate = 0.0
+    generate_text("warm-up", "warm-up", use_cache=False)
+    fake.quota_rate, fake.error_rate = warm
+    requests_before = fake.stats["requests"]
+    started = time.perf_counter()
+    results = asyncio.run(run_sweep(cells, concurrency=concurrency, on_result=on_result, limiter=limiter, save=True))
+    wall = time.perf_counter() - started
+
+    ok = [r for r in results if "error" not in r]
+    calls = {"agent": [], "judge": []}
+    for r in ok:
+        for stage in calls:
+            calls[stage].append(find_span(r.get("trace"), stage).get("latency_s"))
+    lat = {stage: {k: _ms(v) for k, v in percentiles(xs).items()} for stage, xs in calls.items()}
+    arrive = {k: _ms(v) for k, v in percentiles(arrivals).items()}
+    return {
+        "cells": len(cells),
+        "ok": len(ok),
+        "errors": len(results) - len(ok),
+        "wall_s": round(wall, 3),
+        "cells_per_s": round(len(ok) / wall, 2) if wall else None,
+        "http_requests": fake.stats["requests"] - requests_before,
+        "reasked": sum(1 for r in ok if find_span(r.get("trace"), "reask")),
+        "limiter": dict(limiter.stats),
+        "call_latency_ms": lat,
+        "time_to_result_ms": arrive,
+    }
+
+def bench_stages(fake: FakeGemini, n: int = 500) -> dict:
+    rng = random.Random(1)
+    scenario = next(iter(DEFAULT_SCENARIOS.values()))
+    response = fake.reply("agent", rng)
+    clean_fake = FakeGemini(malformed_rate=0.0)
+    mangled_fake = FakeGemini(malformed_rate=1.0, seed=2)
+    prompts = [judge_prompt(scenario, f"{response} {i}") for i in range(n)]
+    clean = [clean_fake.reply(p, rng) for p in prompts]
+    mangled = [mangled_fake.reply(p, rng) for p in prompts]
+
+    def parse_all(texts):
+        failed = 0
+        for t in texts:
+            try:
+                safe_parse_json(t)
+            except ScorecardError:
+                failed += 1
+        return failed
+
+    mangled_failed = parse_all(mangled)
+    # a re-ask answered by the fake: how many mangled replies end up usable
+    unrecovered = 0
+    for t in mangled:
+        try:
+            parse_judge(t, scenario, response, lambda u: clean_fake.reply(u, rng))
+        except ScorecardError:
+            unrecovered += 1
+
+    card = safe_parse_json(clean[0])
+    payload = build_payload({"scenario_key": "bench", "persona": "Balanced Leader", "temperature": 0.3}, scenario, response, card, None, None)
+    persona = payload["persona"]
+    return {
+        "format_us": round(timed(lambda: (agent_prompt(scenario, persona), judge_prompt(scenario, response)), repeat=n) * 1e6, 2),
+        "parse_clean_us": round(timed(parse_all, clean) / n * 1e6, 2),
+        "parse_mangled_us": round(timed(parse_all, mangled) / n * 1e6, 2),
+        "parse_mangled_failed_rate": round(mangled_failed / n, 3),
+        "reask_unrecovered_rate": round(unrecovered / n, 3),
+        "score_us": round(timed(score_evaluation, card, repeat=n) * 1e6, 2),
+        "persist_ms": round(timed(storage.save_run, payload, repeat=min(n, 200)) * 1000, 3),
+    }
+
+def bench_storage(n: int = 2000, threads: int = 8) -> dict:
+    payload = {
+        "scenario_key": "bench", "persona": "Balanced Leader", "temperature": 0.3, "overall_100": 80.0, "rank": "STRONG",
+        "agent_response": "x" * 2000, "evaluation": {"overall_summary": "y" * 200},
+    }
+    t0 = time.perf_counter()
+    for _ in range(n):
+        storage.save_run(payload)
+    single = time.perf_counter() - t0
+
+    per = n // threads
+    workers = [threading.Thread(target=lambda: [storage.save_run(payload) for _ in range(per)]) for _ in range(threads)]
+    t0 = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    multi = time.perf_counter() - t0
+    return {
+        "writes": n,
+        "threads": threads,
+        "writes_per_s": round(n / single, 1),
+        "threaded_writes_per_s": round(per * threads / multi, 1),
+    }
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_pipeline", description=__doc__.split("\n")[0])
+    parser.add_argument("--repeats", type=int, default=3, help="repeats per scenario × persona × temperature cell")
+    parser.add_argument("--temperatures", type=float, nargs="+", default=[0.3, 0.7])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.05, help="median fake call latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--quota-rate", type=float, default=0.02)
+    parser.add_argument("--malformed-rate", type=float, default=0.05)
+    parser.add_argument("--storage-writes", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--name", default="pipeline", help="baseline name")
+    parser.add_argument("--save", action="store_true", help="save the report as the baseline")
+    parser.add_argument("--compare", metavar="BASELINE", help="baseline name or path to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed fractional regression")
+    args = parser.parse_args(argv)
+
+    os.environ["AGENTEVAL_CACHE"] = "0"
+    os.environ.setdefault("GEMINI_API_KEY", "fake-benchmark-key")
+    tmp = tempfile.TemporaryDirectory(prefix="agenteval-bench-")
+    storage.DB_PATH = Path(tmp.name) / "runs.sqlite"  # before the first connection
+    blobs.BLOB_DIR = Path(tmp.name) / "blobs"
+
+    config = {k: getattr(args, k) for k in ("repeats", "temperatures", "concurrency", "latency", "jitter",
+                                            "error_rate", "quota_rate", "malformed_rate", "storage_writes", "seed")}
+    with FakeGemini(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, quota_rate=args.quota_rate,
+                    malformed_rate=args.malformed_rate, retry_delay=0.05, seed=args.seed) as fake:
+        fake.install()
+        cells = build_cells(temperatures=args.temperatures, repeats=args.repeats)
+        sweep = bench_sweep(fake, cells, args.concurrency)
+        sweep["fake"] = dict(fake.stats)
+        stages = bench_stages(fake)
+    store = bench_storage(args.storage_writes)
+
+    report = {
+        "benchmark": args.name,
+        "config": config,
+        "sweep": sweep,
+        "stages": stages,
+        "storage": store,
+        "metrics": {
+            "sweep_cells_per_s": sweep["cells_per_s"],
+            "sweep_error_rate": round(sweep["errors"] / sweep["cells"], 3),
+            "sweep_wall_s": sweep["wall_s"],
+            "agent_p95_ms": sweep["call_latency_ms"]["agent"]["p95"],
+            "judge_p95_ms": sweep["call_latency_ms"]["judge"]["p95"],
+            "time_to_result_p99_ms": sweep["time_to_result_ms"]["p99"],
+            **{f"stage_{k}": v for k, v in stages.items()},
+            "storage_writes_per_s": store["writes_per_s"],
+            "storage_threaded_writes_per_s": store["threaded_writes_per_s"],
+        },
+    }
+    return report_and_check(args.name, report, save=args.save, against=args.compare, tolerance=args.tolerance)
+
+if __name__ == "__main__":
+    raise SystemExit(main())
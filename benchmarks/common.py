@@ -0,0 +1,86 @@
+# benchmarks/common.py
+"""Shared helpers: percentiles and machine-readable baselines.
+
+A benchmark report carries a flat `metrics` dict. The metric name says which
+direction is better: `*_per_s` should go up; `*_s`, `*_ms`, `*_us` and `*_rate`
+should go down. Anything else is informational and never compared.
+"""
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+DEFAULT_TOLERANCE = 0.25
+
+def percentiles(values: list[float], ps=(50, 95, 99)) -> dict:
+    """Nearest-rank percentiles, e.g. {"p50": ..., "p95": ..., "p99": ...}; None when empty."""
+    xs = sorted(v for v in values if v is not None)
+    if not xs:
+        return {f"p{p}": None for p in ps}
+    return {f"p{p}": xs[min(len(xs) - 1, max(0, int(round(p / 100 * len(xs) + 0.5)) - 1))] for p in ps}
+
+def timed(fn, *args, repeat: int = 1, **kwargs) -> float:
+    """Mean seconds per call over `repeat` calls."""
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn(*args, **kwargs)
+    return (time.perf_counter() - t0) / repeat
+
+def environment() -> dict:
+    return {"python": sys.version.split()[0], "platform": platform.platform(), "machine": platform.machine()}
+
+def _direction(name: str) -> int:
+    """+1 if bigger is better, -1 if smaller is better, 0 if not compared."""
+    if name.endswith("_per_s"):
+        return 1
+    if name.endswith(("_s", "_ms", "_us", "_rate")):
+        return -1
+    return 0
+
+def save_baseline(name: str, report: dict, directory: Path = BASELINE_DIR) -> Path:
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{name}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({**report, "environment": environment(), "saved_at": int(time.time())}, f, indent=2, sort_keys=True)
+        f.write("\n")
+    return path
+
+def load_baseline(name_or_path: str, directory: Path = BASELINE_DIR) -> dict:
+    path = Path(name_or_path)
+    if not path.suffix:
+        path = directory / f"{name_or_path}.json"
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def compare(metrics: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list[dict]:
+    """Metrics that got worse than the baseline by more than `tolerance` (a fraction)."""
+    regressions = []
+    for name, base in (baseline.get("metrics") or {}).items():
+        new = metrics.get(name)
+        sign = _direction(name)
+        if not sign or not isinstance(base, (int, float)) or not isinstance(new, (int, float)):
+            continue
+        if base == 0:
+            worse = new < 0 if sign > 0 else new > 0
+            change = None
+        else:
+            change = (new - base) / abs(base)
+            worse = -sign * change > tolerance
+        if worse:
+            regressions.append({"metric": name, "baseline": base, "current": new, "change": None if change is None else round(change, 3)})
+    return regressions
+
+def report_and_check(name: str, report: dict, save: bool = False, against: str | None = None, tolerance: float = DEFAULT_TOLERANCE) -> int:
+    """Print the report, optionally save it as the baseline and/or compare to one; returns an exit code."""
+    code = 0
+    if against:
+        regressions = compare(report["metrics"], load_baseline(against), tolerance)
+        report["regressions"] = regressions
+        code = 1 if regressions else 0
+    print(json.dumps(report, indent=2))
+    if save:
+        path = save_baseline(name, {k: v for k, v in report.items() if k != "regressions"})
+        print(f"Saved baseline to {path}", file=sys.stderr)
+    return code
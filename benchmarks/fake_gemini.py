@@ -0,0 +1,230 @@
+# benchmarks/fake_gemini.py
+"""Local fake of the Gemini REST API for benchmarks: no quota, configurable failure modes.
+
+Speaks enough of `models/{model}:generateContent` and
+`:streamGenerateContent?alt=sse` for the real google-genai client, so the
+whole gemini_client path (client pool, streaming, usage metadata, 429
+translation) is exercised. Point the pipeline at it with:
+
+    with FakeGemini(latency=0.05, quota_rate=0.05) as fake:
+        fake.install()          # gemini_client now talks to fake.url
+        ...
+
+Judge prompts get a scorecard (possibly mangled, see `malformed_rate`), re-ask
+prompts get just the requested dimensions, and anything else gets an agent-
+style answer.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from scoring import DIMENSIONS
+
+_WORDS = (
+    "stakeholders legal engineering fairness audit rollback pause launch communicate transparency "
+    "risk mitigation timeline monitoring escalate bias dataset retrain review customers compliance"
+).split()
+
+_REASK_DIMS = re.compile(r"Score ONLY these dimensions: ([a-z_, ]+)")
+
+def _mangle(text: str, rng: random.Random) -> str:
+    """One of the ways real judge replies break."""
+    kind = rng.choice(["fenced", "prose", "trailing_comma", "truncated", "string_scores", "garbage"])
+    if kind == "fenced":
+        return f"```json\n{text}\n```"
+    if kind == "prose":
+        return f"Here is my evaluation:\n{text}\nI hope this helps."
+    if kind == "trailing_comma":
+        return text.replace('"}', '",}')
+    if kind == "truncated":
+        return text[: int(len(text) * rng.uniform(0.6, 0.95))]
+    if kind == "string_scores":
+        return re.sub(r'"score": (\d)', r'"score": "\1/5"', text)
+    return "I am unable to provide a structured evaluation for this response."
+
+class FakeGemini:
+    """Threaded HTTP server; counters in `stats` are safe to read while it runs."""
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.3,
+        error_rate: float = 0.0,
+        quota_rate: float = 0.0,
+        malformed_rate: float = 0.0,
+        retry_delay: float = 0.1,
+        agent_words: int = 250,
+        stream_chunks: int = 5,
+        seed: int = 0,
+    ):
+        """`latency` is the median seconds per request (lognormal with sigma `jitter`);
+        `error_rate`, `quota_rate` and `malformed_rate` are per-request probabilities
+        of a 500, a 429 with `retry_delay`, and a mangled judge reply."""
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.quota_rate = quota_rate
+        self.malformed_rate = malformed_rate
+        self.retry_delay = retry_delay
+        self.agent_words = agent_words
+        self.stream_chunks = stream_chunks
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "ok": 0, "errors": 0, "quota": 0, "malformed": 0, "streams": 0}
+        self._server = None
+        self._thread = None
+
+    # ------------------ lifecycle ------------------
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> "FakeGemini":
+        fake = self
+
+        class Handler(_Handler):
+            server_fake = fake
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-gemini", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def install(self) -> None:
+        """Route every gemini_client call to this server (a fresh, empty client pool)."""
+        from google import genai
+        from gemini_client import reset_clients
+        url = self.url
+
+        def factory(api_key: str, http_options: dict | None = None):
+            return genai.Client(api_key=api_key, http_options={**(http_options or {}), "base_url": url})
+        reset_clients(factory)
+
+    def __enter__(self) -> "FakeGemini":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        from gemini_client import reset_clients
+        reset_clients()
+        self.stop()
+
+    # ------------------ behaviour ------------------
+    def _draw(self) -> tuple[str, float, random.Random]:
+        with self._lock:
+            self.stats["requests"] += 1
+            u = self._rng.random()
+            delay = self.latency * self._rng.lognormvariate(0.0, self.jitter) if self.latency > 0 else 0.0
+            rng = random.Random(self._rng.getrandbits(64))
+        if u < self.quota_rate:
+            outcome = "quota"
+        elif u < self.quota_rate + self.error_rate:
+            outcome = "error"
+        else:
+            outcome = "ok"
+        return outcome, delay, rng
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def reply(self, prompt: str, rng: random.Random) -> str:
+        reask = _REASK_DIMS.search(prompt)
+        if reask:
+            dims = [d.strip() for d in reask.group(1).split(",") if d.strip() in DIMENSIONS]
+            return json.dumps({d: {"score": rng.randint(2, 5), "justification": "Re-scored."} for d in dims}, indent=2)
+        if "You are evaluating" in prompt:
+            # scores depend on the response text, so identical responses get identical scores
+            base = int(hashlib.md5(prompt.encode("utf-8")).hexdigest(), 16)
+            card = {d: {"score": 1 + (base >> (4 * i)) % 5, "justification": "Fake judge justification."} for i, d in enumerate(DIMENSIONS)}
+            card["overall_summary"] = "Fake overall summary."
+            text = json.dumps(card, indent=2)
+            if rng.random() < self.malformed_rate:
+                self._count("malformed")
+                text = _mangle(text, rng)
+            return text
+        return " ".join(rng.choice(_WORDS) for _ in range(self.agent_words)) + "."
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real endpoint
+    server_fake: FakeGemini = None
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _send_json(self, code: int, body: dict, headers: dict | None = None) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self) -> None:
+        fake = self.server_fake
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        model = self.path.split("/models/")[-1].split(":")[0]
+        prompt = "".join(p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", []))
+        outcome, delay, rng = fake._draw()
+
+        if outcome == "quota":
+            time.sleep(min(delay, 0.01))
+            fake._count("quota")
+            return self._send_json(429, {"error": {
+                "code": 429,
+                "message": "Resource has been exhausted (e.g. check quota).",
+                "status": "RESOURCE_EXHAUSTED",
+                "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": f"{fake.retry_delay}s"}],
+            }}, {"Retry-After": str(fake.retry_delay)})
+        if outcome == "error":
+            time.sleep(delay)
+            fake._count("errors")
+            return self._send_json(500, {"error": {"code": 500, "message": "Internal error.", "status": "INTERNAL"}})
+
+        text = fake.reply(prompt, rng)
+        usage = {
+            "promptTokenCount": max(1, len(prompt) // 4),
+            "candidatesTokenCount": max(1, len(text) // 4),
+            "totalTokenCount": max(1, len(prompt) // 4) + max(1, len(text) // 4),
+        }
+        if ":streamGenerateContent" not in self.path:
+            time.sleep(delay)
+            fake._count("ok")
+            return self._send_json(200, {
+                "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP", "index": 0}],
+                "usageMetadata": usage,
+                "modelVersion": model,
+            })
+
+        fake._count("streams")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        n = max(1, fake.stream_chunks)
+        step = -(-len(text) // n)
+        pieces = [text[i:i + step] for i in range(0, len(text), step)] or [""]
+        for i, piece in enumerate(pieces):
+            time.sleep(delay / len(pieces))
+            event = {"candidates": [{"content": {"role": "model", "parts": [{"text": piece}]}, "index": 0}], "modelVersion": model}
+            if i == len(pieces) - 1:
+                event["candidates"][0]["finishReason"] = "STOP"
+                event["usageMetadata"] = usage
+            data = f"data: {json.dumps(event)}\r\n\r\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+        fake._count("ok")
@@ -0,0 +1,133 @@
+# blobs.py
+"""Content-addressed, compressed blob store for the large text fields of run payloads.
+
+A sweep embeds the same scenario text in every cell and each agent response
+once per run; storing them inline makes the run store grow with
+runs × text. Here a text is written once under its SHA-256, compressed
+(zstd when the `zstandard` package is installed, gzip otherwise), and run
+payloads keep a `{"$blob": "<sha256>"}` stub in its place.
+
+    runs/blobs/3f/a9c1....gz     # or .zst; the suffix records the codec
+
+Reads mmap the file and decompress from the mapping; decoded texts are
+LRU-cached (blobs are immutable). `externalize` / `resolve` convert whole
+payloads; storage.save_run / load_run call them.
+"""
+import gzip
+import hashlib
+import mmap
+import os
+import secrets
+import threading
+import zlib
+from functools import lru_cache
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:  # optional: gzip is always available
+    zstandard = None
+
+BLOB_DIR = Path(os.getenv("AGENTEVAL_BLOB_DIR", "runs/blobs"))
+# payload keys whose string values move to the blob store, at any nesting depth
+BLOB_FIELDS = ("scenario", "agent_response", "utterance")  # utterance: episode transcript turns
+BLOB_MIN_BYTES = int(os.getenv("AGENTEVAL_BLOB_MIN_BYTES", "256"))  # shorter texts stay inline
+CODECS = (".zst", ".gz")
+
+_known: set[str] = set()  # digests already on disk, to skip the stat on repeat puts
+_known_lock = threading.Lock()
+
+def digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _path(h: str, suffix: str) -> Path:
+    return BLOB_DIR / h[:2] / (h[2:] + suffix)
+
+def _find(h: str) -> Path | None:
+    for suffix in CODECS:
+        p = _path(h, suffix)
+        if p.exists():
+            return p
+    return None
+
+def _compress(data: bytes) -> tuple[bytes, str]:
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(data), ".zst"
+    return gzip.compress(data, compresslevel=6, mtime=0), ".gz"
+
+def put(text: str) -> str:
+    """Store `text` once; returns its SHA-256. Safe across threads and processes."""
+    h = digest(text)
+    if h in _known:
+        return h
+    if _find(h) is None:
+        data, suffix = _compress(text.encode("utf-8"))
+        final = _path(h, suffix)
+        final.parent.mkdir(parents=True, exist_ok=True)
+        tmp = final.with_name(f".{final.name}.{secrets.token_hex(4)}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, final)  # atomic: readers never see a partial blob; racing writers write identical bytes
+    with _known_lock:
+        _known.add(h)
+    return h
+
+@lru_cache(maxsize=1024)
+def get(h: str) -> str:
+    """Text for a digest; KeyError when the blob is missing."""
+    path = _find(h)
+    if path is None:
+        raise KeyError(f"Unknown blob: {h}")
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if path.suffix == ".zst":
+            if zstandard is None:
+                raise RuntimeError(f"Blob {h} is zstd-compressed; pip install zstandard to read it")
+            data = zstandard.ZstdDecompressor().stream_reader(mm).read()
+        else:
+            data = zlib.decompress(mm, wbits=31)  # gzip framing
+    return data.decode("utf-8")
+
+def is_ref(value) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and "$blob" in value
+
+def externalize(payload):
+    """Copy of `payload` with every large BLOB_FIELDS string replaced by a blob stub."""
+    if isinstance(payload, dict):
+        out = {}
+        for k, v in payload.items():
+            if k in BLOB_FIELDS and isinstance(v, str) and len(v) >= BLOB_MIN_BYTES:
+                out[k] = {"$blob": put(v)}
+            else:
+                out[k] = externalize(v)
+        return out
+    if isinstance(payload, list):
+        return [externalize(v) for v in payload]
+    return payload
+
+def resolve(payload):
+    """Inverse of externalize: blob stubs replaced by their text (cached, so repeats are free)."""
+    if is_ref(payload):
+        return get(payload["$blob"])
+    if isinstance(payload, dict):
+        return {k: resolve(v) for k, v in payload.items()}
+    if isinstance(payload, list):
+        return [resolve(v) for v in payload]
+    return payload
+
+def refs(payload) -> set[str]:
+    """Digests referenced anywhere in a payload."""
+    if is_ref(payload):
+        return {payload["$blob"]}
+    if isinstance(payload, dict):
+        return set().union(*(refs(v) for v in payload.values())) if payload else set()
+    if isinstance(payload, list):
+        return set().union(*(refs(v) for v in payload)) if payload else set()
+    return set()
+
+def disk_usage() -> dict:
+    n = size = 0
+    for p in BLOB_DIR.glob("*/*"):
+        if p.suffix in CODECS:
+            n += 1
+            size += p.stat().st_size
+    return {"blobs": n, "bytes": size}
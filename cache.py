@@ -0,0 +1,130 @@
+# cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+CACHE_PATH = Path(os.getenv("AGENTEVAL_CACHE_PATH", ".cache/responses.sqlite"))
+CACHE_MAX_BYTES = int(os.getenv("AGENTEVAL_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CACHE_TTL_SECONDS = float(os.getenv("AGENTEVAL_CACHE_TTL", str(30 * 24 * 3600)))
+
+def cache_key(model: str, system_prompt: str, user_prompt: str, temperature: float, sample: int = 0) -> str:
+    """Content address of one generate_text call."""
+    raw = json.dumps([model, system_prompt, user_prompt, round(float(temperature), 4), int(sample)], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """SQLite-backed LRU cache of model responses with TTL and a total-size cap."""
+
+    def __init__(self, path: Path = CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES, ttl: float | None = CACHE_TTL_SECONDS):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "expired": 0}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            value, created = row
+            if self.ttl is not None and now - created > self.ttl:
+                self._delete(key)
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.stats["hits"] += 1
+            return value
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            # one write transaction, so the size check sees every process's rows, not a stale local total
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses(key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, size, now, now),
+                )
+                self._evict()
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            self.stats["writes"] += 1
+
+    def _delete(self, key: str) -> None:
+        self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def _size(self) -> int:
+        return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _evict(self) -> None:
+        # drop least-recently-used rows in chunks until back under the size cap;
+        # the total is read from the file, which other processes may share
+        total = self._size()
+        while total > self.max_bytes:
+            rows = self._db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed LIMIT 64) RETURNING size"
+            ).fetchall()
+            if not rows:
+                break
+            total -= sum(r[0] for r in rows)
+            self.stats["evictions"] += len(rows)
+
+    def purge_expired(self) -> int:
+        if self.ttl is None:
+            return 0
+        with self._lock:
+            rows = self._db.execute(
+                "DELETE FROM responses WHERE created < ? RETURNING size", (time.time() - self.ttl,)
+            ).fetchall()
+            self.stats["expired"] += len(rows)
+            return len(rows)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+
+    def info(self) -> dict:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            info = dict(self.stats, entries=entries, bytes=self._size())
+        lookups = info["hits"] + info["misses"]
+        info["hit_ratio"] = (info["hits"] / lookups) if lookups else 0.0
+        return info
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+_CACHE: ResponseCache | None = None
+_CACHE_LOCK = threading.Lock()
+
+def get_cache() -> ResponseCache | None:
+    """Process-wide cache; disabled with AGENTEVAL_CACHE=0."""
+    global _CACHE
+    if os.getenv("AGENTEVAL_CACHE", "1").strip() in ("0", "false", "off"):
+        return None
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = ResponseCache()
+        return _CACHE
@@ -0,0 +1,265 @@
+# consistency.py
+"""Repeated sampling with bootstrap confidence intervals and adaptive early stopping.
+
+Each cell draws agent samples in rounds; every agent sample is scored by
+`judge_samples` judge calls and averaged. After each round the per-dimension
+means get bootstrap CIs, and sampling stops once the overall CI is narrower
+than `target_width` or lies entirely inside one overall_rank bucket. Failed
+samples are not retried forever: a cell gives up after `max_attempts`
+(default 2 × max_samples) attempted samples.
+
+    python -m consistency sweep.json
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import numpy as np
+
+from prompts import AGENT_SYSTEM, EVALUATOR_SYSTEM
+from scenarios import scenario_text
+from gemini_client import DEFAULT_MODEL, cache_lookup, generate_text
+from ratelimit import AGENT, JUDGE, RateLimiter, call_with_retries, estimate_tokens
+from scoring import DIMENSIONS, to_100, overall_rank
+from storage import save_run
+from engine import agent_call_plan, judge_prompt, judge_view, cells_from_spec, load_spec
+from judging import parse_judge_async
+from tokens import resolve_budgets
+
+# lower edges of the overall_rank buckets
+RANK_EDGES = (60.0, 70.0, 80.0, 90.0)
+
+def bootstrap_ci(samples: np.ndarray, n_boot: int = 2000, alpha: float = 0.05, rng=None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Mean and percentile-bootstrap CI per column of an (n_samples, n_cols) array."""
+    rng = rng or np.random.default_rng(0)
+    samples = np.asarray(samples, dtype=float)
+    n = samples.shape[0]
+    mean = samples.mean(axis=0)
+    if n < 2:
+        return mean, mean.copy(), mean.copy()
+    idx = rng.integers(0, n, size=(n_boot, n))
+    boot = samples[idx].mean(axis=1)  # (n_boot, n_cols)
+    lo, hi = np.percentile(boot, [100 * alpha / 2, 100 * (1 - alpha / 2)], axis=0)
+    return mean, lo, hi
+
+def rank_settled(lo: float, hi: float) -> bool:
+    """True when the whole CI falls inside a single overall_rank bucket."""
+    return int(np.searchsorted(RANK_EDGES, lo, side="right")) == int(np.searchsorted(RANK_EDGES, hi, side="right"))
+
+async def sample_cell(
+    cell: dict,
+    agent_call,
+    judge_call,
+    min_samples: int = 3,
+    max_samples: int = 12,
+    step: int = 3,
+    judge_samples: int = 1,
+    judge_temperature: float = 0.0,
+    target_width: float = 10.0,
+    max_attempts: int | None = None,
+    budgets: dict | None = None,
+) -> dict:
+    """Sample one cell until its CI is tight enough (or max_samples); returns the aggregate.
+
+    `agent_call` / `judge_call` are `(system_prompt, user_prompt, temperature, sample, max_output_tokens) -> awaitable str`.
+    `budgets` overrides tokens.DEFAULT_BUDGETS as in engine.run_sweep: capped
+    agent and judge output, each sample compacted to the judge_input budget.
+    At most `max_attempts` samples are attempted (default 2 × max_samples):
+    if they run out with min_samples successes the cell stops with
+    stop_reason "attempts_exhausted", with fewer it raises.
+    """
+    max_attempts = 2 * max_samples if max_attempts is None else max_attempts
+    scenario = cell.get("scenario") or scenario_text(cell["scenario_key"])
+    budgets = resolve_budgets(budgets)
+    judge_cap = budgets["judge_output"]
+    plan = agent_call_plan(scenario, cell["persona"], budgets)
+    rows: list[np.ndarray] = []
+    first = None
+    n_calls = 0
+    next_index = 0  # advances for every attempted sample, so a failed one never hands its index (and cache key) to a retry
+
+    async def one_sample(i: int):
+        agent_response = await agent_call(AGENT_SYSTEM, plan[0], cell["temperature"], i, plan[1])
+        judged, tokens = judge_view(scenario, agent_response, budgets, plan)
+        evals = await asyncio.gather(*(
+            judge_call(EVALUATOR_SYSTEM, judge_prompt(scenario, judged), judge_temperature, j if judge_samples > 1 else None, judge_cap)
+            for j in range(judge_samples)
+        ))
+        parsed = await asyncio.gather(*(
+            parse_judge_async(raw, scenario, judged, lambda u: judge_call(EVALUATOR_SYSTEM, u, judge_temperature, None, judge_cap))
+            for raw in evals
+        ))
+        scores = np.array([[to_100(int(p[d]["score"])) for d in DIMENSIONS] for p in parsed], dtype=float)
+        return agent_response, parsed[0], scores.mean(axis=0), tokens
+
+    stop_reason = "max_samples"
+    last_error = None
+    while len(rows) < max_samples:
+        want = (min_samples if not rows else step)
+        want = min(want, max_samples - len(rows), max_attempts - next_index)
+        if want <= 0:
+            if len(rows) < min_samples:
+                raise RuntimeError(f"Only {len(rows)} of {min_samples} samples succeeded in {next_index} attempts: {last_error}")
+            stop_reason = "attempts_exhausted"
+            break
+        batch = await asyncio.gather(*(one_sample(next_index + k) for k in range(want)), return_exceptions=True)
+        next_index += want
+        n_calls += want * (1 + judge_samples)
+        for res in batch:
+            if isinstance(res, Exception):
+                last_error = res
+                continue
+            if first is None:
+                first = res
+            rows.append(res[2])
+        if not rows:
+            raise RuntimeError(f"Every sample failed: {batch[0]}")
+
+        arr = np.vstack(rows)
+        overall = arr.mean(axis=1, keepdims=True)
+        mean, lo, hi = bootstrap_ci(np.hstack([arr, overall]))
+        if len(rows) >= min_samples:
+            if hi[-1] - lo[-1] <= target_width:
+                stop_reason = "ci_width"
+                break
+            if rank_settled(lo[-1], hi[-1]):
+                stop_reason = "rank_settled"
+                break
+
+    return {
+        "agent_response": first[0],
+        "evaluation": first[1],
+        "tokens": first[3],
+        "scores_100": {d: round(float(mean[k]), 2) for k, d in enumerate(DIMENSIONS)},
+        "overall_100": float(mean[-1]),
+        "rank": overall_rank(float(mean[-1])),
+        "ci_100": {
+            **{d: [round(float(lo[k]), 2), round(float(hi[k]), 2)] for k, d in enumerate(DIMENSIONS)},
+            "overall": [round(float(lo[-1]), 2), round(float(hi[-1]), 2)],
+        },
+        "n_samples": {"agent": len(rows), "attempted": next_index, "judge_per_agent": judge_samples, "calls": n_calls},
+        "stop_reason": stop_reason,
+        "sample_scores": np.round(arr, 2).tolist(),
+    }
+
+async def run_consistency(
+    cells: list[dict],
+    concurrency: int = 8,
+    model: str | None = None,
+    judge_model: str | None = None,
+    save: bool = True,
+    on_result=None,
+    generate=generate_text,
+    limiter: RateLimiter | None = None,
+    **sampling,
+) -> list[dict]:
+    """Adaptive repeated sampling for every cell; `sampling` goes to sample_cell.
+
+    Agent samples are keyed on their sample index in the response cache, so a
+    re-run replays the samples it already paid for and only buys new ones.
+    With a `ratelimit.RateLimiter` calls are paced and 429s retried as in
+    engine.run_sweep (judge calls first); without one, each call still
+    honours retry-after via call_with_retries.
+    """
+    sem = asyncio.Semaphore(concurrency)
+
+    def make_call(model_name, priority):
+        async def call(system_prompt, user_prompt, temperature, sample, max_output_tokens=None):
+            if limiter is None:
+                async with sem:
+                    return await asyncio.to_thread(call_with_retries, lambda: generate(
+                        system_prompt, user_prompt, temperature=temperature, model=model_name, sample=sample,
+                        max_output_tokens=max_output_tokens,
+                    ))
+
+            # as in engine.run_sweep: cache hits skip the limiter, a custom `generate` caches for itself
+            cache = key = hit = None
+            if generate is generate_text:
+                cache, key, hit = cache_lookup(system_prompt, user_prompt, temperature, model_name, sample, None, max_output_tokens)
+            if hit is not None:
+                return hit
+
+            async def send():
+                async with sem:
+                    return await asyncio.to_thread(
+                        generate, system_prompt, user_prompt, temperature=temperature, model=model_name, sample=sample,
+                        use_cache=False if generate is generate_text else None, max_output_tokens=max_output_tokens,
+                    )
+            tokens = estimate_tokens(system_prompt, user_prompt) + (max_output_tokens or 1000)
+            text = await limiter.call(send, tokens=tokens, priority=priority)
+            if cache is not None and text:
+                cache.put(key, text)
+            return text
+        return call
+
+    agent_call, judge_call = make_call(model, AGENT), make_call(judge_model or model, JUDGE)
+
+    async def one(cell):
+        try:
+            agg = await sample_cell(cell, agent_call, judge_call, **sampling)
+        except Exception as e:
+            return {"cell": cell, "error": str(e)}
+        payload = {
+            "kind": "consistency",
+            "scenario": cell.get("scenario") or scenario_text(cell["scenario_key"]),
+            "scenario_key": cell["scenario_key"],
+            "persona": cell["persona"],
+            "temperature": cell["temperature"],
+            "model": model or DEFAULT_MODEL,
+            "judge_model": judge_model or model or DEFAULT_MODEL,
+            "demo_mode_used": False,
+            **agg,
+        }
+        if save:
+            payload["run_id"] = await asyncio.to_thread(save_run, payload)
+        return payload
+
+    results = []
+    for fut in asyncio.as_completed([one(c) for c in cells]):
+        res = await fut
+        results.append(res)
+        if on_result is not None:
+            on_result(res)
+    return results
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m consistency", description="Adaptive repeated-sampling sweep.")
+    parser.add_argument("spec", help="JSON or YAML sweep spec; optional \"sampling\" block holds sample_cell options")
+    args = parser.parse_args(argv)
+
+    spec = load_spec(args.spec)
+    cells = cells_from_spec({**spec, "repeats": 1})
+    rl = spec.get("rate_limit")
+    t0 = time.perf_counter()
+
+    def on_result(res):
+        if "error" in res:
+            print(f"ERROR {res['cell']}: {res['error']}", file=sys.stderr)
+            return
+        lo, hi = res["ci_100"]["overall"]
+        print(f"{res['scenario_key']} · {res['persona']} · t={res['temperature']} → {res['overall_100']:.1f} "
+              f"[{lo:.1f}, {hi:.1f}] n={res['n_samples']['agent']} ({res['stop_reason']})", file=sys.stderr)
+
+    results = asyncio.run(run_consistency(
+        cells,
+        concurrency=int(spec.get("concurrency", 8)),
+        model=spec.get("model"),
+        judge_model=spec.get("judge_model"),
+        on_result=on_result,
+        limiter=RateLimiter(rpm=float(rl.get("rpm", 15)), tpm=float(rl.get("tpm", 1_000_000))) if rl else None,
+        budgets=spec.get("budgets"),
+        **(spec.get("sampling") or {}),
+    ))
+    ok = [r for r in results if "error" not in r]
+    print(json.dumps({
+        "cells": len(cells),
+        "ok": len(ok),
+        "calls": sum(r["n_samples"]["calls"] for r in ok),
+        "elapsed_s": round(time.perf_counter() - t0, 3),
+    }))
+    return 0 if len(ok) == len(results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
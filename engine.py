@@ -0,0 +1,680 @@
+# engine.py
+"""Evaluation pipeline, importable without any UI libraries.
+
+    python -m engine sweep.json            # or sweep.yaml (needs PyYAML)
+"""
+import argparse
+import asyncio
+import functools
+import hashlib
+import json
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from prompts import (
+    AGENT_SYSTEM, AGENT_USER, EVALUATOR_SYSTEM, EVALUATOR_SYSTEM_VARIANTS, EVALUATOR_USER, EVALUATOR_REASK_USER,
+    EVALUATOR_BATCH_USER, EVALUATOR_BATCH_ITEM, DEFAULT_SCENARIOS, AGENT_PROFILES, DEMO_AGENT_RESPONSE, DEMO_EVAL_JSON_TEXT,
+    AGENT_LENGTH_GUIDANCE,
+)
+from gemini_client import DEFAULT_MODEL, generate_text, generate_text_stream, agenerate_text, cache_lookup, canonical_model
+from scoring import DIMENSIONS, ScorecardError, to_100, overall_rank
+from storage import save_run
+from scenarios import load_scenarios, scenario_text
+from ratelimit import AGENT, JUDGE, RateLimiter, call_with_retries, estimate_tokens
+from judging import JudgeBatcher, parse_judge, parse_judge_async
+from ensemble import judge_ensemble
+from tracing import Trace, export
+from tokens import agent_output_tokens, check_input, count_tokens, counter_name, fit_response, resolve_budgets
+
+class JudgeOutputError(ValueError):
+    """The judge reply could not be parsed; `raw` keeps the text for display."""
+
+    def __init__(self, message: str, raw: str):
+        super().__init__(message)
+        self.raw = raw
+
+def is_quota_error(e: Exception) -> bool:
+    s = str(e).lower()
+    return ("429" in s) or ("resource_exhausted" in s) or ("quota" in s) or ("rate limit" in s)
+
+def agent_prompt(scenario: str, persona: str, max_output_tokens: int | None = None, template: str = AGENT_USER, **fields) -> str:
+    """`template` (AGENT_USER, or e.g. EPISODE_AGENT_USER with its extra `fields`) plus persona and length guidance."""
+    prompt = template.format(scenario=scenario, **fields) + f"\n\nPersona guidance: {AGENT_PROFILES[persona]}\n"
+    if max_output_tokens:
+        # ~0.75 words per token, rounded down so the answer ends before the hard cap
+        prompt += AGENT_LENGTH_GUIDANCE.format(words=int(max_output_tokens * 0.75) // 50 * 50) + "\n"
+    return prompt
+
+def judge_prompt(scenario: str, agent_response: str) -> str:
+    return EVALUATOR_USER.format(scenario=scenario, agent_response=agent_response)
+
+def agent_call_plan(scenario: str, persona: str, budgets: dict) -> tuple[str, int, int]:
+    """(agent user prompt, max_output_tokens, prompt tokens); TokenBudgetError over the agent_input budget."""
+    cap = agent_output_tokens(persona, budgets)
+    user = agent_prompt(scenario, persona, cap)
+    return user, cap, check_input("agent", AGENT_SYSTEM, user, budgets=budgets)
+
+def judge_view(scenario: str, agent_response: str, budgets: dict, agent_plan: tuple | None = None) -> tuple[str, dict]:
+    """The response as the judge sees it (compacted to the judge_input budget) and the payload's token record."""
+    judged, compaction = fit_response(EVALUATOR_SYSTEM + judge_prompt(scenario, ""), agent_response, budgets)
+    record = {
+        "counter": counter_name(),
+        "budgets": budgets,
+        "agent_response": count_tokens(agent_response),
+        "judge_input": count_tokens(EVALUATOR_SYSTEM) + count_tokens(judge_prompt(scenario, judged)),
+        "compaction": compaction,
+    }
+    if agent_plan is not None:
+        record["agent_input"], record["agent_max_output"] = agent_plan[2], agent_plan[1]
+    return judged, record
+
+def score_evaluation(eval_json: dict) -> dict:
+    # ensemble scorecards carry aggregated, possibly fractional scores
+    dim_scores_100 = {d: to_100(float(eval_json[d]["score"])) for d in DIMENSIONS}
+    avg_100 = sum(dim_scores_100.values()) / len(DIMENSIONS)
+    return {"scores_100": dim_scores_100, "overall_100": avg_100, "rank": overall_rank(avg_100)}
+
+def build_cells(
+    scenarios: list[str] | None = None,
+    personas: list[str] | None = None,
+    temperatures: list[float] = (0.3,),
+    repeats: int = 1,
+) -> list[dict]:
+    """Expand scenario × persona × temperature × repeat into a flat list of cells."""
+    scenarios = list(scenarios or DEFAULT_SCENARIOS.keys())
+    personas = list(personas or AGENT_PROFILES.keys())
+    return [
+        {"scenario_key": s, "persona": p, "temperature": float(t), "repeat": r}
+        for s in scenarios
+        for p in personas
+        for t in temperatures
+        for r in range(repeats)
+    ]
+
+def input_digest(*parts) -> str:
+    """SHA-256 of JSON-encoded parts: the hash behind every run fingerprint."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def cell_fingerprints(
+    cell: dict,
+    scenario: str,
+    model: str | None,
+    judge_model: str | None,
+    ensemble: dict | None = None,
+    judge_mode: str = "single",
+    budgets: dict | None = None,
+) -> dict:
+    """Hashes of every input that decides a cell's result (see regression.py).
+
+    "agent_fingerprint" covers the agent call (prompt templates, persona text,
+    scenario, model, temperature, repeat, output cap); "fingerprint" adds the
+    judge side (evaluator templates, judge model, batch/ensemble mode, judge
+    token budgets). "parts" has a short hash per input so a changed
+    fingerprint can be explained.
+    """
+    budgets = resolve_budgets(budgets)
+    parts = {
+        "agent_prompt": input_digest(AGENT_SYSTEM, AGENT_USER, AGENT_LENGTH_GUIDANCE),
+        "persona": input_digest(cell["persona"], AGENT_PROFILES.get(cell["persona"])),
+        "scenario": input_digest(scenario),
+        "model": input_digest(
+            canonical_model(model), float(cell["temperature"]), cell.get("repeat", 0),
+            agent_output_tokens(cell["persona"], budgets), budgets["agent_input"],
+        ),
+        "judge_prompt": input_digest(
+            EVALUATOR_SYSTEM, EVALUATOR_USER, EVALUATOR_REASK_USER,
+            [EVALUATOR_BATCH_USER, EVALUATOR_BATCH_ITEM] if judge_mode == "batch" else None,
+            EVALUATOR_SYSTEM_VARIANTS if ensemble is not None else None,
+        ),
+        "judge_model": input_digest(canonical_model(judge_model or model), judge_mode, ensemble, budgets["judge_input"], budgets["judge_output"]),
+    }
+    agent = input_digest(*(parts[k] for k in ("agent_prompt", "persona", "scenario", "model")))
+    return {
+        "agent_fingerprint": agent,
+        "fingerprint": input_digest(agent, parts["judge_prompt"], parts["judge_model"]),
+        "fingerprint_parts": {k: v[:16] for k, v in parts.items()},
+    }
+
+def build_payload(
+    cell: dict,
+    scenario: str,
+    agent_response: str,
+    eval_json: dict,
+    model: str | None,
+    judge_model: str | None,
+    trace: Trace | None = None,
+    ensemble: dict | None = None,
+    fingerprints: dict | None = None,
+    tokens: dict | None = None,
+) -> dict:
+    payload = {
+        "scenario": scenario,
+        "scenario_key": cell["scenario_key"],
+        "persona": cell["persona"],
+        "temperature": cell["temperature"],
+        "repeat": cell.get("repeat", 0),
+        "model": model or DEFAULT_MODEL,
+        "judge_model": judge_model or model or DEFAULT_MODEL,
+        "demo_mode_used": False,
+        "agent_response": agent_response,
+        "evaluation": eval_json,
+        **score_evaluation(eval_json),
+        "scorecard_id": f"#{random.randint(1000, 9999)}",
+        "trace": trace.to_dict() if trace is not None else {},
+    }
+    if ensemble is not None:
+        payload["ensemble"] = ensemble
+    if fingerprints is not None:
+        payload.update(fingerprints)
+    if tokens is not None:
+        payload["tokens"] = tokens
+    return payload
+
+def new_trace(name: str, cell: dict) -> Trace:
+    return Trace(name, scenario_key=cell["scenario_key"], persona=cell["persona"], temperature=cell["temperature"])
+
+def _persist(trace: Trace, payload: dict) -> None:
+    # the stored copy's trace ends at parse; the returned payload and the sinks also get persist
+    with trace.span("persist"):
+        payload["run_id"] = save_run(payload)
+    payload["trace"] = trace.to_dict()
+
+async def _ensemble_call(system_prompt, user_prompt, temperature, model_name, metrics, max_output_tokens=None):
+    return await agenerate_text(
+        system_prompt, user_prompt, temperature=temperature, model=model_name, metrics=metrics, max_output_tokens=max_output_tokens
+    )
+
+def evaluate_cell(
+    cell: dict,
+    scenario: str | None = None,
+    model: str | None = None,
+    judge_model: str | None = None,
+    ensemble: dict | None = None,
+    budgets: dict | None = None,
+) -> dict:
+    """Blocking agent + judge call for one cell (no save); `ensemble` swaps the judge for a panel (see ensemble.py).
+
+    `budgets` overrides tokens.DEFAULT_BUDGETS (output caps, judge-input compaction).
+    """
+    scenario = scenario if scenario is not None else scenario_text(cell["scenario_key"])
+    budgets = resolve_budgets(budgets)
+    trace = new_trace("cell", cell)
+    fingerprints = cell_fingerprints(cell, scenario, model, judge_model, ensemble, budgets=budgets)
+    judge_cap = budgets["judge_output"]
+
+    def reask(user_prompt: str) -> str:
+        with trace.span("reask") as s:
+            return generate_text(
+                EVALUATOR_SYSTEM, user_prompt, temperature=0.0, model=judge_model or model, metrics=s, max_output_tokens=judge_cap
+            )
+
+    try:
+        with trace.span("format"):
+            plan = agent_call_plan(scenario, cell["persona"], budgets)
+        with trace.span("agent") as s:
+            agent_response = generate_text(
+                AGENT_SYSTEM, plan[0], temperature=cell["temperature"], model=model, metrics=s, max_output_tokens=plan[1]
+            )
+        with trace.span("format"):
+            judged, tokens = judge_view(scenario, agent_response, budgets, plan)
+            judge_user = judge_prompt(scenario, judged)
+        if ensemble is not None:
+            eval_json, report = asyncio.run(judge_ensemble(
+                ensemble, scenario, judged, judge_user, functools.partial(_ensemble_call, max_output_tokens=judge_cap),
+                trace, judge_model or model,
+            ))
+            return build_payload(cell, scenario, agent_response, eval_json, model, judge_model, trace, report, fingerprints, tokens)
+        with trace.span("judge") as s:
+            eval_raw = generate_text(
+                EVALUATOR_SYSTEM, judge_user, temperature=0.0, model=judge_model or model, metrics=s, max_output_tokens=judge_cap
+            )
+        with trace.span("parse"):
+            eval_json = parse_judge(eval_raw, scenario, judged, reask)
+        return build_payload(cell, scenario, agent_response, eval_json, model, judge_model, trace, fingerprints=fingerprints, tokens=tokens)
+    finally:
+        export(trace)
+
+# ------------------ SINGLE RUN ------------------
+def run_single(
+    scenario: str,
+    scenario_key: str,
+    persona: str,
+    temperature: float,
+    demo_mode: bool = False,
+    model: str | None = None,
+    judge_model: str | None = None,
+    on_agent_chunk=None,
+    on_stage=None,
+    save: bool = True,
+    ensemble: dict | None = None,
+    budgets: dict | None = None,
+) -> dict:
+    """Persona-injected agent call (streamed), judge call, parse, score and save.
+
+    `on_agent_chunk(text_so_far)` sees the agent response as it streams;
+    `on_stage("agent" | "judge")` marks each phase. With `demo_mode`, a quota
+    error swaps in the canned demo outputs instead of failing. Raises
+    JudgeOutputError when the judge reply cannot be parsed. Every stage is
+    recorded as a span in payload["trace"] and exported (see tracing.py).
+    With `ensemble`, a judge panel scores the response (see ensemble.py).
+    `budgets` overrides tokens.DEFAULT_BUDGETS; the judge sees a compacted
+    response when the full one would overflow judge_input.
+    """
+    cell = {"scenario_key": scenario_key, "persona": persona, "temperature": temperature}
+    budgets = resolve_budgets(budgets)
+    judge_cap = budgets["judge_output"]
+    trace = new_trace("single_run", cell)
+
+    def stream_agent(span: dict) -> str:
+        parts = []
+        for chunk in generate_text_stream(
+            AGENT_SYSTEM, plan[0], temperature=temperature, model=model, metrics=span, max_output_tokens=plan[1]
+        ):
+            parts.append(chunk)
+            if on_agent_chunk is not None:
+                on_agent_chunk("".join(parts))
+        return "".join(parts).strip()
+
+    def judge(user_prompt: str, span: dict) -> str:
+        return call_with_retries(
+            lambda: generate_text(
+                EVALUATOR_SYSTEM, user_prompt, temperature=0.0, model=judge_model or model, metrics=span, max_output_tokens=judge_cap
+            ),
+            metrics=span,
+        )
+
+    def reask(user_prompt: str) -> str:
+        with trace.span("reask") as s:
+            return judge(user_prompt, s)
+
+    try:
+        with trace.span("format"):
+            plan = agent_call_plan(scenario, persona, budgets)
+        demo_mode_used = False
+        try:
+            if on_stage is not None:
+                on_stage("agent")
+            with trace.span("agent") as s:
+                agent_response = call_with_retries(lambda: stream_agent(s), metrics=s)
+            if on_stage is not None:
+                on_stage("judge")
+            with trace.span("format"):
+                judged, tokens = judge_view(scenario, agent_response, budgets, plan)
+                judge_user = judge_prompt(scenario, judged)
+            if ensemble is not None:
+                eval_json, report = asyncio.run(judge_ensemble(
+                    ensemble, scenario, judged, judge_user, functools.partial(_ensemble_call, max_output_tokens=judge_cap),
+                    trace, judge_model or model,
+                ))
+            else:
+                with trace.span("judge") as s:
+                    eval_raw = judge(judge_user, s)
+        except ScorecardError as e:
+            raise JudgeOutputError(f"Judge output could not be parsed: {e}", "") from e
+        except Exception as e:
+            if not (demo_mode and is_quota_error(e)):
+                raise
+            agent_response = judged = DEMO_AGENT_RESPONSE
+            tokens = None
+            eval_raw = DEMO_EVAL_JSON_TEXT
+            ensemble = report = None
+            demo_mode_used = True
+
+        if ensemble is None:
+            try:
+                with trace.span("parse"):
+                    eval_json = parse_judge(eval_raw, scenario, judged, reask)
+            except Exception as e:
+                raise JudgeOutputError(f"Judge output could not be parsed: {e}", eval_raw) from e
+            report = None
+
+        # canned demo output must never stand in for a real result in a regression run
+        fingerprints = None if demo_mode_used else cell_fingerprints(cell, scenario, model, judge_model, ensemble, budgets=budgets)
+        payload = build_payload(cell, scenario, agent_response, eval_json, model, judge_model, trace, report, fingerprints, tokens)
+        payload["demo_mode_used"] = demo_mode_used
+        if save:
+            _persist(trace, payload)
+        return payload
+    finally:
+        export(trace)
+
+# ------------------ PERSONA COMPARISON ------------------
+def iter_comparison(
+    scenario: str,
+    scenario_key: str,
+    temperature: float,
+    personas: list[str] | None = None,
+    model: str | None = None,
+    judge_model: str | None = None,
+    ensemble: dict | None = None,
+    budgets: dict | None = None,
+):
+    """Run every persona on one scenario in parallel; yield (persona, payload_or_exception) as each finishes.
+
+    Runs in a thread pool rather than asyncio so a Streamlit script can consume it
+    and update the page from its own thread.
+    """
+    personas = list(personas or AGENT_PROFILES.keys())
+    with ThreadPoolExecutor(max_workers=len(personas), thread_name_prefix="agenteval-cmp") as pool:
+        futures = {
+            pool.submit(
+                evaluate_cell,
+                {"scenario_key": scenario_key, "persona": p, "temperature": float(temperature)},
+                scenario, model, judge_model, ensemble, budgets,
+            ): p
+            for p in personas
+        }
+        for fut in as_completed(futures):
+            try:
+                yield futures[fut], fut.result()
+            except Exception as e:
+                yield futures[fut], e
+
+def comparison_record(
+    scenario: str,
+    scenario_key: str,
+    temperature: float,
+    cells: dict,
+    errors: dict | None = None,
+    model: str | None = None,
+    judge_model: str | None = None,
+) -> dict:
+    """Group per-persona payloads into one record for save_run."""
+    slim = {p: {k: v for k, v in c.items() if k not in ("scenario", "scenario_key", "temperature")} for p, c in cells.items()}
+    ranked = sorted(slim, key=lambda p: slim[p]["overall_100"], reverse=True)
+    return {
+        "kind": "comparison",
+        "scenario": scenario,
+        "scenario_key": scenario_key,
+        "temperature": temperature,
+        "model": model or DEFAULT_MODEL,
+        "judge_model": judge_model or model or DEFAULT_MODEL,
+        "personas": ranked,
+        "cells": slim,
+        "errors": errors or {},
+    }
+
+# ------------------ ASYNC SWEEP ------------------
+async def _run_cell(
+    cell: dict, call, model: str | None, judge_model: str | None, save: bool, cache_samples: bool, batcher=None, ensemble=None,
+    budgets: dict | None = None,
+) -> dict:
+    scenario = cell.get("scenario") or scenario_text(cell["scenario_key"])
+    # A cell holds a concurrency slot only while one of its calls is in flight, so
+    # its judge call is queued the moment its own agent response lands.
+    sample = cell["repeat"] if cache_samples else None
+    budgets = resolve_budgets(budgets)
+    judge_cap = budgets["judge_output"]
+    trace = new_trace("sweep_cell", cell)
+
+    async def reask(user_prompt: str) -> str:
+        with trace.span("reask") as s:
+            return await call(EVALUATOR_SYSTEM, user_prompt, 0.0, judge_model or model, JUDGE, None, s, judge_cap)
+
+    submitted = False  # a batched cell must release its batcher slot exactly once, even when it fails early
+    try:
+        with trace.span("format"):
+            plan = agent_call_plan(scenario, cell["persona"], budgets)
+        if cell.get("agent_response") is not None:
+            agent_response = cell["agent_response"]  # re-judging a stored response (regression.py)
+        else:
+            with trace.span("agent") as s:
+                agent_response = await call(AGENT_SYSTEM, plan[0], cell["temperature"], model, AGENT, sample, s, plan[1])
+
+        with trace.span("format"):
+            judged, tokens = judge_view(scenario, agent_response, budgets, plan)
+        if batcher is not None:
+            # tokens of a batched request are shared, so the span only records the wait
+            with trace.span("judge", batched=True, batch_size=batcher.batch_size):
+                submitted = True
+                eval_json = await batcher.submit(judged)
+        elif ensemble is not None:
+            with trace.span("format"):
+                judge_user = judge_prompt(scenario, judged)
+            eval_json, report = await judge_ensemble(
+                ensemble, scenario, judged, judge_user,
+                lambda sp, u, t, m, metrics: call(sp, u, t, m, JUDGE, None, metrics, judge_cap), trace, judge_model or model,
+            )
+        else:
+            with trace.span("format"):
+                judge_user = judge_prompt(scenario, judged)
+            with trace.span("judge") as s:
+                eval_raw = await call(EVALUATOR_SYSTEM, judge_user, 0.0, judge_model or model, JUDGE, None, s, judge_cap)
+            with trace.span("parse"):
+                eval_json = await parse_judge_async(eval_raw, scenario, judged, reask)
+
+        fingerprints = cell_fingerprints(
+            cell, scenario, model, judge_model, ensemble, "batch" if batcher is not None else "single", budgets
+        )
+        payload = build_payload(
+            cell, scenario, agent_response, eval_json, model, judge_model, trace, report if ensemble else None, fingerprints, tokens
+        )
+        if save:
+            with trace.span("persist"):
+                payload["run_id"] = await asyncio.to_thread(save_run, payload)
+            payload["trace"] = trace.to_dict()
+        return payload
+    finally:
+        if batcher is not None and not submitted:
+            batcher.agent_done()
+        export(trace)
+
+async def run_sweep(
+    cells: list[dict],
+    concurrency: int = 8,
+    model: str | None = None,
+    judge_model: str | None = None,
+    on_result=None,
+    save: bool = True,
+    limiter=None,
+    cache_samples: bool = False,
+    judge_batch_size: int = 1,
+    generate=generate_text,
+    ensemble: dict | None = None,
+    budgets: dict | None = None,
+) -> list[dict]:
+    """Evaluate every cell with at most `concurrency` API calls in flight.
+
+    Results are saved and passed to `on_result` as each cell finishes; a failed
+    cell yields {"cell": ..., "error": ...} instead of aborting the sweep.
+    With a `ratelimit.RateLimiter`, calls are paced under RPM/TPM quota, 429s are
+    retried, and judge calls are granted before new agent calls.
+    Judge calls always go through the response cache; `cache_samples=True` also
+    caches agent samples keyed on the repeat index, so re-running a sweep with a
+    changed rubric only pays for the judge calls.
+    `judge_batch_size` > 1 packs that many responses to the same scenario into
+    one judge request (see judging.JudgeBatcher). `ensemble` scores each
+    response with a concurrent judge panel instead (see ensemble.py).
+    `generate` replaces generate_text (same signature), e.g. with a fake backend; it then
+    decides caching itself, and the shared response cache is neither read nor written.
+    `budgets` overrides tokens.DEFAULT_BUDGETS: every call carries a
+    max_output_tokens cap and judge prompts are compacted to judge_input, so
+    the cost and latency of each call are bounded.
+    """
+    if ensemble is not None and judge_batch_size > 1:
+        raise ValueError("ensemble judging and judge_batch_size > 1 cannot be combined")
+    budgets = resolve_budgets(budgets)
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(concurrency)
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="agenteval")
+
+    async def call(system_prompt, user_prompt, temperature, model_name, priority, sample, metrics, max_output_tokens=None):
+        if limiter is None:
+            async with sem:
+                return await loop.run_in_executor(
+                    pool,
+                    lambda: generate(
+                        system_prompt, user_prompt, temperature=temperature, model=model_name, sample=sample, metrics=metrics,
+                        max_output_tokens=max_output_tokens,
+                    ),
+                )
+
+        # cache hits must not consume quota, so look up before queueing on the limiter; a custom
+        # `generate` (fake or alternate backend) keeps its own caching, so its text never enters the shared cache
+        cache = key = hit = None
+        if generate is generate_text:
+            cache, key, hit = cache_lookup(system_prompt, user_prompt, temperature, model_name, sample, None, max_output_tokens)
+        if hit is not None:
+            metrics.update(model=canonical_model(model_name), cached=True, ttft_s=0.0, latency_s=0.0)
+            return hit
+
+        async def send():
+            async with sem:
+                return await loop.run_in_executor(
+                    pool,
+                    lambda: generate(
+                        system_prompt, user_prompt, temperature=temperature, model=model_name, sample=sample,
+                        use_cache=False if generate is generate_text else None, metrics=metrics, max_output_tokens=max_output_tokens,
+                    ),
+                )
+        # budget the prompt plus the capped answer (or a typical ~1k tokens) against TPM
+        tokens = estimate_tokens(system_prompt, user_prompt) + (max_output_tokens or 1000)
+        text = await limiter.call(send, tokens=tokens, priority=priority, metrics=metrics)
+        if cache is not None and text:
+            cache.put(key, text)
+        return text
+
+    batchers = {}
+    if judge_batch_size > 1:
+        for key in {c["scenario_key"] for c in cells}:
+            group = [c for c in cells if c["scenario_key"] == key]
+            scenario = group[0].get("scenario") or scenario_text(key)
+            batchers[key] = JudgeBatcher(
+                scenario, judge_batch_size, len(group),
+                lambda s, u: call(s, u, 0.0, judge_model or model, JUDGE, None, {}, budgets["judge_output"] * judge_batch_size),
+            )
+
+    async def guarded(cell):
+        try:
+            return await _run_cell(
+                cell, call, model, judge_model, save, cache_samples, batchers.get(cell["scenario_key"]), ensemble, budgets
+            )
+        except Exception as e:
+            return {"cell": cell, "error": str(e)}
+
+    results = []
+    try:
+        for fut in asyncio.as_completed([guarded(c) for c in cells]):
+            res = await fut
+            results.append(res)
+            if on_result is not None:
+                on_result(res)
+    finally:
+        pool.shutdown(wait=False)
+    return results
+
+def run_sweep_sync(cells: list[dict], **kwargs) -> list[dict]:
+    return asyncio.run(run_sweep(cells, **kwargs))
+
+# ------------------ CLI ------------------
+def load_spec(path: str) -> dict:
+    text = Path(path).read_text(encoding="utf-8")
+    if path.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError as e:
+            raise SystemExit("YAML specs need PyYAML (pip install pyyaml); or use a .json spec.") from e
+        return yaml.safe_load(text) or {}
+    return json.loads(text)
+
+def cells_from_spec(spec: dict) -> list[dict]:
+    """Spec keys: scenarios, personas, temperatures, repeats, and optional custom_scenarios {key: text}.
+
+    "scenario_domains" adds every stored generated scenario of those domains
+    (see scenarios.py); "scenarios" may name stored scenario keys directly.
+    """
+    custom = spec.get("custom_scenarios") or {}
+    generated = list(load_scenarios(spec["scenario_domains"])) if spec.get("scenario_domains") else []
+    scenarios = spec.get("scenarios") or [*DEFAULT_SCENARIOS, *custom]
+    scenarios = list(dict.fromkeys([*scenarios, *generated]))
+    cells = build_cells(scenarios, spec.get("personas"), spec.get("temperatures") or [0.3], int(spec.get("repeats", 1)))
+    # stored scenarios travel with the cell, so shard workers elsewhere need no copy of the store
+    stored = {k: scenario_text(k) for k in scenarios if k not in custom and k not in DEFAULT_SCENARIOS}
+    for c in cells:
+        if c["scenario_key"] in custom:
+            c["scenario"] = custom[c["scenario_key"]]
+        elif c["scenario_key"] in stored:
+            c["scenario"] = stored[c["scenario_key"]]
+    return cells
+
+def _ensemble_summary(results: list[dict]) -> dict:
+    reports = [r["ensemble"] for r in results if r.get("ensemble")]
+    if not reports:
+        return {}
+    alphas = [e["alpha"] for e in reports if e["alpha"] is not None]
+    return {
+        # full-panel cells only: an early consensus cut reports alpha as None (see ensemble.py)
+        "mean_judge_alpha": round(sum(alphas) / len(alphas), 3) if alphas else None,
+        "judge_alpha_cells": len(alphas),
+        "judges_cancelled": sum(e["cancelled"] for e in reports),
+    }
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m engine", description="Run an AgentEval sweep headlessly.")
+    parser.add_argument("spec", help="JSON or YAML sweep spec")
+    parser.add_argument("--concurrency", type=int, help="max API calls in flight (overrides spec)")
+    parser.add_argument("--no-save", action="store_true", help="do not write runs to the run store")
+    parser.add_argument("--out", help="also append every result to this JSONL file")
+    parser.add_argument("--dry-run", action="store_true", help="print the expanded cells and exit")
+    args = parser.parse_args(argv)
+
+    spec = load_spec(args.spec)
+    cells = cells_from_spec(spec)
+    if args.dry_run:
+        for c in cells:
+            print(json.dumps(c, ensure_ascii=False))
+        return 0
+
+    limiter = None
+    if spec.get("rate_limit"):
+        rl = spec["rate_limit"]
+        limiter = RateLimiter(rpm=float(rl.get("rpm", 15)), tpm=float(rl.get("tpm", 1_000_000)))
+    out = open(args.out, "a", encoding="utf-8") if args.out else None
+    done = [0]
+
+    def on_result(res: dict) -> None:
+        done[0] += 1
+        if "error" in res:
+            print(f"[{done[0]}/{len(cells)}] ERROR {res['cell']}: {res['error']}", file=sys.stderr)
+        else:
+            print(f"[{done[0]}/{len(cells)}] {res['scenario_key']} · {res['persona']} · t={res['temperature']}"
+                  f" → {res['overall_100']:.1f} {res['rank']}", file=sys.stderr)
+        if out is not None:
+            out.write(json.dumps(res, ensure_ascii=False) + "\n")
+            out.flush()
+
+    t0 = time.perf_counter()
+    try:
+        results = run_sweep_sync(
+            cells,
+            concurrency=args.concurrency or int(spec.get("concurrency", 8)),
+            model=spec.get("model"),
+            judge_model=spec.get("judge_model"),
+            on_result=on_result,
+            save=not args.no_save,
+            limiter=limiter,
+            cache_samples=bool(spec.get("cache_samples", False)),
+            judge_batch_size=int(spec.get("judge_batch_size", 1)),
+            ensemble=spec.get("ensemble"),
+            budgets=spec.get("budgets"),
+        )
+    finally:
+        if out is not None:
+            out.close()
+
+    ok = [r for r in results if "error" not in r]
+    print(json.dumps({
+        "cells": len(cells),
+        "ok": len(ok),
+        "errors": len(results) - len(ok),
+        "elapsed_s": round(time.perf_counter() - t0, 3),
+        "mean_overall_100": round(sum(r["overall_100"] for r in ok) / len(ok), 2) if ok else None,
+        **_ensemble_summary(ok),
+    }))
+    return 0 if len(ok) == len(results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+# ensemble.py
+"""Judge ensembles: several judges score one response concurrently and are aggregated.
+
+Judges differ by model, temperature and rubric framing (prompts.EVALUATOR_SYSTEM_VARIANTS).
+Per-dimension scores are combined by median or trimmed mean, and agreement is
+reported as Krippendorff's alpha (interval metric) over judges × dimensions.
+As soon as `quorum` judges agree within `tolerance` points on every dimension,
+the judges still in flight are cancelled.
+
+Alpha is only reported (not None) when no judge was cancelled. After an early
+consensus the scored judges are by construction the ones that already
+agreed, so their alpha would overstate the panel's reliability; set
+`quorum` to the panel size when the agreement figure matters.
+
+An ensemble is configured with a dict, in a sweep spec or via engine's `ensemble=`:
+
+    {"judges": 3}                                        # default panel on the judge model
+    {"judges": [{"model": "gemini-2.0-flash"},
+                {"model": "openai:gpt-4o-mini", "rubric": "strict"},
+                {"model": "gemini-2.0-flash", "temperature": 0.7}],
+     "aggregate": "median", "quorum": 2, "tolerance": 0}
+
+Judges at temperature 0 must differ in model or rubric: their replies come
+from the response cache, so identical ones would agree by construction.
+"""
+import asyncio
+
+import numpy as np
+
+from prompts import EVALUATOR_SYSTEM_VARIANTS
+from gemini_client import canonical_model
+from scoring import DIMENSIONS, ScorecardError
+from judging import parse_judge_async
+
+AGGREGATES = ("median", "trimmed_mean")
+
+def default_panel(n: int, model: str | None = None) -> list[dict]:
+    """`n` judges on one model: each rubric framing at temperature 0, then sampled repeats."""
+    rubrics = list(EVALUATOR_SYSTEM_VARIANTS)
+    return [
+        {"model": model, "rubric": rubrics[i % len(rubrics)], "temperature": 0.0 if i < len(rubrics) else 0.7}
+        for i in range(n)
+    ]
+
+def panel_from_config(config: dict, model: str | None = None) -> list[dict]:
+    judges = config.get("judges", 3)
+    if isinstance(judges, int):
+        return default_panel(judges, model)
+    panel = [{"model": j.get("model") or model, "rubric": j.get("rubric", "default"), "temperature": float(j.get("temperature", 0.0))} for j in judges]
+    unknown = {j["rubric"] for j in panel} - set(EVALUATOR_SYSTEM_VARIANTS)
+    if unknown:
+        raise ValueError(f"Unknown judge rubric(s) {sorted(unknown)}; known: {', '.join(EVALUATOR_SYSTEM_VARIANTS)}")
+    # temperature-0 calls are served from the response cache, so two such judges with the same
+    # model and rubric would return one reply twice and inflate agreement
+    seen = {}
+    for i, j in enumerate(panel):
+        if j["temperature"] == 0.0:
+            ident = (canonical_model(j["model"]), j["rubric"])
+            if ident in seen:
+                raise ValueError(
+                    f"Judges {seen[ident]} and {i} share model, rubric and temperature 0, so they would return the same cached "
+                    "reply; vary the model, rubric or temperature"
+                )
+            seen[ident] = i
+    return panel
+
+def aggregate_scores(scores: np.ndarray, method: str = "median", trim: float = 0.2) -> np.ndarray:
+    """Column-wise median or trimmed mean of a (judges, dimensions) score matrix."""
+    if method == "median":
+        return np.median(scores, axis=0)
+    if method == "trimmed_mean":
+        k = int(trim * scores.shape[0])
+        ordered = np.sort(scores, axis=0)
+        return ordered[k:scores.shape[0] - k].mean(axis=0)
+    raise ValueError(f"aggregate must be one of {AGGREGATES}")
+
+def krippendorff_alpha(scores: np.ndarray) -> float | None:
+    """Krippendorff's alpha, interval metric, for a (coders, units) matrix; NaN marks a missing rating.
+
+    1 is perfect agreement, 0 is chance level. None when fewer than two
+    ratings share a unit. All-identical ratings count as perfect agreement.
+    """
+    units = [col[~np.isnan(col)] for col in np.asarray(scores, dtype=float).T]
+    units = [u for u in units if len(u) >= 2]
+    if not units:
+        return None
+    values = np.concatenate(units)
+    n = len(values)
+    # observed: squared differences between ratings of the same unit, weighted by 1/(m_u - 1)
+    d_o = sum(((u[:, None] - u[None, :]) ** 2).sum() / (len(u) - 1) for u in units) / n
+    # expected: squared differences between any two pairable ratings
+    d_e = ((values[:, None] - values[None, :]) ** 2).sum() / (n * (n - 1))
+    if d_e == 0:
+        return 1.0
+    return float(1.0 - d_o / d_e)
+
+def _consensus(cards: list[dict], quorum: int, tolerance: float) -> bool:
+    """True when `quorum` cards sit within `tolerance` of the per-dimension median on every dimension."""
+    if len(cards) < quorum:
+        return False
+    scores = np.array([[c[d]["score"] for d in DIMENSIONS] for c in cards], dtype=float)
+    close = (np.abs(scores - np.median(scores, axis=0)) <= tolerance).all(axis=1)
+    return int(close.sum()) >= quorum
+
+async def ensemble_judge(
+    scenario: str,
+    agent_response: str,
+    judge_user: str,
+    panel: list[dict],
+    call,
+    trace=None,
+    aggregate: str = "median",
+    trim: float = 0.2,
+    quorum: int | None = None,
+    tolerance: float = 0.0,
+) -> tuple[dict, dict]:
+    """Run the panel concurrently on one response; returns (scorecard, report).
+
+    `call(system_prompt, user_prompt, temperature, model, metrics)` is an async
+    model call. The scorecard has aggregated (possibly fractional) scores and
+    each dimension's justification from the judge closest to the aggregate.
+    `quorum` defaults to a majority of the panel; pass quorum=len(panel) to
+    never stop early. Cancellation frees the concurrency slot and discards
+    the reply; a provider call already running in a worker thread still
+    finishes in the background (and is still billed). The report's alpha is
+    None when the early cut cancelled a judge.
+    """
+    quorum = quorum or len(panel) // 2 + 1
+    cards: dict[int, dict] = {}
+    status = {i: "pending" for i in range(len(panel))}
+
+    async def member(i: int, judge: dict) -> dict:
+        system = EVALUATOR_SYSTEM_VARIANTS[judge["rubric"]]
+        attrs = {"judge": i, "rubric": judge["rubric"], "judge_temperature": judge["temperature"]}
+
+        async def ask(user_prompt: str, span: dict) -> str:
+            return await call(system, user_prompt, judge["temperature"], judge["model"], span)
+
+        async def reask(user_prompt: str) -> str:
+            if trace is None:
+                return await ask(user_prompt, {})
+            with trace.span("reask", **attrs) as s:
+                return await ask(user_prompt, s)
+
+        if trace is None:
+            raw = await ask(judge_user, {})
+            return await parse_judge_async(raw, scenario, agent_response, reask)
+        with trace.span("judge", **attrs) as s:
+            raw = await ask(judge_user, s)
+        with trace.span("parse", **attrs):
+            return await parse_judge_async(raw, scenario, agent_response, reask)
+
+    tasks = {asyncio.ensure_future(member(i, j)): i for i, j in enumerate(panel)}
+    pending = set(tasks)
+    errors, failures = {}, []
+    consensus = cut_short = False
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                i = tasks[t]
+                if t.exception() is not None:
+                    status[i] = "error"
+                    errors[i] = f"{type(t.exception()).__name__}: {t.exception()}"
+                    failures.append(t.exception())
+                else:
+                    status[i] = "ok"
+                    cards[i] = t.result()
+            if pending and _consensus(list(cards.values()), quorum, tolerance):
+                consensus = cut_short = True
+                break
+    finally:
+        for t in pending:
+            t.cancel()
+            status[tasks[t]] = "cancelled"
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+    consensus = consensus or _consensus(list(cards.values()), quorum, tolerance)
+
+    if not cards:
+        # surface the real failure (quota, unparseable reply, ...) so callers handle it as for one judge
+        raise failures[0] if failures else ScorecardError({"judges": "ensemble has no judges"})
+    order = sorted(cards)
+    scores = np.array([[cards[i][d]["score"] for d in DIMENSIONS] for i in order], dtype=float)
+    agg = aggregate_scores(scores, aggregate, trim)
+    closest = np.abs(scores - agg).argmin(axis=0)            # per dimension
+    spokes = order[int(np.abs(scores - agg).sum(axis=1).argmin())]  # judge nearest overall
+    card = {
+        d: {"score": round(float(agg[k]), 2), "justification": cards[order[closest[k]]][d]["justification"]}
+        for k, d in enumerate(DIMENSIONS)
+    }
+    card["overall_summary"] = cards[spokes].get("overall_summary", "")
+    report = {
+        "aggregate": aggregate,
+        "judges": [
+            {**panel[i], "status": status[i], **({"scores": {d: cards[i][d]["score"] for d in DIMENSIONS}} if i in cards else {}),
+             **({"error": errors[i]} if i in errors else {})}
+            for i in range(len(panel))
+        ],
+        # judges that survived an early cut agree by construction: their alpha says nothing about the panel
+        "alpha": krippendorff_alpha(scores) if not cut_short else None,
+        "spread": {d: float(scores[:, k].max() - scores[:, k].min()) for k, d in enumerate(DIMENSIONS)},
+        "consensus": consensus,
+        "quorum": quorum,
+        "tolerance": tolerance,
+        "scored": len(cards),
+        "cancelled": sum(1 for s in status.values() if s == "cancelled"),
+    }
+    return card, report
+
+async def judge_ensemble(config: dict, scenario: str, agent_response: str, judge_user: str, call, trace=None, model: str | None = None) -> tuple[dict, dict]:
+    """ensemble_judge with panel and options read from an ensemble config dict; `model` fills judges without one."""
+    options = {k: config[k] for k in ("aggregate", "trim", "quorum", "tolerance") if k in config}
+    return await ensemble_judge(scenario, agent_response, judge_user, panel_from_config(config, model), call, trace, **options)
@@ -0,0 +1,486 @@
+# episodes.py
+"""Multi-turn episodes: simulated stakeholders push back, the agent answers, and one judge call scores the transcript.
+
+    python -m episodes run sweep.json --rounds 3            # the sweep's cells as episodes
+    python -m episodes rejudge RUN_ID [RUN_ID ...] --judge-model openai:gpt-4o-mini
+
+An episode opens with the ordinary agent prompt. In each round one
+stakeholder pushes back, and the agent replies with the conversation so
+far in its prompt. Stakeholders are taken in turn from those the scenario
+names ("Your CEO wants ...", "Legal warns ...", "Engineering says ...").
+Each one's stance is the sentence that names it. All episodes of a sweep
+step concurrently; an episode holds a concurrency slot only while one of
+its calls is in flight.
+
+Sweep specs take these extra keys:
+
+    {"rounds": 3, "stakeholder_model": "gemini-2.0-flash", "stakeholder_temperature": 0.7,
+     "stakeholders": [{"role": "CEO", "stance": "The CEO wants the launch next week."}]}
+
+Transcripts are stored in the run payload as {"role", "speaker",
+"utterance"} turns. Utterances go to the blob store (see blobs.py), so a
+re-judged episode shares every text with the run it came from. Costs stay
+bounded over long horizons:
+- each turn sees the conversation compacted to the "history" token budget
+  (older agent turns are compacted first, see tokens.py);
+- stakeholder replies are capped;
+- the judge is called once per episode.
+
+Runs carry fingerprints like sweep cells: engine.cell_fingerprints plus
+the episode settings. `run` reuses a stored run whose fingerprint matches,
+and re-judges a stored transcript whose agent fingerprint matches. So
+changing the judge model or rubric never costs an agent call. `rejudge`
+does the same for explicit run ids.
+"""
+import argparse
+import asyncio
+import json
+import re
+import sys
+import time
+
+import blobs
+from prompts import (
+    AGENT_SYSTEM, EPISODE_AGENT_USER, EVALUATOR_SYSTEM, EVALUATOR_EPISODE_USER, EVALUATOR_REASK_USER,
+    STAKEHOLDER_SYSTEM, STAKEHOLDER_USER,
+)
+from gemini_client import agenerate_text, cache_lookup, canonical_model
+from engine import (
+    agent_call_plan, agent_prompt, build_payload, cell_fingerprints, cells_from_spec, input_digest, load_spec, new_trace,
+)
+from judging import parse_judge_async
+from ratelimit import AGENT, JUDGE, RateLimiter, estimate_tokens
+from scenarios import scenario_text
+from storage import load_run, runs_by_fingerprint, save_run
+from tokens import (
+    MIN_RESPONSE_TOKENS, agent_output_tokens, check_input, compact, count_tokens, counter_name, resolve_budgets,
+)
+from tracing import export
+
+DEFAULT_ROUNDS = 3
+STAKEHOLDER_TEMPERATURE = 0.7
+STAKEHOLDER_OUTPUT_TOKENS = 250  # 2–4 sentences
+MIN_TURN_TOKENS = 60             # a compacted agent turn keeps at least its opening
+# spec keys that decide an episode's result (concurrency / rate_limit only decide speed)
+SETTINGS = ("model", "judge_model", "stakeholder_model", "stakeholder_temperature", "rounds", "stakeholders", "budgets", "cache_samples")
+
+# ------------------ STAKEHOLDERS ------------------
+# a context sentence that names a role becomes that stakeholder's stance
+STAKEHOLDER_CUES = {
+    "CEO": r"\bCEO\b|\bchief executive\b|\bleadership\b",
+    "Legal": r"\blegal\b|\bcounsel\b|\blawyers?\b",
+    "Engineering": r"\bengineering\b|\bengineers?\b|\bCTO\b",
+    "Compliance": r"\bcompliance\b|\bregulators?\b",
+    "Marketing": r"\bmarketing\b",
+    "Investors": r"\binvestors?\b|\bthe board\b",
+    "Clinical partner": r"\bclinicians?\b|\bclinical partners?\b",
+    "Press": r"\bjournalists?\b|\breporters?\b|\bthe press\b",
+}
+_CUES_RE = {role: re.compile(cue, re.IGNORECASE) for role, cue in STAKEHOLDER_CUES.items()}
+_SENTENCES = re.compile(r"(?<=[.!?])\s+|\n+")
+DEFAULT_STAKEHOLDERS = [
+    {"role": "CEO", "stance": "The CEO wants the business commitments met on schedule."},
+    {"role": "Legal", "stance": "Legal is worried about regulatory exposure and liability."},
+    {"role": "Engineering", "stance": "Engineering owns the fix and knows how long it really takes."},
+]
+
+def stakeholders_for(scenario: str, minimum: int = 3) -> list[dict]:
+    """Stakeholders the scenario's context (the text before "Task:") names, in order of appearance.
+
+    A sentence goes to the role named earliest in it ("Legal warns of
+    compliance risk." is Legal's). Fewer than `minimum` are topped up from
+    DEFAULT_STAKEHOLDERS.
+    """
+    context = re.split(r"^\s*Task:", scenario, maxsplit=1, flags=re.M)[0]
+    found = {}
+    for sentence in _SENTENCES.split(context):
+        hits = [(m.start(), role) for role, cue in _CUES_RE.items() if role not in found and (m := cue.search(sentence))]
+        if hits:
+            found[min(hits)[1]] = sentence.strip()
+    out = [{"role": role, "stance": stance} for role, stance in found.items()]
+    for d in DEFAULT_STAKEHOLDERS:
+        if len(out) >= minimum:
+            break
+        if d["role"] not in found:
+            out.append(dict(d))
+    return out
+
+# ------------------ TRANSCRIPTS ------------------
+def render_transcript(turns: list[dict]) -> str:
+    return "\n\n".join(f"[{t['speaker']}] {t['utterance']}" for t in turns)
+
+def fit_transcript(turns: list[dict], max_tokens: int | None) -> tuple[str, dict | None]:
+    """Rendered transcript within max_tokens, deterministically; (text, None) when it already fits.
+
+    Stakeholder turns and the latest agent turn stay whole. The earlier agent
+    turns share what is left: turns shorter than an even share keep their
+    text, the rest are compacted to it (tokens.compact).
+    """
+    text = render_transcript(turns)
+    original = count_tokens(text)
+    if max_tokens is None or original <= max_tokens:
+        return text, None
+    last_agent = max((i for i, t in enumerate(turns) if t["role"] == "agent"), default=-1)
+    squeeze = [i for i, t in enumerate(turns) if t["role"] == "agent" and i != last_agent]
+    sizes = {i: count_tokens(turns[i]["utterance"]) for i in squeeze}
+    # labels and separators of every turn, plus the whole text of the turns that are kept
+    fixed = sum(count_tokens(f"[{t['speaker']}] ") + 1 for t in turns)
+    fixed += sum(count_tokens(t["utterance"]) for i, t in enumerate(turns) if i not in sizes)
+    left, pending, caps = max_tokens - fixed, sorted(squeeze, key=lambda i: (sizes[i], i)), {}
+    while pending and sizes[pending[0]] <= left // len(pending):
+        i = pending.pop(0)
+        caps[i] = sizes[i]
+        left -= sizes[i]
+    for i in pending:
+        caps[i] = max(MIN_TURN_TOKENS, left // len(pending))
+    fitted = [{**t, "utterance": compact(t["utterance"], caps[i])[0]} if i in pending else t for i, t in enumerate(turns)]
+    result = render_transcript(fitted)
+    method = "per-turn"
+    if count_tokens(result) > max_tokens:
+        # the kept turns alone are over budget (a tiny budget or a very long reply): compact the whole text
+        result, method = compact(text, max_tokens)[0], "whole-transcript"
+    return result, {
+        "method": method,
+        "budget": max_tokens,
+        "original_tokens": original,
+        "compacted_tokens": count_tokens(result),
+        "turns": len(turns),
+        "turns_compacted": len(pending),
+        "original_sha256": blobs.digest(text),
+    }
+
+def _room(prompt_without_transcript: str, budgets: dict) -> int | None:
+    """Tokens a turn's prompt can spend on the conversation: the history budget, within agent_input."""
+    limits = [budgets.get("history")]
+    if budgets.get("agent_input") is not None:
+        limits.append(budgets["agent_input"] - count_tokens(prompt_without_transcript))
+    limits = [n for n in limits if n is not None]
+    return max(MIN_RESPONSE_TOKENS, min(limits)) if limits else None
+
+# ------------------ PROMPTS & FINGERPRINTS ------------------
+def stakeholder_prompt(scenario: str, stakeholder: dict, transcript: str) -> str:
+    return STAKEHOLDER_USER.format(role=stakeholder["role"], stance=stakeholder["stance"], scenario=scenario, transcript=transcript)
+
+def episode_agent_prompt(scenario: str, persona: str, transcript: str, speaker: str, max_output_tokens: int | None = None) -> str:
+    return agent_prompt(scenario, persona, max_output_tokens, EPISODE_AGENT_USER, transcript=transcript, speaker=speaker)
+
+def episode_judge_prompt(scenario: str, transcript: str) -> str:
+    return EVALUATOR_EPISODE_USER.format(scenario=scenario, transcript=transcript)
+
+def judged_fingerprints(agent_fingerprint: str, parts: dict, judge_model: str | None, budgets: dict) -> dict:
+    """An episode's agent fingerprint combined with the judge side (episode rubric, judge model, judge budgets)."""
+    judge = input_digest(
+        EVALUATOR_SYSTEM, EVALUATOR_EPISODE_USER, EVALUATOR_REASK_USER, canonical_model(judge_model),
+        budgets["judge_input"], budgets["judge_output"],
+    )
+    return {
+        "agent_fingerprint": agent_fingerprint,
+        "fingerprint": input_digest(agent_fingerprint, judge),
+        "fingerprint_parts": {**parts, "judge": judge[:16]},
+    }
+
+def episode_fingerprints(cell: dict, scenario: str, stakeholders: list[dict], settings: dict) -> dict:
+    """engine.cell_fingerprints for the opening turn, extended with everything that shapes the later turns."""
+    budgets = resolve_budgets(settings.get("budgets"))
+    model = settings.get("model")
+    base = cell_fingerprints(cell, scenario, model, settings.get("judge_model"), budgets=budgets)
+    episode = input_digest(
+        EPISODE_AGENT_USER, STAKEHOLDER_SYSTEM, STAKEHOLDER_USER, stakeholders, int(settings["rounds"]),
+        canonical_model(settings.get("stakeholder_model") or model), float(settings["stakeholder_temperature"]),
+        STAKEHOLDER_OUTPUT_TOKENS, budgets["history"],
+    )
+    parts = {k: v for k, v in base["fingerprint_parts"].items() if not k.startswith("judge")}
+    return judged_fingerprints(
+        input_digest(base["agent_fingerprint"], episode), {**parts, "episode": episode[:16]},
+        settings.get("judge_model") or model, budgets,
+    )
+
+# ------------------ EPISODES ------------------
+def settings_from_spec(spec: dict) -> dict:
+    settings = {k: spec.get(k) for k in SETTINGS}
+    settings["rounds"] = int(spec.get("rounds", DEFAULT_ROUNDS))
+    settings["stakeholder_temperature"] = float(spec.get("stakeholder_temperature", STAKEHOLDER_TEMPERATURE))
+    return settings
+
+def _caller(concurrency: int, limiter: RateLimiter | None):
+    """Async model call with at most `concurrency` in flight; cache hits skip the limiter."""
+    sem = asyncio.Semaphore(concurrency)
+
+    async def call(system_prompt, user_prompt, temperature, model, priority, sample, metrics, max_output_tokens=None):
+        async def send(use_cache=None):
+            async with sem:
+                return await agenerate_text(
+                    system_prompt, user_prompt, temperature=temperature, model=model, sample=sample, use_cache=use_cache,
+                    metrics=metrics, max_output_tokens=max_output_tokens,
+                )
+        if limiter is None:
+            return await send()
+        cache, key, hit = cache_lookup(system_prompt, user_prompt, temperature, model, sample, None, max_output_tokens)
+        if hit is not None:
+            metrics.update(model=canonical_model(model), cached=True, ttft_s=0.0, latency_s=0.0)
+            return hit
+        tokens = estimate_tokens(system_prompt, user_prompt) + (max_output_tokens or 1000)
+        text = await limiter.call(lambda: send(False), tokens=tokens, priority=priority, metrics=metrics)
+        if cache is not None and text:
+            cache.put(key, text)
+        return text
+
+    return call
+
+async def _play(cell: dict, scenario: str, stakeholders: list[dict], settings: dict, budgets: dict, call, trace) -> tuple[list[dict], list[int]]:
+    """Agent and stakeholder turns of one episode; returns (turns, agent prompt tokens per agent turn)."""
+    persona, model = cell["persona"], settings.get("model")
+    stakeholder_model = settings.get("stakeholder_model") or model
+    sample = cell.get("repeat", 0) if settings.get("cache_samples") else None
+    cap = agent_output_tokens(persona, budgets)
+
+    with trace.span("format"):
+        user, _, n = agent_call_plan(scenario, persona, budgets)
+    with trace.span("agent", turn=0) as s:
+        text = await call(AGENT_SYSTEM, user, cell["temperature"], model, AGENT, sample, s, cap)
+    turns, inputs = [{"role": "agent", "speaker": "Agent", "utterance": text}], [n]
+
+    for r in range(int(settings["rounds"])):
+        who = stakeholders[r % len(stakeholders)]
+        with trace.span("format"):
+            history, _ = fit_transcript(turns, _room(STAKEHOLDER_SYSTEM + stakeholder_prompt(scenario, who, ""), budgets))
+            user = stakeholder_prompt(scenario, who, history)
+        with trace.span("stakeholder", turn=len(turns), speaker=who["role"]) as s:
+            text = await call(
+                STAKEHOLDER_SYSTEM, user, settings["stakeholder_temperature"], stakeholder_model, AGENT, sample, s,
+                STAKEHOLDER_OUTPUT_TOKENS,
+            )
+        turns.append({"role": "stakeholder", "speaker": who["role"], "utterance": text.strip()})
+
+        with trace.span("format"):
+            history, _ = fit_transcript(turns, _room(AGENT_SYSTEM + episode_agent_prompt(scenario, persona, "", who["role"], cap), budgets))
+            user = episode_agent_prompt(scenario, persona, history, who["role"], cap)
+            inputs.append(check_input("agent", AGENT_SYSTEM, user, budgets=budgets))
+        with trace.span("agent", turn=len(turns)) as s:
+            text = await call(AGENT_SYSTEM, user, cell["temperature"], model, AGENT, sample, s, cap)
+        turns.append({"role": "agent", "speaker": "Agent", "utterance": text})
+    return turns, inputs
+
+async def _episode(
+    cell: dict, scenario: str, stakeholders: list[dict], fingerprints: dict, settings: dict, call, save: bool,
+    turns: list[dict] | None = None, source: str | None = None,
+) -> dict:
+    """Play (unless `turns` is a stored transcript), judge and save one episode."""
+    budgets = resolve_budgets(settings.get("budgets"))
+    model = settings.get("model")
+    judge_model = settings.get("judge_model") or model
+    judge_cap = budgets["judge_output"]
+    trace = new_trace("episode", cell)
+
+    try:
+        agent_inputs = None
+        if turns is None:
+            turns, agent_inputs = await _play(cell, scenario, stakeholders, settings, budgets, call, trace)
+
+        with trace.span("format"):
+            room = None
+            if budgets["judge_input"] is not None:
+                room = max(MIN_RESPONSE_TOKENS, budgets["judge_input"] - count_tokens(EVALUATOR_SYSTEM + episode_judge_prompt(scenario, "")))
+            view, compaction = fit_transcript(turns, room)
+            judge_user = episode_judge_prompt(scenario, view)
+
+        async def reask(user_prompt: str) -> str:
+            with trace.span("reask") as s:
+                return await call(EVALUATOR_SYSTEM, user_prompt, 0.0, judge_model, JUDGE, None, s, judge_cap)
+
+        with trace.span("judge") as s:
+            raw = await call(EVALUATOR_SYSTEM, judge_user, 0.0, judge_model, JUDGE, None, s, judge_cap)
+        with trace.span("parse"):
+            eval_json = await parse_judge_async(raw, scenario, view, reask)
+
+        tokens = {
+            "counter": counter_name(),
+            "budgets": budgets,
+            "transcript": count_tokens(render_transcript(turns)),
+            "judge_input": count_tokens(EVALUATOR_SYSTEM) + count_tokens(judge_user),
+            "compaction": compaction,
+        }
+        if agent_inputs is not None:
+            tokens["agent_input"], tokens["agent_max_output"] = agent_inputs, agent_output_tokens(cell["persona"], budgets)
+        final = next(t["utterance"] for t in reversed(turns) if t["role"] == "agent")
+        payload = build_payload(cell, scenario, final, eval_json, model, judge_model, trace, fingerprints=fingerprints, tokens=tokens)
+        payload.update({
+            "kind": "episode",
+            "rounds": int(settings["rounds"]),
+            "stakeholders": stakeholders,
+            "stakeholder_model": settings.get("stakeholder_model") or payload["model"],
+            "stakeholder_temperature": float(settings["stakeholder_temperature"]),
+            "transcript": turns,
+        })
+        if source is not None:
+            payload["rejudged_from"] = source
+        if save:
+            with trace.span("persist"):
+                payload["run_id"] = await asyncio.to_thread(save_run, payload)
+            payload["trace"] = trace.to_dict()
+        return payload
+    finally:
+        export(trace)
+
+async def run_episodes(
+    cells: list[dict],
+    settings: dict | None = None,
+    concurrency: int = 8,
+    limiter: RateLimiter | None = None,
+    on_result=None,
+    save: bool = True,
+    reuse: bool = True,
+) -> list[dict]:
+    """Every cell as an episode, all stepping concurrently; results in completion order.
+
+    `settings` holds the SETTINGS keys (see settings_from_spec). Each result
+    is the run payload plus "status": "reused" (stored run, no calls),
+    "rejudged" (stored transcript, one judge call) or "ran". A failed
+    episode yields {"cell": ..., "error": ...} instead of aborting the rest.
+    """
+    settings = settings_from_spec(settings or {})
+    call = _caller(concurrency, limiter)
+    jobs = []
+    for cell in cells:
+        scenario = cell.get("scenario") or scenario_text(cell["scenario_key"])
+        stakeholders = settings["stakeholders"] or stakeholders_for(scenario)
+        jobs.append((cell, scenario, stakeholders, episode_fingerprints(cell, scenario, stakeholders, settings)))
+    full = agent = {}
+    if reuse:
+        full = runs_by_fingerprint([j[3]["fingerprint"] for j in jobs])
+        agent = runs_by_fingerprint([j[3]["agent_fingerprint"] for j in jobs if j[3]["fingerprint"] not in full], agent=True)
+
+    async def one(cell, scenario, stakeholders, fps) -> dict:
+        try:
+            if fps["fingerprint"] in full:
+                run_id = full[fps["fingerprint"]]
+                return {**await asyncio.to_thread(load_run, run_id), "run_id": run_id, "status": "reused"}
+            if fps["agent_fingerprint"] in agent:
+                source = agent[fps["agent_fingerprint"]]
+                stored = await asyncio.to_thread(load_run, source)
+                payload = await _episode(cell, scenario, stakeholders, fps, settings, call, save, stored["transcript"], source)
+                return {**payload, "status": "rejudged"}
+            return {**await _episode(cell, scenario, stakeholders, fps, settings, call, save), "status": "ran"}
+        except Exception as e:
+            return {"cell": cell, "error": str(e)}
+
+    results = []
+    for fut in asyncio.as_completed([one(*j) for j in jobs]):
+        res = await fut
+        results.append(res)
+        if on_result is not None:
+            on_result(res)
+    return results
+
+async def rejudge(
+    run_ids: list[str],
+    judge_model: str | None = None,
+    budgets: dict | None = None,
+    concurrency: int = 8,
+    limiter: RateLimiter | None = None,
+    on_result=None,
+    save: bool = True,
+    reuse: bool = True,
+) -> list[dict]:
+    """Judge stored episode transcripts again, with no agent or stakeholder calls.
+
+    `judge_model` defaults to each run's own judge (to re-score with the
+    current rubric); `budgets` overrides the stored judge budgets. Each new
+    run keeps the original's agent fingerprint and records "rejudged_from".
+    A run whose new fingerprint is already stored is reused.
+    """
+    call = _caller(concurrency, limiter)
+
+    async def one(run_id: str) -> dict:
+        try:
+            stored = await asyncio.to_thread(load_run, run_id)
+            if stored.get("kind") != "episode":
+                raise ValueError(f"Run {run_id} is not an episode")
+            settings = {
+                "model": stored["model"],
+                "judge_model": judge_model or stored["judge_model"],
+                "stakeholder_model": stored["stakeholder_model"],
+                "stakeholder_temperature": stored["stakeholder_temperature"],
+                "rounds": stored["rounds"],
+                "budgets": {**((stored.get("tokens") or {}).get("budgets") or {}), **(budgets or {})},
+            }
+            parts = {k: v for k, v in (stored.get("fingerprint_parts") or {}).items() if k != "judge"}
+            fps = judged_fingerprints(
+                stored["agent_fingerprint"], parts, settings["judge_model"], resolve_budgets(settings["budgets"])
+            )
+            if reuse:
+                hit = runs_by_fingerprint([fps["fingerprint"]]).get(fps["fingerprint"])
+                if hit is not None:
+                    return {**await asyncio.to_thread(load_run, hit), "run_id": hit, "status": "reused"}
+            cell = {k: stored[k] for k in ("scenario_key", "persona", "temperature", "repeat")}
+            payload = await _episode(cell, stored["scenario"], stored["stakeholders"], fps, settings, call, save, stored["transcript"], run_id)
+            return {**payload, "status": "rejudged"}
+        except Exception as e:
+            return {"run_id": run_id, "error": str(e)}
+
+    results = []
+    for fut in asyncio.as_completed([one(r) for r in run_ids]):
+        res = await fut
+        results.append(res)
+        if on_result is not None:
+            on_result(res)
+    return results
+
+# ------------------ CLI ------------------
+def _summary(results: list[dict]) -> dict:
+    counts = {s: sum(1 for r in results if r.get("status") == s) for s in ("ran", "rejudged", "reused")}
+    # model calls made by this invocation (a reused run's stored trace is not counted)
+    spans = [s for r in results if r.get("status") in ("ran", "rejudged") for s in (r.get("trace") or {}).get("spans", [])]
+    calls = {f"{name}_calls": sum(1 for s in spans if s["name"] == name) for name in ("agent", "stakeholder", "judge", "reask")}
+    return {**counts, "errors": sum(1 for r in results if "error" in r), **calls}
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m episodes", description="Multi-turn episodes with simulated stakeholders.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    run = sub.add_parser("run", help="run a sweep spec's cells as episodes (reusing stored transcripts)")
+    run.add_argument("spec", help="JSON or YAML sweep spec")
+    run.add_argument("--rounds", type=int, help="stakeholder rounds per episode (overrides spec)")
+    run.add_argument("--no-reuse", action="store_true", help="play every episode even if a matching run is stored")
+    rj = sub.add_parser("rejudge", help="judge stored episode transcripts again, without agent calls")
+    rj.add_argument("run_ids", nargs="+")
+    for p in (run, rj):
+        p.add_argument("--judge-model")
+        p.add_argument("--concurrency", type=int, default=8)
+        p.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    def on_result(res: dict) -> None:
+        if "error" in res:
+            where = res.get("run_id") or f"{res['cell']['scenario_key']} · {res['cell']['persona']}"
+            print(f"ERROR {where}: {res['error']}", file=sys.stderr)
+        else:
+            print(f"{res['status']:<8} {res['scenario_key']} · {res['persona']} · t={res['temperature']} #{res.get('repeat', 0)}"
+                  f" ({res['rounds']} rounds) → {res['overall_100']:.1f}", file=sys.stderr)
+
+    t0 = time.perf_counter()
+    if args.cmd == "run":
+        spec = load_spec(args.spec)
+        if args.rounds is not None:
+            spec["rounds"] = args.rounds
+        if args.judge_model:
+            spec["judge_model"] = args.judge_model
+        rl = spec.get("rate_limit")
+        results = asyncio.run(run_episodes(
+            cells_from_spec(spec),
+            settings_from_spec(spec),
+            concurrency=args.concurrency,
+            limiter=RateLimiter(rpm=float(rl.get("rpm", 15)), tpm=float(rl.get("tpm", 1_000_000))) if rl else None,
+            on_result=on_result,
+            save=not args.no_save,
+            reuse=not args.no_reuse,
+        ))
+    else:
+        results = asyncio.run(rejudge(
+            args.run_ids, judge_model=args.judge_model, concurrency=args.concurrency, on_result=on_result, save=not args.no_save,
+        ))
+    summary = _summary(results)
+    print(json.dumps({**summary, "elapsed_s": round(time.perf_counter() - t0, 3)}))
+    return 0 if not summary["errors"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,44 @@
 # gemini_client.py
+import json
 import os
+import re
+import threading
+import time
 from pathlib import Path
 from dotenv import load_dotenv
 from google import genai
 
+from cache import cache_key, get_cache
+from providers import Provider, QuotaExceededError, get_provider, model_label, parse_spec, register
+
 # ✅ load .env from project root (same folder as this file)
 ENV_PATH = Path(__file__).resolve().parent / ".env"
 load_dotenv(dotenv_path=ENV_PATH, override=True)
 
 DEFAULT_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash").strip()
 
+# ------------------ CLIENT REGISTRY ------------------
+# One genai.Client per (api_key, model, transport options), shared by every thread.
+# Each client owns an HTTP connection pool, so reusing it keeps connections alive
+# instead of paying client setup + a TLS handshake on every agent/judge call.
+_CLIENTS: dict = {}
+_CLIENTS_LOCK = threading.Lock()
+_CLIENT_STATS = {"created": 0, "reused": 0, "closed": 0}
+_client_factory = genai.Client
+
+_RETRY_DELAY_RE = re.compile(r"retry(?:Delay['\"]?:\s*['\"]?| in )([0-9.]+)\s*s", re.IGNORECASE)
+
+def _retry_after(e: Exception) -> float | None:
+    response = getattr(e, "response", None)
+    header = (getattr(response, "headers", None) or {}).get("retry-after")
+    if header:
+        try:
+            return float(header)
+        except ValueError:
+            pass
+    m = _RETRY_DELAY_RE.search(str(e))
+    return float(m.group(1)) if m else None
+
 def _get_api_key() -> str:
     key = (os.getenv("GEMINI_API_KEY", "")).strip()
     if key.startswith('"') and key.endswith('"'):
@@ -21,24 +50,272 @@ def _get_api_key() -> str:
         )
     return key
 
-def generate_text(system_prompt: str, user_prompt: str, temperature: float = 0.3, model: str | None = None) -> str:
+def _options_key(http_options: dict | None) -> str:
+    return json.dumps(http_options or {}, sort_keys=True, default=str)
+
+def get_client(model: str | None = None, http_options: dict | None = None):
+    """Return the shared client for this key/model/transport, creating it on first use."""
     key = _get_api_key()
-    client = genai.Client(api_key=key)
     model_name = (model or DEFAULT_MODEL).strip()
+    reg_key = (key, model_name, _options_key(http_options))
 
-    try:
-        resp = client.models.generate_content(
-            model=model_name,
-            contents=[{
-                "role": "user",
-                "parts": [{"text": f"SYSTEM:\n{system_prompt}\n\nUSER:\n{user_prompt}"}],
-            }],
-            config={"temperature": float(temperature)},
-        )
-        return (resp.text or "").strip()
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(reg_key)
+        if client is not None:
+            _CLIENT_STATS["reused"] += 1
+            return client
+        kwargs = {"api_key": key}
+        if http_options:
+            kwargs["http_options"] = http_options
+        client = _client_factory(**kwargs)
+        _CLIENTS[reg_key] = client
+        _CLIENT_STATS["created"] += 1
+        return client
+
+def close_clients() -> None:
+    """Close every pooled client (e.g. at shutdown or after rotating the API key)."""
+    with _CLIENTS_LOCK:
+        clients = list(_CLIENTS.values())
+        _CLIENTS.clear()
+    for client in clients:
+        close = getattr(client, "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception:
+                pass
+    with _CLIENTS_LOCK:
+        _CLIENT_STATS["closed"] += len(clients)
+
+def reset_clients(factory=None) -> None:
+    """Close all clients, zero the stats and optionally swap the client factory (fake transports)."""
+    global _client_factory
+    close_clients()
+    with _CLIENTS_LOCK:
+        _client_factory = factory or genai.Client
+        for k in _CLIENT_STATS:
+            _CLIENT_STATS[k] = 0
+
+def client_stats() -> dict:
+    with _CLIENTS_LOCK:
+        stats = dict(_CLIENT_STATS)
+        stats["open"] = len(_CLIENTS)
+    total = stats["created"] + stats["reused"]
+    stats["reuse_ratio"] = (stats["reused"] / total) if total else 0.0
+    return stats
+
+def cache_lookup(
+    system_prompt: str,
+    user_prompt: str,
+    temperature: float,
+    model: str | None = None,
+    sample: int | None = None,
+    use_cache: bool | None = None,
+    max_output_tokens: int | None = None,
+):
+    """Return (cache, key, cached_text) for a call; cache is None when the call is not cacheable."""
+    model_name = model_label(*parse_spec(model or DEFAULT_MODEL))
+    if max_output_tokens:
+        model_name += f"|max_output_tokens={int(max_output_tokens)}"  # uncapped calls keep their old keys
+    if use_cache is None:
+        use_cache = float(temperature) == 0.0 or sample is not None
+    cache = get_cache() if use_cache else None
+    if cache is None:
+        return None, None, None
+    key = cache_key(model_name, system_prompt, user_prompt, temperature, sample or 0)
+    return cache, key, cache.get(key)
+
+def _contents(system_prompt: str, user_prompt: str) -> list:
+    return [{
+        "role": "user",
+        "parts": [{"text": f"SYSTEM:\n{system_prompt}\n\nUSER:\n{user_prompt}"}],
+    }]
+
+def _quota_error(e: Exception) -> QuotaExceededError | None:
+    msg = str(e)
+    if "RESOURCE_EXHAUSTED" in msg or "429" in msg or "quota" in msg.lower():
+        return QuotaExceededError(_retry_after(e))
+    return None
+
+def _record_usage(metrics: dict, resp) -> None:
+    usage = getattr(resp, "usage_metadata", None)
+    if usage is None:
+        return
+    if getattr(usage, "prompt_token_count", None) is not None:
+        metrics["input_tokens"] = usage.prompt_token_count
+    if getattr(usage, "candidates_token_count", None) is not None:
+        metrics["output_tokens"] = usage.candidates_token_count
+
+class GeminiProvider(Provider):
+    """google-genai backend over the pooled clients above; bare model names resolve here.
+
+    agenerate keeps the default thread offload: a genai client's aio session is
+    bound to the first event loop it runs on, and pooled clients outlive loops.
+    """
+
+    name = "gemini"
+
+    @staticmethod
+    def _config(temperature: float, options: dict) -> dict:
+        config = {"temperature": float(temperature)}
+        if options.get("max_output_tokens"):
+            config["max_output_tokens"] = int(options["max_output_tokens"])
+        return config
+
+    def generate(self, system_prompt, user_prompt, temperature, model, metrics, http_options=None, **options) -> str:
+        client = get_client(model, http_options)
+        try:
+            resp = client.models.generate_content(
+                model=model,
+                contents=_contents(system_prompt, user_prompt),
+                config=self._config(temperature, options),
+            )
+        except Exception as e:
+            quota = _quota_error(e)
+            if quota is not None:
+                raise quota from e
+            raise
+        _record_usage(metrics, resp)
+        return resp.text or ""
+
+    def stream(self, system_prompt, user_prompt, temperature, model, metrics, http_options=None, **options):
+        client = get_client(model, http_options)
+        try:
+            stream = client.models.generate_content_stream(
+                model=model,
+                contents=_contents(system_prompt, user_prompt),
+                config=self._config(temperature, options),
+            )
+            for chunk in stream:
+                _record_usage(metrics, chunk)  # the final chunk carries the totals
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            quota = _quota_error(e)
+            if quota is not None:
+                raise quota from e
+            raise
+
+register(GeminiProvider())
+
+def _resolve(model: str | None) -> tuple[Provider, str, str]:
+    """(provider, provider-local model name, canonical spec) for a model spec."""
+    provider_name, model_name = parse_spec(model or DEFAULT_MODEL)
+    return get_provider(provider_name), model_name, model_label(provider_name, model_name)
+
+def canonical_model(model: str | None) -> str:
+    """The spec a model is recorded and cached under ("gemini-2.0-flash", "openai:gpt-4o-mini", ...)."""
+    return _resolve(model)[2]
+
+def _new_metrics(metrics: dict | None, model_name: str) -> dict:
+    m = metrics if metrics is not None else {}
+    m.update({"model": model_name, "cached": False, "ttft_s": None, "latency_s": None, "input_tokens": None, "output_tokens": None})
+    return m
+
+def generate_text(
+    system_prompt: str,
+    user_prompt: str,
+    temperature: float = 0.3,
+    model: str | None = None,
+    http_options: dict | None = None,
+    sample: int | None = None,
+    use_cache: bool | None = None,
+    metrics: dict | None = None,
+    max_output_tokens: int | None = None,
+) -> str:
+    """Single model call; `model` is a provider spec (see providers.py), a bare name means Gemini.
+
+    Deterministic calls (temperature 0) are served from the response cache by
+    default. Sampling calls are only cached when given a `sample` index, which
+    becomes part of the key; `use_cache` forces caching on or off.
+    If `metrics` is given it is filled with latency and token counts.
+    `max_output_tokens` caps the reply (see tokens.py) and is part of the cache key.
+    """
+    provider, model_name, label = _resolve(model)
+    m = _new_metrics(metrics, label)
+    t0 = time.perf_counter()
+    cache, key, hit = cache_lookup(system_prompt, user_prompt, temperature, label, sample, use_cache, max_output_tokens)
+    if hit is not None:
+        m.update(cached=True, ttft_s=time.perf_counter() - t0, latency_s=time.perf_counter() - t0)
+        return hit
+
+    text = provider.generate(
+        system_prompt, user_prompt, temperature, model_name, m, http_options=http_options, max_output_tokens=max_output_tokens
+    )
+    # non-streaming: the first token arrives with the whole response
+    m["latency_s"] = m["ttft_s"] = time.perf_counter() - t0
+    text = (text or "").strip()
+    if cache is not None and text:
+        cache.put(key, text)
+    return text
+
+async def agenerate_text(
+    system_prompt: str,
+    user_prompt: str,
+    temperature: float = 0.3,
+    model: str | None = None,
+    http_options: dict | None = None,
+    sample: int | None = None,
+    use_cache: bool | None = None,
+    metrics: dict | None = None,
+    max_output_tokens: int | None = None,
+) -> str:
+    """Async generate_text: same caching and metrics, using the provider's native async path."""
+    provider, model_name, label = _resolve(model)
+    m = _new_metrics(metrics, label)
+    t0 = time.perf_counter()
+    cache, key, hit = cache_lookup(system_prompt, user_prompt, temperature, label, sample, use_cache, max_output_tokens)
+    if hit is not None:
+        m.update(cached=True, ttft_s=time.perf_counter() - t0, latency_s=time.perf_counter() - t0)
+        return hit
+
+    text = await provider.agenerate(
+        system_prompt, user_prompt, temperature, model_name, m, http_options=http_options, max_output_tokens=max_output_tokens
+    )
+    m["latency_s"] = m["ttft_s"] = time.perf_counter() - t0
+    text = (text or "").strip()
+    if cache is not None and text:
+        cache.put(key, text)
+    return text
+
+def generate_text_stream(
+    system_prompt: str,
+    user_prompt: str,
+    temperature: float = 0.3,
+    model: str | None = None,
+    http_options: dict | None = None,
+    sample: int | None = None,
+    use_cache: bool | None = None,
+    metrics: dict | None = None,
+    max_output_tokens: int | None = None,
+):
+    """Streaming variant of generate_text: yields text chunks as they arrive.
+
+    `metrics` gets time-to-first-token, total latency and token counts once the
+    stream is exhausted. Same caching rules as generate_text; a hit is yielded
+    as one chunk.
+    """
+    provider, model_name, label = _resolve(model)
+    m = _new_metrics(metrics, label)
+    t0 = time.perf_counter()
+    cache, key, hit = cache_lookup(system_prompt, user_prompt, temperature, label, sample, use_cache, max_output_tokens)
+    if hit is not None:
+        m.update(cached=True, ttft_s=time.perf_counter() - t0, latency_s=time.perf_counter() - t0)
+        yield hit
+        return
+
+    parts = []
+    for text in provider.stream(
+        system_prompt, user_prompt, temperature, model_name, m, http_options=http_options, max_output_tokens=max_output_tokens
+    ):
+        if not text:
+            continue
+        if m["ttft_s"] is None:
+            m["ttft_s"] = time.perf_counter() - t0
+        parts.append(text)
+        yield text
 
-    except Exception as e:
-        msg = str(e)
-        if "RESOURCE_EXHAUSTED" in msg or "429" in msg or "quota" in msg.lower():
-            raise RuntimeError("GEMINI_QUOTA_EXCEEDED") from e
-        raise
+    m["latency_s"] = time.perf_counter() - t0
+    full = "".join(parts).strip()
+    if cache is not None and full:
+        cache.put(key, full)
@@ -0,0 +1,173 @@
+# judging.py
+import asyncio
+
+from prompts import (
+    EVALUATOR_SYSTEM, EVALUATOR_USER, EVALUATOR_BATCH_USER, EVALUATOR_BATCH_ITEM, EVALUATOR_REASK_USER, EVALUATOR_PAIRWISE_REASK,
+)
+from gemini_client import agenerate_text
+from scoring import ScorecardError, safe_parse_json, complete_scorecard, parse_batch_json, parse_pairwise_json, DIMENSIONS
+
+DEFAULT_BATCH_SIZE = 4
+
+# ------------------ TARGETED RE-ASK ------------------
+def reask_prompt(scenario: str, agent_response: str, dimensions: list[str]) -> str:
+    schema = ",\n".join(f'  "{d}": {{"score": 1, "justification": ""}}' for d in dimensions)
+    return EVALUATOR_REASK_USER.format(
+        scenario=scenario, agent_response=agent_response, dimensions=", ".join(dimensions), schema=schema
+    )
+
+def parse_judge(raw: str, scenario: str, agent_response: str, ask) -> dict:
+    """safe_parse_json, re-asking the judge once for only the dimensions that failed.
+
+    `ask(user_prompt)` returns the judge's raw reply; it is not called when
+    the first reply parses. Raises ScorecardError if the re-ask does not fill
+    the gaps either.
+    """
+    try:
+        return safe_parse_json(raw)
+    except ScorecardError as e:
+        return complete_scorecard(e, ask(reask_prompt(scenario, agent_response, list(e.errors))))
+
+async def parse_judge_async(raw: str, scenario: str, agent_response: str, ask) -> dict:
+    """parse_judge for an async `ask(user_prompt)`."""
+    try:
+        return safe_parse_json(raw)
+    except ScorecardError as e:
+        return complete_scorecard(e, await ask(reask_prompt(scenario, agent_response, list(e.errors))))
+
+async def parse_pairwise_async(raw: str, user_prompt: str, ask) -> dict:
+    """parse_pairwise_json, re-asking the judge once (with the reason) when the verdict is unreadable.
+
+    The re-ask is the original pairwise prompt plus a short correction, so it
+    is not answered from the cached first reply.
+    """
+    try:
+        return parse_pairwise_json(raw)
+    except ScorecardError as e:
+        return parse_pairwise_json(await ask(user_prompt + EVALUATOR_PAIRWISE_REASK.format(error=e)))
+
+# ------------------ BATCHED JUDGING ------------------
+def batch_prompt(scenario: str, responses: dict) -> str:
+    items = "\n".join(EVALUATOR_BATCH_ITEM.format(response_id=rid, agent_response=text) for rid, text in responses.items())
+    return EVALUATOR_BATCH_USER.format(scenario=scenario, responses=items, response_ids=", ".join(responses))
+
+async def judge_batch_async(scenario: str, responses: dict, call, batch_size: int = DEFAULT_BATCH_SIZE) -> tuple[dict, dict]:
+    """Score many responses to one scenario with as few judge requests as possible.
+
+    `call(system_prompt, user_prompt)` must return an awaitable of the raw judge
+    text. Responses are packed `batch_size` per request. A batch that fails to
+    parse entirely is split in half; elements that fail on their own are
+    re-asked as a smaller batch, and a single leftover falls back to the
+    ordinary one-response judge prompt.
+
+    Returns ({response_id: scorecard or Exception}, stats).
+    """
+    results: dict = {}
+    stats = {"requests": 0, "splits": 0, "retried": 0}
+
+    async def judge(ids: list[str]) -> None:
+        stats["requests"] += 1
+        if len(ids) == 1:
+            rid = ids[0]
+            try:
+                raw = await call(EVALUATOR_SYSTEM, EVALUATOR_USER.format(scenario=scenario, agent_response=responses[rid]))
+                results[rid] = await parse_judge_async(raw, scenario, responses[rid], lambda u: call(EVALUATOR_SYSTEM, u))
+            except Exception as e:
+                results[rid] = e
+            return
+
+        try:
+            raw = await call(EVALUATOR_SYSTEM, batch_prompt(scenario, {rid: responses[rid] for rid in ids}))
+            ok, failed = parse_batch_json(raw, ids)
+        except Exception as e:
+            ok, failed = {}, {rid: str(e) for rid in ids}
+        results.update(ok)
+        if not failed:
+            return
+        retry = [rid for rid in ids if rid in failed]
+        if len(retry) < len(ids):
+            stats["retried"] += len(retry)
+            await judge(retry)
+        else:
+            stats["splits"] += 1
+            mid = len(ids) // 2
+            await asyncio.gather(judge(ids[:mid]), judge(ids[mid:]))
+
+    ids = list(responses)
+    await asyncio.gather(*(judge(ids[i:i + batch_size]) for i in range(0, len(ids), batch_size)))
+    return results, stats
+
+class JudgeBatcher:
+    """Collects one scenario's agent responses during a sweep and judges them `batch_size` at a time.
+
+    A batch is sent as soon as it is full, or when no agent call for the
+    scenario is still outstanding, so no cell waits on agents that will never
+    arrive.
+    """
+
+    def __init__(self, scenario: str, batch_size: int, pending: int, call):
+        self.scenario = scenario
+        self.batch_size = batch_size
+        self.pending = pending
+        self.call = call
+        self.buffer: dict = {}
+        self._tasks: set = set()
+        self._next_id = 0
+
+    def submit(self, agent_response: str) -> asyncio.Future:
+        """Queue a response for judging; the future resolves to its scorecard."""
+        fut = asyncio.get_running_loop().create_future()
+        self._next_id += 1
+        self.buffer[f"r{self._next_id}"] = (agent_response, fut)
+        self.agent_done()
+        return fut
+
+    def agent_done(self) -> None:
+        """Call once per cell whose agent call finished (submit does this) or failed."""
+        self.pending -= 1
+        if self.buffer and (len(self.buffer) >= self.batch_size or self.pending <= 0):
+            batch, self.buffer = self.buffer, {}
+            task = asyncio.ensure_future(self._flush(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, batch: dict) -> None:
+        try:
+            results, _ = await judge_batch_async(self.scenario, {rid: r for rid, (r, _) in batch.items()}, self.call, self.batch_size)
+        except Exception as e:
+            results = {rid: e for rid in batch}
+        for rid, (_, fut) in batch.items():
+            res = results.get(rid, RuntimeError("Batch judge returned no result."))
+            if isinstance(res, Exception):
+                fut.set_exception(res)
+            else:
+                fut.set_result(res)
+
+def judge_batch(scenario: str, responses: dict, batch_size: int = DEFAULT_BATCH_SIZE, model: str | None = None) -> tuple[dict, dict]:
+    """Blocking wrapper around judge_batch_async using agenerate_text."""
+    async def call(system_prompt, user_prompt):
+        return await agenerate_text(system_prompt, user_prompt, temperature=0.0, model=model)
+    return asyncio.run(judge_batch_async(scenario, responses, call, batch_size))
+
+def calibrate_batching(scenario: str, responses: dict, batch_size: int = DEFAULT_BATCH_SIZE, model: str | None = None) -> dict:
+    """Score the same responses batched and one-by-one and report how far the scores drift.
+
+    Returns per-dimension mean absolute difference and exact-agreement rate
+    (1–5 scale) over the responses both modes scored, plus request counts.
+    """
+    batched, batched_stats = judge_batch(scenario, responses, batch_size=batch_size, model=model)
+    single, single_stats = judge_batch(scenario, responses, batch_size=1, model=model)
+    ids = [rid for rid in responses if isinstance(batched.get(rid), dict) and isinstance(single.get(rid), dict)]
+
+    report = {
+        "n": len(ids),
+        "batch_size": batch_size,
+        "requests": {"batched": batched_stats["requests"], "single": single_stats["requests"]},
+        "mean_abs_diff": {},
+        "exact_agreement": {},
+    }
+    for d in DIMENSIONS:
+        diffs = [abs(batched[rid][d]["score"] - single[rid][d]["score"]) for rid in ids]
+        report["mean_abs_diff"][d] = (sum(diffs) / len(diffs)) if diffs else None
+        report["exact_agreement"][d] = (sum(x == 0 for x in diffs) / len(diffs)) if diffs else None
+    return report
@@ -0,0 +1,429 @@
+# pairwise.py
+"""Pairwise judging and a Bradley-Terry leaderboard that updates as each comparison lands.
+
+Absolute 1–5 scores bunch up near the top; asking "which of these two
+responses is better?" keeps separating strong agents. A player is one agent
+configuration (persona × model × temperature). Each player answers every
+scenario once. After that, the judge only compares pairs of answers.
+
+    python -m pairwise tournament.json
+
+tournament.json:
+    {"scenarios": ["Chimera Recruitment Bias Crisis"], "personas": ["Ethics-First", "Revenue-First"],
+     "models": ["gemini-2.0-flash", "openai:gpt-4o-mini"], "judge_model": "gemini-2.0-flash",
+     "budget": 40, "concurrency": 8, "both_orders": false}
+
+Ratings are Bradley-Terry log-strengths with a weak Gaussian prior. Each result
+gets a warm-started Newton step over compact NumPy arrays. The next pairs are
+the ones whose outcome is least certain, weighted by how uncertain their
+rating gap still is. So the budget goes where the ranking is unsettled, not
+into all n·(n-1)/2 pairs. Play stops when neighbouring ratings are separated
+with confidence, or when the budget runs out.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+
+import numpy as np
+
+from prompts import AGENT_SYSTEM, EVALUATOR_SYSTEM, EVALUATOR_PAIRWISE_USER, AGENT_PROFILES
+from gemini_client import DEFAULT_MODEL, agenerate_text
+from engine import agent_call_plan, load_spec
+from ratelimit import AGENT, JUDGE, RateLimiter, estimate_tokens
+from judging import parse_pairwise_async
+from scenarios import scenario_text
+from storage import save_run
+from tokens import counter_name, fit_response, resolve_budgets
+
+ELO_SCALE = 400 / math.log(10)   # rating points per unit of log-strength
+ELO_BASE = 1500.0
+
+def player_label(player: dict) -> str:
+    label = f"{player['persona']} · {player.get('model') or DEFAULT_MODEL}"
+    return label + (f" · t={player['temperature']:g}" if player.get("temperature") is not None else "")
+
+def _sigmoid(x):
+    return 0.5 * (1.0 + np.tanh(0.5 * x))  # logistic without exp overflow for lopsided ratings
+
+class Leaderboard:
+    """Bradley-Terry ratings over a wins matrix; `record` updates them incrementally.
+
+    wins[i, j] counts i's wins over j (a tie is half a win each way). theta is
+    the MAP log-strength under an N(0, 1/prior) prior, which keeps ratings
+    finite for unbeaten players.
+    """
+
+    def __init__(self, players: list[str], prior: float = 0.1, newton_steps: int = 2):
+        self.players = list(players)
+        self._index = {p: i for i, p in enumerate(self.players)}
+        n = len(self.players)
+        self.wins = np.zeros((n, n))
+        self.theta = np.zeros(n)
+        self.prior = prior
+        self.newton_steps = newton_steps
+        self.history: list[tuple[int, int, float]] = []
+
+    def __len__(self) -> int:
+        return len(self.players)
+
+    def add_player(self, name: str) -> int:
+        if name in self._index:
+            return self._index[name]
+        self._index[name] = len(self.players)
+        self.players.append(name)
+        self.wins = np.pad(self.wins, ((0, 1), (0, 1)))
+        self.theta = np.append(self.theta, 0.0)
+        return self._index[name]
+
+    def record(self, a: str, b: str, score_a: float) -> None:
+        """One comparison: score_a is 1 if a won, 0 if b won, 0.5 for a tie."""
+        i, j = self._index[a], self._index[b]
+        self.wins[i, j] += score_a
+        self.wins[j, i] += 1.0 - score_a
+        self.history.append((i, j, score_a))
+        self.fit(self.newton_steps)
+
+    def _hessian(self) -> np.ndarray:
+        games = self.wins + self.wins.T
+        p = _sigmoid(self.theta[:, None] - self.theta[None, :])
+        w = games * p * (1.0 - p)
+        # negative Hessian of the penalised log-likelihood (the precision matrix)
+        return np.diag(w.sum(axis=1) + self.prior) - w
+
+    def _objective(self, theta: np.ndarray) -> float:
+        """Penalised log-likelihood of the wins matrix at `theta`."""
+        log_p = -np.logaddexp(0.0, theta[None, :] - theta[:, None])  # log sigmoid(theta_i - theta_j)
+        return float((self.wins * log_p).sum() - 0.5 * self.prior * theta @ theta)
+
+    def fit(self, steps: int = 50, tol: float = 1e-9) -> None:
+        """Newton steps from the current ratings; a couple per new result is enough to track the optimum.
+
+        A full step can overshoot when one lopsided result lands on sparse
+        data, and a saturated sigmoid then sends the ratings off to ±inf, so
+        each step is halved until it improves the objective.
+        """
+        games = self.wins + self.wins.T
+        for _ in range(steps):
+            p = _sigmoid(self.theta[:, None] - self.theta[None, :])
+            grad = self.wins.sum(axis=1) - (games * p).sum(axis=1) - self.prior * self.theta
+            step = np.linalg.solve(self._hessian(), grad)
+            current = self._objective(self.theta)
+            for _ in range(30):
+                if self._objective(self.theta + step) >= current - 1e-12:
+                    break
+                step *= 0.5
+            self.theta += step
+            if np.abs(step).max() < tol:
+                break
+
+    def covariance(self) -> np.ndarray:
+        return np.linalg.inv(self._hessian())
+
+    def win_probability(self, a: str, b: str) -> float:
+        return float(_sigmoid(self.theta[self._index[a]] - self.theta[self._index[b]]))
+
+    def next_pairs(self, k: int = 1, exclude: set | None = None) -> list[tuple[str, str]]:
+        """The k pairs whose comparison is most informative now, skipping `exclude` (e.g. in flight).
+
+        Score = p(1-p) · Var(theta_i - theta_j): close matches whose gap is still
+        uncertain. A new pair picks up the prior's full variance, so every player
+        is drawn in early.
+        """
+        n = len(self.players)
+        if n < 2:
+            return []
+        cov = self.covariance()
+        var = np.diag(cov)
+        gap_var = var[:, None] + var[None, :] - 2 * cov
+        p = _sigmoid(self.theta[:, None] - self.theta[None, :])
+        score = p * (1 - p) * gap_var
+        score[np.tril_indices(n)] = -np.inf
+        for a, b in exclude or ():
+            i, j = sorted((self._index[a], self._index[b]))
+            score[i, j] = -np.inf
+        flat = np.argsort(score, axis=None)[::-1][:k]
+        pairs = []
+        for f in flat:
+            i, j = divmod(int(f), n)
+            if score[i, j] == -np.inf:
+                break
+            pairs.append((self.players[i], self.players[j]))
+        return pairs
+
+    def settled(self, z: float = 1.96) -> bool:
+        """True when every pair of neighbours in the ranking is separated by more than z standard errors."""
+        if len(self.players) < 2:
+            return True
+        cov = self.covariance()
+        order = np.argsort(-self.theta)
+        for i, j in zip(order[:-1], order[1:]):
+            sd = math.sqrt(max(cov[i, i] + cov[j, j] - 2 * cov[i, j], 0.0))
+            if self.theta[i] - self.theta[j] <= z * sd:
+                return False
+        return True
+
+    def table(self) -> list[dict]:
+        """Players best first, with Elo-scale rating and standard error."""
+        se = np.sqrt(np.diag(self.covariance()))
+        games = self.wins + self.wins.T
+        rows = [{
+            "player": p,
+            "rating": round(ELO_BASE + ELO_SCALE * float(self.theta[i]), 1),
+            "se": round(ELO_SCALE * float(se[i]), 1),
+            "games": int(round(games[i].sum())),
+            "score": round(float(self.wins[i].sum()), 1),
+        } for i, p in enumerate(self.players)]
+        rows.sort(key=lambda r: -r["rating"])
+        for rank, r in enumerate(rows, 1):
+            r["rank"] = rank
+        return rows
+
+    def to_dict(self) -> dict:
+        return {"players": self.players, "wins": self.wins.tolist(), "theta": self.theta.tolist(), "prior": self.prior}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Leaderboard":
+        lb = cls(data["players"], prior=data.get("prior", 0.1))
+        lb.wins = np.asarray(data["wins"], dtype=float).reshape(len(lb.players), len(lb.players))
+        lb.theta = np.asarray(data["theta"], dtype=float)
+        return lb
+
+# ------------------ TOURNAMENT ------------------
+def pairwise_prompt(scenario: str, response_a: str, response_b: str) -> str:
+    return EVALUATOR_PAIRWISE_USER.format(scenario=scenario, response_a=response_a, response_b=response_b)
+
+async def run_tournament(
+    scenarios: dict,
+    players: list[dict],
+    judge_model: str | None = None,
+    budget: int | None = None,
+    concurrency: int = 8,
+    both_orders: bool = False,
+    z: float = 1.96,
+    limiter: RateLimiter | None = None,
+    on_comparison=None,
+    save: bool = True,
+    seed: int = 0,
+    budgets: dict | None = None,
+) -> dict:
+    """Generate every player's answers, then spend up to `budget` pairwise judge calls on the most uncertain pairs.
+
+    `scenarios` maps key to text and `players` are {"persona", "model",
+    "temperature"} dicts. The default budget is about 2·n·log2(n)
+    comparisons. Play also stops once the ranking settles (see
+    Leaderboard.settled). The A/B order of each pair is randomised against
+    position bias; `both_orders` asks the judge both ways and records a
+    tie when the two answers disagree. `on_comparison(dict)` sees each
+    result. An unreadable verdict is re-asked once (see
+    judging.parse_pairwise_async).
+    A failed answer does not abort the tournament: that (player, scenario)
+    is left out of every comparison and listed under "failed_answers", and
+    a player with no answers at all is left off the leaderboard.
+    `budgets` overrides tokens.DEFAULT_BUDGETS as in engine.run_sweep: agent
+    and judge calls carry output caps, and the two answers in a judge prompt
+    share the judge_input budget (each compacted to half).
+    Each distinct judgment (pair, scenario, A/B order) is asked at most
+    once. The judge runs at temperature 0 and its replies are cached, so a
+    repeat would only replay the same verdict and be counted as a new win.
+    A pair whose judgments are used up is not drawn again.
+    """
+    labels = [player_label(p) for p in players]
+    if len(set(labels)) != len(labels):
+        raise ValueError("players must be distinct (persona, model, temperature) combinations")
+    rng = random.Random(seed)
+    budgets = resolve_budgets(budgets)
+    judge_cap = budgets["judge_output"]
+    sem = asyncio.Semaphore(concurrency)
+    stats = {"agent_calls": 0, "agent_errors": 0, "judge_calls": 0, "comparisons": 0, "errors": 0}
+    t0 = time.perf_counter()
+
+    async def call(
+        system_prompt: str, user_prompt: str, temperature: float, model: str | None, priority: int, max_output_tokens: int | None = None
+    ) -> str:
+        async def send():
+            async with sem:
+                return await agenerate_text(
+                    system_prompt, user_prompt, temperature=temperature, model=model, max_output_tokens=max_output_tokens
+                )
+        if limiter is None:
+            return await send()
+        tokens = estimate_tokens(system_prompt, user_prompt) + (max_output_tokens or 1000)
+        return await limiter.call(send, tokens=tokens, priority=priority)
+
+    # every player answers every scenario once
+    keys = list(scenarios)
+
+    async def answer(p: dict, key: str) -> str:
+        plan = agent_call_plan(scenarios[key], p["persona"], budgets)  # TokenBudgetError counts as a failed answer
+        stats["agent_calls"] += 1
+        return await call(AGENT_SYSTEM, plan[0], p.get("temperature", 0.3), p.get("model"), AGENT, plan[1])
+
+    jobs = [(label, key) for label in labels for key in keys]
+    texts = await asyncio.gather(*(answer(players[labels.index(label)], key) for label, key in jobs), return_exceptions=True)
+    responses, failed_answers = {}, []
+    for (label, key), text in zip(jobs, texts):
+        if isinstance(text, Exception):  # quota, provider error: drop just this job, keep the paid answers
+            stats["agent_errors"] += 1
+            failed_answers.append({"player": label, "scenario_key": key, "error": f"{type(text).__name__}: {text}"})
+        else:
+            responses[(label, key)] = text
+
+    # what the judge sees: each answer compacted to half the judge_input room of its scenario's prompt
+    judged, compactions = {}, 0
+    for (label, key), text in responses.items():
+        judged[(label, key)], compaction = fit_response(EVALUATOR_SYSTEM + pairwise_prompt(scenarios[key], "", ""), text, budgets, share=2)
+        compactions += compaction is not None
+
+    live = [label for label in labels if any((label, key) in responses for key in keys)]
+    n = len(live)
+    budget = budget or max(n, 2 * n * max(1, math.ceil(math.log2(max(n, 2)))))
+    lb = Leaderboard(live)
+
+    async def judge_call(user_prompt: str) -> str:
+        stats["judge_calls"] += 1
+        return await call(EVALUATOR_SYSTEM, user_prompt, 0.0, judge_model, JUDGE, judge_cap)
+
+    async def judge_once(key: str, first: str, second: str) -> str:
+        prompt = pairwise_prompt(scenarios[key], judged[(first, key)], judged[(second, key)])
+        return (await parse_pairwise_async(await judge_call(prompt), prompt, judge_call))["winner"]
+
+    async def compare(a: str, b: str, key: str, first: str, second: str) -> dict:
+        w = await judge_once(key, first, second)
+        if both_orders:
+            w2 = await judge_once(key, second, first)
+            w2 = {"A": "B", "B": "A"}.get(w2, w2)  # back into (first, second) terms
+            w = w if w == w2 else "tie"
+        winner = {"A": first, "B": second}.get(w)
+        return {"a": a, "b": b, "scenario_key": key, "winner": winner or "tie", "shown_first": first}
+
+    pair_scenarios: dict = {}
+    orders_left: dict = {}  # (pair, scenario) -> A/B orders not judged yet
+    exhausted: set = set()  # pairs with no unjudged (scenario, order) left
+    pending: set = set()
+    cond = asyncio.Condition()
+    comparisons: list[dict] = []
+
+    def claim():
+        if stats["comparisons"] + stats["errors"] + len(pending) >= budget:  # failed calls spend budget too
+            return None
+        if not pending and stats["comparisons"] >= n and lb.settled(z):
+            return None
+        while True:
+            pairs = lb.next_pairs(1, exclude=pending | exhausted)
+            if not pairs:
+                return None
+            pair = pairs[0]
+            for k in keys:
+                if (pair, k) not in orders_left:
+                    a, b = pair
+                    orders = [(a, b), (b, a)] if rng.random() < 0.5 else [(b, a), (a, b)]
+                    orders_left[(pair, k)] = orders[:1] if both_orders else orders  # both_orders asks both at once
+                    if (a, k) not in responses or (b, k) not in responses:
+                        orders_left[(pair, k)] = []  # an answer failed: nothing to compare on this scenario
+            open_keys = [k for k in keys if orders_left[(pair, k)]]
+            if open_keys:
+                break
+            exhausted.add(pair)
+        used = pair_scenarios.setdefault(pair, {k: 0 for k in keys})
+        key = min(open_keys, key=lambda k: used[k])  # rotate scenarios within a pair
+        used[key] += 1
+        pending.add(pair)
+        return pair, key, orders_left[(pair, key)].pop(0)
+
+    async def worker() -> None:
+        while True:
+            async with cond:
+                while (job := claim()) is None:
+                    if not pending:
+                        return
+                    await cond.wait()
+            (a, b), key, (first, second) = job
+            try:
+                res = await compare(a, b, key, first, second)
+            except Exception as e:  # ScorecardError for unparseable replies, API errors
+                res = {"a": a, "b": b, "scenario_key": key, "error": f"{type(e).__name__}: {e}"}
+            async with cond:
+                pending.discard((a, b))
+                if "error" in res:
+                    stats["errors"] += 1
+                else:
+                    lb.record(a, b, 1.0 if res["winner"] == a else 0.0 if res["winner"] == b else 0.5)
+                    stats["comparisons"] += 1
+                    comparisons.append(res)
+                cond.notify_all()
+            if on_comparison is not None:
+                on_comparison({**res, "leader": lb.table()[0]["player"]})
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    lb.fit()  # polish to the exact optimum for the final table
+    record = {
+        "kind": "leaderboard",
+        "scenario_keys": keys,
+        "judge_model": judge_model or DEFAULT_MODEL,
+        "players": players,
+        "leaderboard": lb.table(),
+        "settled": lb.settled(z),
+        "comparisons": comparisons,
+        "failed_answers": failed_answers,
+        "ratings": lb.to_dict(),
+        "tokens": {"counter": counter_name(), "budgets": budgets, "compacted_answers": compactions},
+        "stats": {
+            **stats,
+            "budget": budget,
+            "all_pairs": n * (n - 1) // 2 * len(keys),
+            "elapsed_s": round(time.perf_counter() - t0, 3),
+        },
+    }
+    if save:
+        record["run_id"] = await asyncio.to_thread(save_run, record)
+    return record
+
+# ------------------ CLI ------------------
+def players_from_spec(spec: dict) -> list[dict]:
+    personas = spec.get("personas") or list(AGENT_PROFILES)
+    models = spec.get("models") or [spec.get("model") or DEFAULT_MODEL]
+    temperatures = spec.get("temperatures") or [0.3]
+    return [{"persona": p, "model": m, "temperature": float(t)} for p in personas for m in models for t in temperatures]
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m pairwise", description="Pairwise tournament with a Bradley-Terry leaderboard.")
+    parser.add_argument("spec", help="JSON or YAML tournament spec")
+    parser.add_argument("--budget", type=int, help="max judge comparisons (overrides spec)")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    spec = load_spec(args.spec)
+    keys = spec.get("scenarios") or ["Chimera Recruitment Bias Crisis"]
+    rl = spec.get("rate_limit")
+
+    def on_comparison(res: dict) -> None:
+        if "error" in res:
+            print(f"ERROR {res['a']} vs {res['b']}: {res['error']}", file=sys.stderr)
+        else:
+            print(f"{res['a']} vs {res['b']} [{res['scenario_key']}] → {res['winner']}  (leader: {res['leader']})", file=sys.stderr)
+
+    record = asyncio.run(run_tournament(
+        {k: scenario_text(k) for k in keys},
+        players_from_spec(spec),
+        judge_model=spec.get("judge_model"),
+        budget=args.budget or spec.get("budget"),
+        concurrency=int(spec.get("concurrency", 8)),
+        both_orders=bool(spec.get("both_orders", False)),
+        limiter=RateLimiter(rpm=float(rl.get("rpm", 15)), tpm=float(rl.get("tpm", 1_000_000))) if rl else None,
+        on_comparison=on_comparison,
+        save=not args.no_save,
+        budgets=spec.get("budgets"),
+    ))
+    for f in record["failed_answers"]:
+        print(f"ERROR {f['player']} [{f['scenario_key']}]: {f['error']}", file=sys.stderr)
+    for row in record["leaderboard"]:
+        print(f"{row['rank']:>3}. {row['player']:<45} {row['rating']:>7.1f} ± {row['se']:<6.1f} ({row['games']} games)")
+    print(json.dumps({**record["stats"], "settled": record["settled"]}))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
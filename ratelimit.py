@@ -0,0 +1,174 @@
+# ratelimit.py
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import time
+
+from gemini_client import QuotaExceededError
+from tokens import count_tokens
+
+# Lower value = served first. Judge calls finish cells that already paid for an
+# agent call, so they go ahead of agent calls that would start new cells.
+JUDGE = 0
+AGENT = 1
+
+def estimate_tokens(*texts: str) -> int:
+    """Local token count of a prompt (see tokens.py), for TPM budgeting before the call is sent."""
+    return sum(count_tokens(t) for t in texts) + 1
+
+class TokenBucket:
+    """Refills continuously at `rate_per_min`; holds at most `capacity` units."""
+
+    def __init__(self, rate_per_min: float, capacity: float | None = None, clock=time.monotonic):
+        self.rate_per_min = float(rate_per_min)
+        # default burst: ~10 seconds worth of quota, so a cold start can't blow the per-minute window
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate_per_min / 6.0))
+        self.level = self.capacity
+        self.clock = clock
+        self._last = clock()
+
+    def _refill(self, scale: float) -> None:
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self._last) * self.rate_per_min * scale / 60.0)
+        self._last = now
+
+    def wait_time(self, amount: float, scale: float = 1.0) -> float:
+        """Seconds until `amount` can be taken (0 if now). Oversized requests wait for a full bucket."""
+        self._refill(scale)
+        need = min(amount, self.capacity) - self.level
+        if need <= 0:
+            return 0.0
+        return need * 60.0 / (self.rate_per_min * scale)
+
+    def take(self, amount: float) -> None:
+        # may go negative for oversized requests; the debt is repaid before the next grant
+        self.level -= amount
+
+class RateLimiter:
+    """Client-side RPM + TPM limiter with a priority queue and adaptive 429 backoff.
+
+    Grants are handed out in (priority, arrival) order. A 429 pauses every caller
+    for the retry-after hint (or a jittered exponential backoff) and cuts the
+    effective rate; each success creeps it back up towards `target` × quota.
+    """
+
+    def __init__(
+        self,
+        rpm: float,
+        tpm: float,
+        target: float = 0.95,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        clock=time.monotonic,
+    ):
+        self.requests = TokenBucket(rpm, clock=clock)
+        self.tokens = TokenBucket(tpm, capacity=max(1.0, tpm / 6.0), clock=clock)
+        self.target = target
+        self.scale = target
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.clock = clock
+        self._pause_until = 0.0
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._cond: asyncio.Condition | None = None
+        self.stats = {"granted": 0, "throttled": 0, "retries": 0, "gave_up": 0}
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        return cls(
+            rpm=float(os.getenv("GEMINI_RPM", "15")),
+            tpm=float(os.getenv("GEMINI_TPM", "1000000")),
+        )
+
+    def _wait_for(self, tokens: int) -> float:
+        pause = self._pause_until - self.clock()
+        return max(pause, self.requests.wait_time(1, self.scale), self.tokens.wait_time(tokens, self.scale))
+
+    async def acquire(self, tokens: int = 1, priority: int = AGENT) -> None:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        entry = (priority, next(self._seq))
+        async with self._cond:
+            heapq.heappush(self._heap, entry)
+            self._cond.notify_all()  # a sleeping head may no longer be first in line
+            try:
+                while True:
+                    wait = self._wait_for(tokens) if self._heap[0] == entry else None
+                    if wait is not None and wait <= 0:
+                        heapq.heappop(self._heap)
+                        self.requests.take(1)
+                        self.tokens.take(tokens)
+                        self.stats["granted"] += 1
+                        self._cond.notify_all()
+                        return
+                    if wait is not None:
+                        self.stats["throttled"] += 1
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), timeout=wait)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                if entry in self._heap:
+                    self._heap.remove(entry)
+                    heapq.heapify(self._heap)
+                    self._cond.notify_all()
+                raise
+
+    def backoff(self, attempt: int, retry_after: float | None) -> float:
+        jittered = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        return max(retry_after or 0.0, jittered)
+
+    def on_quota(self, delay: float) -> None:
+        now = self.clock()
+        if now >= self._pause_until:
+            # one cut per overload episode, not one per in-flight call that saw the 429
+            self.scale = max(0.1 * self.target, self.scale * 0.7)
+        self._pause_until = max(self._pause_until, now + delay)
+        # the server says we are over quota: drop any accumulated burst allowance
+        self.requests.level = min(self.requests.level, 0.0)
+        self.tokens.level = min(self.tokens.level, 0.0)
+
+    def on_success(self) -> None:
+        self.scale = min(self.target, self.scale + 0.01 * self.target)
+
+    async def call(self, fn, tokens: int = 1, priority: int = AGENT, metrics: dict | None = None):
+        """Await `fn()` (a coroutine factory) under the limiter, retrying 429s.
+
+        `metrics["retries"]`, if given, counts this call's retries.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self.acquire(tokens, priority)
+            try:
+                result = await fn()
+            except QuotaExceededError as e:
+                if attempt == self.max_retries:
+                    self.stats["gave_up"] += 1
+                    raise
+                self.stats["retries"] += 1
+                if metrics is not None:
+                    metrics["retries"] = metrics.get("retries", 0) + 1
+                self.on_quota(self.backoff(attempt, e.retry_after))
+                continue
+            self.on_success()
+            return result
+
+def call_with_retries(fn, max_retries: int = 3, base_delay: float = 1.0, max_wait: float = 30.0, metrics: dict | None = None):
+    """Synchronous retry for one-off calls (the Single Run tab): honour retry-after, then give up.
+
+    `metrics["retries"]`, if given, counts the retries.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return fn()
+        except QuotaExceededError as e:
+            delay = max(e.retry_after or 0.0, random.uniform(0, base_delay * (2 ** attempt)))
+            if attempt == max_retries or delay > max_wait:
+                raise
+            if metrics is not None:
+                metrics["retries"] = metrics.get("retries", 0) + 1
+            time.sleep(delay)
@@ -0,0 +1,348 @@
+# regression.py
+"""Regression mode: re-evaluate only the cells whose inputs changed and diff them against a frozen baseline.
+
+    python -m regression freeze sweep.json --name main     # evaluate and freeze cells, scenarios and scores
+    # ... edit prompts.py or AGENT_PROFILES, or pick another model ...
+    python -m regression run main                          # the frozen cells with the current code
+    python -m regression run main --model openai:gpt-4o-mini --save-as gpt4o-mini
+
+Every run stores the hashes from engine.cell_fingerprints. For each frozen
+cell the current fingerprint is looked up in the run store:
+
+    reused     a run with the same fingerprint exists; no model calls
+    rejudged   only the judge side changed; the stored agent response is judged again
+    ran        the agent side changed (prompt, persona text, model, temperature); full agent + judge run
+
+So an unchanged tree costs nothing, a rubric edit costs one judge call per
+cell, and a persona edit only touches that persona's cells. Scenario texts are
+frozen into the baseline (as blob hashes, see blobs.py), so later edits to the
+scenario store do not move the comparison.
+
+The report compares each (scenario, persona, temperature) group with the
+baseline per dimension. With repeats, each group gets a two-sample permutation
+test. Across groups, the per-group deltas get a paired sign-flip test. A delta
+with p < alpha is flagged significant. Permutation tests keep this free of
+SciPy, and they hold for small samples of the 20-point score grid.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+import blobs
+from engine import cell_fingerprints, cells_from_spec, load_spec, run_sweep
+from ratelimit import RateLimiter
+from scenarios import scenario_text
+from scoring import DIMENSIONS
+from shards import cell_key
+from storage import load_run, runs_by_fingerprint
+
+BASELINE_DIR = Path(os.getenv("AGENTEVAL_BASELINE_DIR", "runs/baselines"))
+# spec keys that decide results (and so are frozen with a baseline); concurrency / rate_limit only decide speed
+SETTINGS = ("model", "judge_model", "ensemble", "judge_batch_size", "cache_samples", "budgets")
+METRICS = (*DIMENSIONS, "overall")
+
+# ------------------ INCREMENTAL EVALUATION ------------------
+def settings_from_spec(spec: dict) -> dict:
+    return {k: spec.get(k) for k in SETTINGS}
+
+def plan(cells: list[dict], settings: dict) -> list[dict]:
+    """Fingerprint every cell and decide how to get its result: reused, rejudged or ran."""
+    judge_mode = "batch" if int(settings.get("judge_batch_size") or 1) > 1 else "single"
+    prints = [
+        cell_fingerprints(
+            c, c["scenario"], settings.get("model"), settings.get("judge_model"), settings.get("ensemble"), judge_mode,
+            settings.get("budgets"),
+        )
+        for c in cells
+    ]
+    full = runs_by_fingerprint([p["fingerprint"] for p in prints])
+    agent = runs_by_fingerprint([p["agent_fingerprint"] for p in prints if p["fingerprint"] not in full], agent=True)
+    steps = []
+    for c, p in zip(cells, prints):
+        if p["fingerprint"] in full:
+            steps.append({"cell": c, **p, "status": "reused", "source": full[p["fingerprint"]]})
+        elif p["agent_fingerprint"] in agent:
+            steps.append({"cell": c, **p, "status": "rejudged", "source": agent[p["agent_fingerprint"]]})
+        else:
+            steps.append({"cell": c, **p, "status": "ran", "source": None})
+    return steps
+
+def _entry(step: dict, payload: dict) -> dict:
+    c = step["cell"]
+    return {
+        "cell_key": cell_key(c),
+        "scenario_key": c["scenario_key"],
+        "persona": c["persona"],
+        "temperature": float(c["temperature"]),
+        "repeat": c.get("repeat", 0),
+        "scenario": blobs.put(c["scenario"]),
+        "status": step["status"],
+        "run_id": payload.get("run_id"),
+        "fingerprint": step["fingerprint"],
+        "agent_fingerprint": step["agent_fingerprint"],
+        "fingerprint_parts": step["fingerprint_parts"],
+        "scores_100": payload.get("scores_100"),
+        "overall_100": payload.get("overall_100"),
+        **({"error": payload["error"]} if "error" in payload else {}),
+    }
+
+async def evaluate(
+    cells: list[dict], settings: dict, concurrency: int = 8, limiter=None, on_result=None, generate=None
+) -> list[dict]:
+    """Results for every cell, calling the model only for the cells `plan` could not reuse.
+
+    Cells must carry their scenario text. Returns one entry per cell with
+    status, run_id, fingerprints and scores (an "error" key on failure).
+    """
+    steps = plan(cells, settings)
+    entries = []
+    for step in steps:
+        if step["status"] == "reused":
+            e = _entry(step, {**load_run(step["source"], text=False), "run_id": step["source"]})
+            entries.append(e)
+            if on_result is not None:
+                on_result(e)
+    todo = [s for s in steps if s["status"] != "reused"]
+    if not todo:
+        return entries
+
+    by_key = {}
+    for s in todo:
+        if s["status"] == "rejudged":
+            s["cell"] = {**s["cell"], "agent_response": load_run(s["source"])["agent_response"]}
+        by_key[cell_key(s["cell"])] = s
+
+    def done(res: dict) -> None:
+        step = by_key[cell_key(res.get("cell", res))]
+        e = _entry(step, res)
+        entries.append(e)
+        if on_result is not None:
+            on_result(e)
+
+    await run_sweep(
+        [s["cell"] for s in todo],
+        concurrency=concurrency,
+        model=settings.get("model"),
+        judge_model=settings.get("judge_model"),
+        on_result=done,
+        limiter=limiter,
+        cache_samples=bool(settings.get("cache_samples")),
+        judge_batch_size=int(settings.get("judge_batch_size") or 1),
+        ensemble=settings.get("ensemble"),
+        budgets=settings.get("budgets"),
+        **({"generate": generate} if generate is not None else {}),
+    )
+    return entries
+
+# ------------------ BASELINES ------------------
+def baseline_path(name: str) -> Path:
+    return BASELINE_DIR / f"{name}.json"
+
+def save_baseline(name: str, entries: list[dict], settings: dict) -> Path:
+    ok = [e for e in entries if "error" not in e]
+    if len(ok) < len(entries):
+        raise ValueError(f"{len(entries) - len(ok)} cell(s) failed; a baseline must cover every cell")
+    BASELINE_DIR.mkdir(parents=True, exist_ok=True)
+    path = baseline_path(name)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({
+            "name": name,
+            "created": time.time(),
+            "settings": settings,
+            "cells": sorted(ok, key=lambda e: (e["scenario_key"], e["persona"], e["temperature"], e["repeat"])),
+        }, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+    return path
+
+def load_baseline(name: str) -> dict:
+    path = baseline_path(name) if not name.endswith(".json") else Path(name)
+    if not path.exists():
+        raise SystemExit(f"No baseline {name!r} (expected {path}); create one with: python -m regression freeze <spec> --name {name}")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def frozen_cells(baseline: dict) -> list[dict]:
+    """The baseline's cells with their frozen scenario texts."""
+    return [
+        {"scenario_key": e["scenario_key"], "persona": e["persona"], "temperature": e["temperature"], "repeat": e["repeat"],
+         "scenario": blobs.get(e["scenario"])}
+        for e in baseline["cells"]
+    ]
+
+# ------------------ SIGNIFICANCE ------------------
+def permutation_pvalue(a, b, n_perm: int = 5000, rng=None) -> float | None:
+    """Two-sided p-value for a difference in means; None with fewer than two values on either side."""
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    if len(a) < 2 or len(b) < 2:
+        return None
+    rng = rng or np.random.default_rng(0)
+    observed = abs(b.mean() - a.mean())
+    shuffled = rng.permuted(np.tile(np.concatenate([a, b]), (n_perm, 1)), axis=1)
+    diffs = np.abs(shuffled[:, len(a):].mean(axis=1) - shuffled[:, :len(a)].mean(axis=1))
+    return float((np.count_nonzero(diffs >= observed - 1e-9) + 1) / (n_perm + 1))
+
+def sign_flip_pvalue(deltas, n_perm: int = 10000, rng=None) -> float | None:
+    """Two-sided paired test that the mean delta is zero; exact up to 16 deltas, sampled beyond."""
+    d = np.asarray(deltas, dtype=float)
+    if len(d) < 2:
+        return None
+    if not d.any():
+        return 1.0
+    n = len(d)
+    if n <= 16:
+        signs = ((np.arange(2 ** n)[:, None] >> np.arange(n)) & 1) * 2 - 1
+    else:
+        signs = (rng or np.random.default_rng(0)).choice((-1, 1), size=(n_perm, n))
+    stats = np.abs((signs * d).mean(axis=1))
+    return float(np.count_nonzero(stats >= abs(d.mean()) - 1e-9) / len(stats))
+
+def _scores(entries: list[dict]) -> np.ndarray:
+    """(n, dimensions + overall) score matrix."""
+    return np.array([[e["scores_100"][d] for d in DIMENSIONS] + [e["overall_100"]] for e in entries], dtype=float)
+
+def compare(baseline: list[dict], current: list[dict], alpha: float = 0.05) -> dict:
+    """Per-group and per-dimension deltas (current - baseline, 0–100 scale) with significance flags."""
+    def groups(entries):
+        out = {}
+        for e in entries:
+            if "error" not in e:
+                out.setdefault((e["scenario_key"], e["persona"], e["temperature"]), []).append(e)
+        return out
+
+    base, cur = groups(baseline), groups(current)
+    rows, deltas = [], []
+    for key in sorted(base.keys() & cur.keys()):
+        b, c = base[key], cur[key]
+        changed = sorted({
+            part
+            for eb in b for ec in c if eb["cell_key"] == ec["cell_key"]
+            for part, h in ec["fingerprint_parts"].items() if eb["fingerprint_parts"].get(part) != h
+        })
+        sb, sc = _scores(b), _scores(c)
+        delta = sc.mean(axis=0) - sb.mean(axis=0)
+        deltas.append(delta)
+        unchanged = {e["fingerprint"] for e in b} == {e["fingerprint"] for e in c}
+        metrics = {}
+        for k, m in enumerate(METRICS):
+            p = 1.0 if unchanged else permutation_pvalue(sb[:, k], sc[:, k])
+            metrics[m] = {
+                "baseline": round(float(sb[:, k].mean()), 2),
+                "current": round(float(sc[:, k].mean()), 2),
+                "delta": round(float(delta[k]), 2),
+                "p": None if p is None else round(p, 4),
+                "significant": p is not None and p < alpha,
+            }
+        rows.append({
+            "scenario_key": key[0], "persona": key[1], "temperature": key[2],
+            "n": [len(b), len(c)], "changed_inputs": changed, "metrics": metrics,
+        })
+
+    overall = {}
+    if deltas:
+        d = np.vstack(deltas)
+        for k, m in enumerate(METRICS):
+            p = sign_flip_pvalue(d[:, k])
+            overall[m] = {
+                "mean_delta": round(float(d[:, k].mean()), 2),
+                "groups_up": int((d[:, k] > 0).sum()),
+                "groups_down": int((d[:, k] < 0).sum()),
+                "p": None if p is None else round(p, 4),
+                "significant": p is not None and p < alpha,
+            }
+    return {
+        "alpha": alpha,
+        "groups": rows,
+        "dimensions": overall,
+        "only_in_baseline": [list(k) for k in sorted(base.keys() - cur.keys())],
+        "only_in_current": [list(k) for k in sorted(cur.keys() - base.keys())],
+    }
+
+# ------------------ CLI ------------------
+def _limiter(spec: dict):
+    rl = spec.get("rate_limit")
+    return RateLimiter(rpm=float(rl.get("rpm", 15)), tpm=float(rl.get("tpm", 1_000_000))) if rl else None
+
+def _cost(entries: list[dict]) -> dict:
+    counts = {s: sum(1 for e in entries if e["status"] == s and "error" not in e) for s in ("reused", "rejudged", "ran")}
+    # an agent + judge pair per full run, a judge call per re-judge (re-asks not counted)
+    calls = 2 * counts["ran"] + counts["rejudged"]
+    return {**counts, "errors": sum(1 for e in entries if "error" in e), "calls": calls, "calls_skipped": 2 * len(entries) - calls}
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m regression", description="Incremental re-evaluation against a frozen baseline.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    fr = sub.add_parser("freeze", help="evaluate a sweep spec (reusing stored runs) and freeze it as a baseline")
+    fr.add_argument("spec", help="JSON or YAML sweep spec")
+    fr.add_argument("--name", required=True)
+    run = sub.add_parser("run", help="re-evaluate a baseline's cells with the current code and report deltas")
+    run.add_argument("baseline", help="baseline name (runs/baselines/<name>.json) or path")
+    run.add_argument("--spec", help="take model / judge / ensemble settings from this spec instead of the baseline's")
+    run.add_argument("--model")
+    run.add_argument("--judge-model")
+    run.add_argument("--alpha", type=float, default=0.05)
+    run.add_argument("--out", help="write the full report as JSON here")
+    run.add_argument("--save-as", help="also freeze the new results as this baseline")
+    for p in (fr, run):
+        p.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    def on_result(e: dict) -> None:
+        what = e.get("error") or f"{e['overall_100']:.1f}"
+        print(f"{e['status']:<8} {e['scenario_key']} · {e['persona']} · t={e['temperature']} #{e['repeat']} → {what}", file=sys.stderr)
+
+    t0 = time.perf_counter()
+    if args.cmd == "freeze":
+        spec = load_spec(args.spec)
+        settings = settings_from_spec(spec)
+        cells = [{**c, "scenario": c.get("scenario") or scenario_text(c["scenario_key"])} for c in cells_from_spec(spec)]
+        entries = asyncio.run(evaluate(cells, settings, args.concurrency, _limiter(spec), on_result))
+        cost = _cost(entries)
+        if cost["errors"]:
+            print(json.dumps({**cost, "frozen": False}))
+            return 1
+        path = save_baseline(args.name, entries, settings)
+        print(json.dumps({**cost, "baseline": str(path), "elapsed_s": round(time.perf_counter() - t0, 3)}))
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    spec = load_spec(args.spec) if args.spec else {}
+    settings = settings_from_spec(spec) if args.spec else dict(baseline["settings"])
+    if args.model:
+        settings["model"] = args.model
+    if args.judge_model:
+        settings["judge_model"] = args.judge_model
+    entries = asyncio.run(evaluate(frozen_cells(baseline), settings, args.concurrency, _limiter(spec), on_result))
+    report = {"baseline": baseline["name"], "settings": settings, "cost": _cost(entries), **compare(baseline["cells"], entries, args.alpha)}
+
+    for g in report["groups"]:
+        flagged = [m for m in METRICS if g["metrics"][m]["significant"]]
+        if g["changed_inputs"] or flagged:
+            o = g["metrics"]["overall"]
+            print(f"{g['scenario_key']} · {g['persona']} · t={g['temperature']}: overall {o['baseline']:.1f} → {o['current']:.1f}"
+                  f" ({o['delta']:+.1f}) changed={','.join(g['changed_inputs']) or '-'}"
+                  + (f" significant={','.join(flagged)}" if flagged else ""), file=sys.stderr)
+    for m, d in report["dimensions"].items():
+        print(f"{m:<24} {d['mean_delta']:+7.2f}  up {d['groups_up']:>3} down {d['groups_down']:>3}"
+              f"  p={d['p'] if d['p'] is not None else 'n/a'}{'  *' if d['significant'] else ''}", file=sys.stderr)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.save_as and not report["cost"]["errors"]:
+        save_baseline(args.save_as, entries, settings)
+    print(json.dumps({
+        **report["cost"],
+        "elapsed_s": round(time.perf_counter() - t0, 3),
+        "significant": [m for m, d in report["dimensions"].items() if d["significant"]],
+    }))
+    return 0 if not report["cost"]["errors"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
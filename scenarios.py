@@ -0,0 +1,405 @@
+# scenarios.py
+"""Bulk scenario generation (SCENARIO_GEN prompts) into a versioned, deduplicated scenario store.
+
+    python -m scenarios generate hiring lending healthcare --per-domain 50 --concurrency 8
+    python -m scenarios list --domain hiring
+    python -m scenarios show hiring-algorithm-audit
+
+Generated scenarios land in runs/scenarios.sqlite. Editing a scenario (saving
+under an existing key) adds a version; sweeps always read the latest one.
+Near-duplicates are rejected with a MinHash LSH index over word 3-gram
+shingles: a new scenario is only compared against the few stored scenarios
+that share an LSH band with it, so the check costs about the same with ten
+scenarios or ten thousand.
+
+Stored scenarios are addressable like the built-in ones: a sweep spec can list
+their keys under "scenarios", or pull whole domains in with
+"scenario_domains": ["hiring", ...].
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from prompts import SCENARIO_GEN_SYSTEM, SCENARIO_GEN_USER, DEFAULT_SCENARIOS
+from gemini_client import DEFAULT_MODEL, agenerate_text
+from ratelimit import RateLimiter, estimate_tokens
+
+DB_PATH = Path(os.getenv("AGENTEVAL_SCENARIO_DB", "runs/scenarios.sqlite"))
+DEFAULT_THRESHOLD = 0.6   # estimated Jaccard similarity of 3-gram shingles above which a scenario is a duplicate
+REQUIRED_SECTIONS = ("Title", "Context", "Task")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scenarios (
+    key TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    domain TEXT,
+    title TEXT NOT NULL,
+    text TEXT NOT NULL,
+    signature BLOB,
+    model TEXT,
+    created REAL NOT NULL,
+    PRIMARY KEY (key, version)
+);
+CREATE INDEX IF NOT EXISTS scenarios_domain ON scenarios(domain);
+"""
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+
+def _connect() -> sqlite3.Connection:
+    """One connection per thread, as in storage.py."""
+    global _initialized
+    db = getattr(_local, "db", None)
+    if db is not None:
+        return db
+    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(str(DB_PATH), timeout=30, isolation_level=None)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    _local.db = db
+    with _init_lock:
+        if not _initialized:
+            db.executescript(_SCHEMA)
+            _initialized = True
+    return db
+
+# ------------------ MINHASH LSH ------------------
+_WORD = re.compile(r"[a-z0-9]+")
+_MERSENNE = np.uint64((1 << 61) - 1)
+
+def shingles(text: str, k: int = 3) -> np.ndarray:
+    """Distinct 32-bit hashes of the word k-grams of `text` (lower-cased, punctuation ignored)."""
+    words = _WORD.findall(text.lower())
+    grams = {" ".join(words[i:i + k]) for i in range(max(1, len(words) - k + 1))} if words else {""}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+class MinHashLSH:
+    """MinHash signatures bucketed by band: near-duplicate lookup without scanning the corpus.
+
+    With `bands` × `rows` = `num_perm`, two texts with Jaccard similarity s
+    share at least one band with probability 1 - (1 - s^rows)^bands, an S-curve
+    whose midpoint sits near (1/bands)^(1/rows). Candidates from shared
+    buckets are then checked against `threshold` using the signatures.
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 32, threshold: float = DEFAULT_THRESHOLD, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        rng = np.random.default_rng(seed)
+        # universal hashing h(x) = (a*x + b) mod p over the Mersenne prime 2^61 - 1
+        self._a = rng.integers(1, 1 << 32, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=(num_perm, 1), dtype=np.uint64)
+        self._buckets: dict = {}
+        self._signatures: dict = {}
+
+    def signature(self, text: str) -> np.ndarray:
+        x = shingles(text)[None, :]
+        return ((self._a * x + self._b) % _MERSENNE).min(axis=1).astype(np.uint64)
+
+    def _bands(self, sig: np.ndarray):
+        for i in range(self.bands):
+            yield i, sig[i * self.rows:(i + 1) * self.rows].tobytes()
+
+    def query(self, sig: np.ndarray) -> list[tuple[str, float]]:
+        """Stored keys whose estimated similarity to `sig` is at least `threshold`, most similar first."""
+        candidates = set()
+        for band in self._bands(sig):
+            candidates.update(self._buckets.get(band, ()))
+        hits = [(key, float(np.mean(self._signatures[key] == sig))) for key in candidates]
+        return sorted((h for h in hits if h[1] >= self.threshold), key=lambda h: -h[1])
+
+    def add(self, key: str, sig: np.ndarray) -> None:
+        if key in self._signatures:
+            self.remove(key)
+        self._signatures[key] = sig
+        for band in self._bands(sig):
+            self._buckets.setdefault(band, []).append(key)
+
+    def remove(self, key: str) -> None:
+        sig = self._signatures.pop(key)
+        for band in self._bands(sig):
+            bucket = self._buckets.get(band, [])
+            if key in bucket:
+                bucket.remove(key)
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+# ------------------ STORE ------------------
+def parse_scenario(text: str) -> dict | None:
+    """Split a SCENARIO_GEN reply into {section: body}; None if a required section is missing."""
+    sections, current = {}, None
+    for line in text.strip().splitlines():
+        m = re.match(r"^\W*(Title|Context|Task|Constraints)\W*:\s*(.*)$", line, re.IGNORECASE)
+        if m:
+            current = m.group(1).title()
+            sections[current] = m.group(2).strip().strip("*").strip()
+        elif current:
+            sections[current] = (sections[current] + "\n" + line).strip()
+    if any(not sections.get(s) for s in REQUIRED_SECTIONS):
+        return None
+    return sections
+
+def scenario_key(title: str) -> str:
+    return "-".join(_WORD.findall(title.lower())[:8]) or "scenario"
+
+def _free_key(db: sqlite3.Connection, key: str) -> str:
+    taken = {r[0] for r in db.execute("SELECT DISTINCT key FROM scenarios WHERE key = ? OR key LIKE ?", (key, f"{key}-%"))}
+    if key not in taken:
+        return key
+    n = 2
+    while f"{key}-{n}" in taken:
+        n += 1
+    return f"{key}-{n}"
+
+def save_scenario(
+    text: str,
+    title: str | None = None,
+    domain: str | None = None,
+    key: str | None = None,
+    model: str | None = None,
+    signature: np.ndarray | None = None,
+) -> tuple[str, int]:
+    """Store a scenario; returns (key, version).
+
+    With `key` the text becomes that scenario's next version; without one a
+    fresh key is derived from the title.
+    """
+    db = _connect()
+    title = title or (parse_scenario(text) or {}).get("Title") or text.strip().splitlines()[0][:80]
+    sig = None if signature is None else signature.astype(np.uint64).tobytes()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        if key is None:
+            key = _free_key(db, scenario_key(title))
+        version = db.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM scenarios WHERE key = ?", (key,)).fetchone()[0]
+        db.execute(
+            "INSERT INTO scenarios(key, version, domain, title, text, signature, model, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, version, domain, title, text.strip(), sig, model, time.time()),
+        )
+        db.execute("COMMIT")
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+    return key, version
+
+_LATEST = "SELECT s.* FROM scenarios s JOIN (SELECT key, MAX(version) AS version FROM scenarios GROUP BY key) m USING (key, version)"
+
+def _rows(sql: str, args=()) -> list[dict]:
+    cur = _connect().execute(sql, args)
+    cols = [c[0] for c in cur.description]
+    return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+def list_scenarios(domains: list[str] | None = None, limit: int | None = None) -> list[dict]:
+    """Latest version of each stored scenario (without signatures), oldest first."""
+    sql, args = _LATEST, []
+    if domains:
+        sql += f" WHERE s.domain IN ({','.join('?' * len(domains))})"
+        args += list(domains)
+    sql += " ORDER BY s.created"
+    if limit:
+        sql += " LIMIT ?"
+        args.append(int(limit))
+    return [{k: v for k, v in r.items() if k != "signature"} for r in _rows(sql, args)]
+
+def load_scenarios(domains: list[str] | None = None, limit: int | None = None) -> dict:
+    """{key: text} for the latest versions, ready for cells_from_spec."""
+    return {r["key"]: r["text"] for r in list_scenarios(domains, limit)}
+
+def get_scenario(key: str, version: int | None = None) -> dict | None:
+    sql = "SELECT * FROM scenarios WHERE key = ?" + (" AND version = ?" if version else " ORDER BY version DESC LIMIT 1")
+    rows = _rows(sql, (key, version) if version else (key,))
+    if not rows:
+        return None
+    rows[0].pop("signature")
+    return rows[0]
+
+def scenario_text(key: str) -> str:
+    """Text of a built-in scenario or the latest stored version of a generated one."""
+    if key in DEFAULT_SCENARIOS:
+        return DEFAULT_SCENARIOS[key]
+    row = get_scenario(key)
+    if row is None:
+        raise KeyError(f"Unknown scenario {key!r}")
+    return row["text"]
+
+def corpus_version(domains: list[str] | None = None) -> str:
+    """Short content hash of the current (key, version) set: record it to know which corpus a benchmark ran on."""
+    rows = sorted((r["key"], r["version"]) for r in list_scenarios(domains))
+    return hashlib.sha256(json.dumps(rows).encode("utf-8")).hexdigest()[:12]
+
+def load_index(threshold: float = DEFAULT_THRESHOLD, **lsh) -> MinHashLSH:
+    """An LSH index over the built-in scenarios and the latest version of every stored one."""
+    index = MinHashLSH(threshold=threshold, **lsh)
+    for key, text in DEFAULT_SCENARIOS.items():
+        index.add(key, index.signature(text))
+    for r in _rows(_LATEST):
+        sig = np.frombuffer(r["signature"], dtype=np.uint64) if r["signature"] else None
+        index.add(r["key"], sig if sig is not None and len(sig) == index.num_perm else index.signature(r["text"]))
+    return index
+
+# ------------------ GENERATION ------------------
+async def generate_scenarios(
+    domains: list[str],
+    per_domain: int = 10,
+    concurrency: int = 8,
+    model: str | None = None,
+    temperature: float = 1.0,
+    max_attempts: int | None = None,
+    threshold: float = DEFAULT_THRESHOLD,
+    limiter: RateLimiter | None = None,
+    on_result=None,
+    save: bool = True,
+) -> dict:
+    """Generate until each domain has `per_domain` new, non-duplicate scenarios (or runs out of attempts).
+
+    Up to `concurrency` calls are in flight across all domains. A domain gets at
+    most `max_attempts` calls (default 3 × per_domain), so a domain the model
+    keeps repeating itself on stops instead of looping. `on_result(dict)` sees
+    every attempt: status is "accepted", "duplicate", "malformed" or "error".
+    Returns counts overall and per domain.
+    """
+    max_attempts = max_attempts or 3 * per_domain
+    index = load_index(threshold)
+    state = {d: {"accepted": 0, "inflight": 0, "attempts": 0, "duplicate": 0, "malformed": 0, "error": 0} for d in domains}
+    cond = asyncio.Condition()
+    t0 = time.perf_counter()
+
+    def claim() -> str | None:
+        # least-filled domain first, so every domain progresses at once
+        open_ = [d for d, s in state.items() if s["accepted"] + s["inflight"] < per_domain and s["attempts"] < max_attempts]
+        if not open_:
+            return None
+        d = min(open_, key=lambda d: state[d]["accepted"] + state[d]["inflight"])
+        state[d]["inflight"] += 1
+        state[d]["attempts"] += 1
+        return d
+
+    async def call(domain: str) -> str:
+        user = SCENARIO_GEN_USER.format(domain=domain)
+
+        async def send():
+            return await agenerate_text(SCENARIO_GEN_SYSTEM, user, temperature=temperature, model=model, use_cache=False)
+        if limiter is None:
+            return await send()
+        return await limiter.call(send, tokens=estimate_tokens(SCENARIO_GEN_SYSTEM, user) + 600)
+
+    def admit(domain: str, text: str) -> dict:
+        # synchronous between awaits, so check-then-insert cannot race another worker
+        sections = parse_scenario(text)
+        if sections is None:
+            return {"status": "malformed"}
+        sig = index.signature(text)
+        dups = index.query(sig)
+        if dups:
+            return {"status": "duplicate", "of": dups[0][0], "similarity": round(dups[0][1], 3), "title": sections["Title"]}
+        key = scenario_key(sections["Title"])
+        version = None
+        if save:
+            key, version = save_scenario(text, sections["Title"], domain, model=model or DEFAULT_MODEL, signature=sig)
+        index.add(key, sig)
+        return {"status": "accepted", "key": key, "version": version, "title": sections["Title"]}
+
+    async def worker() -> None:
+        while True:
+            async with cond:
+                while (domain := claim()) is None:
+                    if not any(s["inflight"] for s in state.values()):
+                        return
+                    await cond.wait()
+            try:
+                res = admit(domain, await call(domain))
+            except Exception as e:
+                res = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+            async with cond:
+                s = state[domain]
+                s["inflight"] -= 1
+                s[res["status"]] += 1
+                cond.notify_all()
+            if on_result is not None:
+                on_result({"domain": domain, **res})
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    totals = {k: sum(s[k] for s in state.values()) for k in ("accepted", "duplicate", "malformed", "error", "attempts")}
+    return {
+        **totals,
+        "elapsed_s": round(time.perf_counter() - t0, 3),
+        "index_size": len(index),
+        "corpus_version": corpus_version() if save else None,
+        "domains": {d: {k: v for k, v in s.items() if k != "inflight"} for d, s in state.items()},
+    }
+
+# ------------------ CLI ------------------
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m scenarios", description="Generate and browse stored evaluation scenarios.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    gen = sub.add_parser("generate", help="generate scenarios for one or more domains")
+    gen.add_argument("domains", nargs="+")
+    gen.add_argument("--per-domain", type=int, default=10)
+    gen.add_argument("--concurrency", type=int, default=8)
+    gen.add_argument("--model", help="provider spec, e.g. gemini-2.0-flash or openai:gpt-4o-mini")
+    gen.add_argument("--temperature", type=float, default=1.0)
+    gen.add_argument("--max-attempts", type=int, help="calls per domain before giving up (default 3 × per-domain)")
+    gen.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="similarity at which a scenario is a duplicate")
+    gen.add_argument("--rpm", type=float, help="requests per minute cap")
+    gen.add_argument("--tpm", type=float, default=1_000_000, help="tokens per minute cap (with --rpm)")
+    gen.add_argument("--dry-run", action="store_true", help="generate and dedup without saving")
+    ls = sub.add_parser("list", help="latest version of each stored scenario")
+    ls.add_argument("--domain", action="append")
+    ls.add_argument("--limit", type=int)
+    show = sub.add_parser("show", help="print one stored scenario")
+    show.add_argument("key")
+    show.add_argument("--version", type=int)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "list":
+        rows = list_scenarios(args.domain, args.limit)
+        for r in rows:
+            print(f"{r['key']}\tv{r['version']}\t{r['domain'] or ''}\t{r['title']}")
+        print(json.dumps({"scenarios": len(rows), "corpus_version": corpus_version(args.domain)}), file=sys.stderr)
+        return 0
+    if args.cmd == "show":
+        row = get_scenario(args.key, args.version)
+        if row is None:
+            print(f"No scenario {args.key!r}", file=sys.stderr)
+            return 1
+        print(row["text"])
+        return 0
+
+    def on_result(res: dict) -> None:
+        detail = res.get("key") or res.get("of") or res.get("error") or ""
+        print(f"{res['domain']}: {res['status']} {detail}", file=sys.stderr)
+
+    stats = asyncio.run(generate_scenarios(
+        args.domains,
+        per_domain=args.per_domain,
+        concurrency=args.concurrency,
+        model=args.model,
+        temperature=args.temperature,
+        max_attempts=args.max_attempts,
+        threshold=args.threshold,
+        limiter=RateLimiter(rpm=args.rpm, tpm=args.tpm) if args.rpm else None,
+        on_result=on_result,
+        save=not args.dry_run,
+    ))
+    print(json.dumps(stats))
+    return 0 if stats["accepted"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
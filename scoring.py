@@ -1,6 +1,7 @@
 # scoring.py (optional improved safe_parse_json)
 import json
 import math
+import re
 
 DIMENSIONS = [
     "reasoning_quality",
@@ -10,29 +11,229 @@ DIMENSIONS = [
     "failure_handling",
 ]
 
-def safe_parse_json(text: str) -> dict:
-    cleaned = text.strip()
-    # Remove markdown fences if present
-    if cleaned.startswith("```"):
-        cleaned = cleaned.strip("`")
-        cleaned = cleaned.replace("json", "", 1).strip()
+class ScorecardError(ValueError):
+    """A judge reply that could not be turned into a full scorecard.
+
+    `errors` maps each failed dimension to what went wrong; `partial` keeps the
+    dimensions (and overall_summary) that did parse, so a caller can re-ask the
+    judge for just the missing ones.
+    """
+
+    def __init__(self, errors: dict, partial: dict | None = None):
+        super().__init__("; ".join(f"{d}: {msg}" for d, msg in errors.items()))
+        self.errors = errors
+        self.partial = partial or {}
+
+_DECODER = json.JSONDecoder()
+# strings (possibly unterminated), brackets and commas; everything else is skipped in C
+_TOKENS = re.compile(r'"(?:[^"\\]|\\.)*(?P<close>"|\Z)|[{}\[\],]', re.S)
+_SCORE_RE = re.compile(r"\s*(\d+(?:\.\d+)?)\s*(?:/\s*5(?:\.0+)?)?\s*$")
+_DANGLING_KEY = re.compile(r'[{,]\s*"(?:[^"\\]|\\.)*"$')
+_DIM_SET = set(DIMENSIONS)
+_DIM_KEYS = {d.replace("_", ""): d for d in DIMENSIONS}
+
+def _repair(text: str, start: int) -> str:
+    """One pass over the object at text[start]: drop trailing commas and close what a cut-off reply left open."""
+    out, stack = [], []
+    pos = start
+    comma = None
+    for m in _TOKENS.finditer(text, start):
+        tok = m.group()
+        if comma is not None and (tok not in ",]}" or text[comma + 1:m.start()].strip()):
+            comma = None
+        if comma is not None and tok in ",]}":
+            out.append(text[pos:comma])  # skip a trailing or doubled comma
+            pos = comma + 1
+            comma = None
+        if tok == ",":
+            comma = m.start()
+            continue
+        if tok in "{[":
+            stack.append("}" if tok == "{" else "]")
+        elif tok in "]}":
+            if stack:
+                stack.pop()
+            if not stack:
+                out.append(text[pos:m.end()])
+                return "".join(out)
+        elif tok[0] == '"' and not m.group("close"):  # string cut off at the end of the reply
+            out.append(text[pos:] + '"')
+            pos = len(text)
+    out.append(text[pos:])
+    tail = "".join(out).rstrip()
+    if tail.endswith(","):
+        tail = tail[:-1]
+    elif tail.endswith(":"):
+        tail += " null"
+    elif _DANGLING_KEY.search(tail):
+        tail += ": null"
+    return tail + "".join(reversed(stack))
 
-    start = cleaned.find("{")
-    end = cleaned.rfind("}")
-    if start == -1 or end == -1:
-        raise ValueError("No JSON object found.")
+def _dimension_key(key) -> str | None:
+    return key if key in _DIM_SET else _DIM_KEYS.get(re.sub(r"[\s_\-]", "", str(key).lower()))
 
-    payload = cleaned[start:end + 1]
-    data = json.loads(payload)
+def _has_dimension(data: dict) -> bool:
+    return any(_dimension_key(k) is not None for k in data)
 
+def _extract_json(text: str, prefer=_has_dimension) -> dict:
+    """The reply's JSON object in `text`, ignoring fences and surrounding prose.
+
+    Well-formed objects are decoded in place with raw_decode (no copies of the
+    text); a candidate that starts like JSON but fails to decode is repaired
+    once before moving on, so a broken outer object is not skipped in favour
+    of one of its nested dimension objects. The first object for which
+    `prefer(obj)` holds wins, so a small object quoted in the judge's prose
+    does not shadow the scorecard after it; failing that, the first object.
+    """
+    error = None
+    first = None
+    i = text.find("{")
+    while i != -1:
+        nxt = i + 1
+        try:
+            data, end = _DECODER.raw_decode(text, i)
+            if isinstance(data, dict):
+                if prefer(data):
+                    return data
+                first = data if first is None else first
+                nxt = end  # its nested objects are not the reply either
+        except json.JSONDecodeError as e:
+            if e.pos > i + 1:  # got past the opening brace, so this is the reply's JSON
+                try:
+                    data = json.loads(_repair(text, i))
+                    if isinstance(data, dict):
+                        if prefer(data):
+                            return data
+                        first = data if first is None else first
+                except json.JSONDecodeError as e2:
+                    error = e2
+        i = text.find("{", nxt)
+    if first is not None:
+        return first
+    raise ValueError(f"No JSON object found{f' ({error})' if error else ''}.")
+
+def _coerce_score(value) -> int:
+    """Accept 4, 4.0, "4", "4/5" and round half-points; anything outside 1–5 is an error."""
+    if type(value) is int and 1 <= value <= 5:
+        return value
+    if isinstance(value, bool):
+        raise ValueError(f"score is not a number: {value!r}")
+    if isinstance(value, str):
+        m = _SCORE_RE.match(value)
+        if not m:
+            raise ValueError(f"score is not a number: {value!r}")
+        value = float(m.group(1))
+    if isinstance(value, float):
+        value = int(math.floor(value + 0.5))
+    if not isinstance(value, int):
+        raise ValueError(f"score is not a number: {value!r}")
+    if not 1 <= value <= 5:
+        raise ValueError(f"score {value} is outside 1–5")
+    return value
+
+def parse_scorecard(data: dict) -> tuple[dict, dict]:
+    """Normalise a decoded judge object; returns (scorecard, {dimension: error}).
+
+    Dimension keys are matched case- and separator-insensitively, a bare score is
+    accepted in place of {"score": ...}, and a missing justification or
+    overall_summary becomes "".
+    """
+    found = {}
+    for k, v in data.items():
+        d = _dimension_key(k)
+        if d is not None:
+            found[d] = v
+    card, errors = {}, {}
     for d in DIMENSIONS:
-        if d not in data or "score" not in data[d] or "justification" not in data[d]:
-            raise ValueError(f"Missing keys for {d}.")
-        if not isinstance(data[d]["score"], int) or not (1 <= data[d]["score"] <= 5):
-            raise ValueError(f"Invalid score for {d}.")
-    if "overall_summary" not in data:
-        raise ValueError("Missing overall_summary.")
-    return data
+        entry = found.get(d)
+        if entry is None:
+            errors[d] = "missing"
+            continue
+        if not isinstance(entry, dict):
+            entry = {"score": entry}
+        if "score" not in entry:
+            errors[d] = "missing score"
+            continue
+        try:
+            card[d] = {"score": _coerce_score(entry["score"]), "justification": str(entry.get("justification") or "")}
+        except ValueError as e:
+            errors[d] = str(e)
+    card["overall_summary"] = str(data.get("overall_summary") or "")
+    return card, errors
+
+def validate_scorecard(data: dict) -> dict:
+    if not isinstance(data, dict):
+        raise ScorecardError({d: "not a JSON object" for d in DIMENSIONS})
+    card, errors = parse_scorecard(data)
+    if errors:
+        raise ScorecardError(errors, card)
+    return card
+
+def safe_parse_json(text: str) -> dict:
+    try:
+        data = _extract_json(text)
+    except ValueError as e:  # json.JSONDecodeError is a ValueError
+        raise ScorecardError({d: f"no JSON: {e}" for d in DIMENSIONS}) from e
+    return validate_scorecard(data)
+
+def complete_scorecard(error: ScorecardError, text: str) -> dict:
+    """Fill the dimensions missing from `error.partial` with those parsed from a re-ask reply."""
+    try:
+        data = _extract_json(text)
+    except ValueError as e:
+        raise ScorecardError({d: f"no JSON in re-ask: {e}" for d in error.errors}, error.partial) from e
+    patch, _ = parse_scorecard(data)
+    merged = {**error.partial}
+    for d in error.errors:
+        if d in patch:
+            merged[d] = patch[d]
+    if not merged.get("overall_summary"):
+        merged["overall_summary"] = patch["overall_summary"]
+    return validate_scorecard(merged)
+
+def parse_batch_json(text: str, response_ids: list[str]) -> tuple[dict, dict]:
+    """Parse a batched judge reply keyed by response ID.
+
+    Returns (scorecards, errors): every ID lands in exactly one of the two, so
+    callers can re-judge just the IDs that failed.
+    """
+    try:
+        data = _extract_json(text, lambda obj: "results" in obj or any(rid in obj for rid in response_ids))
+    except ValueError as e:  # json.JSONDecodeError is a ValueError
+        return {}, {rid: f"Batch output was not valid JSON: {e}" for rid in response_ids}
+
+    # tolerate {"results": [{"response_id": ..., ...}, ...]} as well as the keyed object we ask for
+    if isinstance(data.get("results"), list):
+        data = {str(item.get("response_id")): item for item in data["results"] if isinstance(item, dict)}
+
+    scorecards, errors = {}, {}
+    for rid in response_ids:
+        item = data.get(rid)
+        if not isinstance(item, dict):
+            errors[rid] = "Missing from batch output."
+            continue
+        try:
+            scorecards[rid] = validate_scorecard({k: v for k, v in item.items() if k != "response_id"})
+        except (ValueError, TypeError) as e:
+            errors[rid] = str(e)
+    return scorecards, errors
+
+def parse_pairwise_json(text: str) -> dict:
+    """Parse a pairwise judge reply into {"winner": "A" | "B" | "tie", "justification": str}."""
+    try:
+        data = _extract_json(text, lambda obj: "winner" in obj)
+    except ValueError as e:
+        raise ScorecardError({"winner": f"pairwise output was not valid JSON: {e}"}) from e
+    winner = str(data.get("winner", "")).strip().strip("\"'").upper()
+    if winner in ("RESPONSE A", "A"):
+        winner = "A"
+    elif winner in ("RESPONSE B", "B"):
+        winner = "B"
+    elif winner in ("TIE", "DRAW", "EQUAL", "NEITHER", "BOTH"):
+        winner = "tie"
+    else:
+        raise ScorecardError({"winner": f"must be A, B or tie, got {data.get('winner')!r}"})
+    return {"winner": winner, "justification": str(data.get("justification") or "")}
 
 def overall_score(data: dict, weights: dict | None = None) -> float:
     weights = weights or {d: 1.0 for d in DIMENSIONS}
@@ -46,3 +247,16 @@ def radar_series(data: dict):
     angles += angles[:1]
     return angles, values
 
+def to_100(score_1_to_5: int) -> int:
+    return int(round((score_1_to_5 / 5.0) * 100))
+
+def overall_rank(avg_100: float) -> str:
+    if avg_100 >= 90:
+        return "EXCELLENT"
+    if avg_100 >= 80:
+        return "STRONG"
+    if avg_100 >= 70:
+        return "GOOD"
+    if avg_100 >= 60:
+        return "FAIR"
+    return "NEEDS WORK"
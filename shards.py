@@ -0,0 +1,211 @@
+# shards.py
+"""Sharded, resumable sweeps over scenario × persona × temperature × repeat.
+
+    python -m shards sweep.json --workers 4     # process pool on this host
+    python -m shards sweep.json --shard 3/8     # a single shard, e.g. one per host
+    python -m shards sweep.json --merge         # once every shard is done: import into runs.sqlite
+
+Cells are assigned to shards by a hash of their content, so every worker (on
+any host) derives the same split without coordination. Each finished cell is
+appended to its shard's checkpoint file under runs/sweeps/<sweep_id>/; a
+restarted sweep skips every cell found in any checkpoint, so paid calls are not
+repeated. Checkpoints are plain append-only JSONL (one writer per file), which
+is safe on a shared network filesystem where SQLite WAL is not, so shards do
+not write to the run store at all. A single `--merge` afterwards imports
+every checkpointed result into runs.sqlite once (a local --workers run
+merges by itself when its pool finishes).
+"""
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from engine import cells_from_spec, load_spec, run_sweep_sync
+from prompts import DEFAULT_SCENARIOS
+from ratelimit import RateLimiter
+from storage import existing_runs, new_run_id, save_run
+
+SWEEPS_DIR = Path(os.getenv("AGENTEVAL_SWEEPS_DIR", "runs/sweeps"))
+
+# spec keys that change how a sweep runs, not which cells it contains
+_RUNTIME_KEYS = {"concurrency", "rate_limit", "sweep_id"}
+
+def cell_key(cell: dict) -> str:
+    raw = json.dumps(
+        [
+            cell["scenario_key"],
+            cell.get("scenario") or DEFAULT_SCENARIOS.get(cell["scenario_key"], ""),
+            cell["persona"],
+            float(cell["temperature"]),
+            cell["repeat"],
+        ],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+def sweep_id(spec: dict) -> str:
+    if spec.get("sweep_id"):
+        return str(spec["sweep_id"])
+    canonical = json.dumps({k: v for k, v in spec.items() if k not in _RUNTIME_KEYS}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:12]
+
+def shard_cells(cells: list[dict], index: int, count: int) -> list[dict]:
+    return [c for c in cells if int(cell_key(c), 16) % count == index]
+
+def completed(sid: str) -> dict:
+    """{cell_key: result} from every checkpoint of the sweep, whatever shard count wrote it."""
+    done = {}
+    for path in sorted((SWEEPS_DIR / sid).glob("shard-*.jsonl")):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line from a crash
+                done[entry["cell_key"]] = entry["result"]
+    return done
+
+def _load_callable(ref: str):
+    module, _, name = ref.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+def run_shard(spec: dict, index: int, count: int, backend: str | None = None) -> dict:
+    """Run the unfinished cells of one shard, checkpointing each success as it lands."""
+    sid = sweep_id(spec)
+    shard = shard_cells(cells_from_spec(spec), index, count)
+    done = completed(sid)
+    todo = [c for c in shard if cell_key(c) not in done]
+
+    out_dir = SWEEPS_DIR / sid
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / f"shard-{index:04d}-of-{count:04d}.jsonl"
+
+    limiter = None
+    if spec.get("rate_limit"):
+        # the quota is shared by all shards, so each gets an equal slice
+        rl = spec["rate_limit"]
+        limiter = RateLimiter(rpm=float(rl.get("rpm", 15)) / count, tpm=float(rl.get("tpm", 1_000_000)) / count)
+
+    kwargs = {}
+    if backend:
+        kwargs["generate"] = _load_callable(backend)
+
+    errors = []
+    t0 = time.perf_counter()
+    with open(path, "a", encoding="utf-8") as ckpt:
+        def on_result(res: dict) -> None:
+            if "error" in res:
+                errors.append(res)
+                return
+            ckpt.write(json.dumps({"cell_key": cell_key(res), "result": res}, ensure_ascii=False) + "\n")
+            ckpt.flush()
+            os.fsync(ckpt.fileno())
+
+        if todo:
+            run_sweep_sync(
+                todo,
+                concurrency=int(spec.get("concurrency", 8)),
+                model=spec.get("model"),
+                judge_model=spec.get("judge_model"),
+                on_result=on_result,
+                save=False,  # the checkpoint is the shard's only output; merge() imports it
+                limiter=limiter,
+                cache_samples=bool(spec.get("cache_samples", False)),
+                judge_batch_size=int(spec.get("judge_batch_size", 1)),
+                ensemble=spec.get("ensemble"),
+                budgets=spec.get("budgets"),
+                **kwargs,
+            )
+
+    return {
+        "sweep_id": sid,
+        "shard": f"{index}/{count}",
+        "cells": len(shard),
+        "skipped": len(shard) - len(todo),
+        "ran": len(todo) - len(errors),
+        "errors": len(errors),
+        "elapsed_s": round(time.perf_counter() - t0, 3),
+    }
+
+def merge(sid: str) -> dict:
+    """Save every checkpointed result of a sweep to the run store, once each.
+
+    Run it from one process after all shards finished. Each cell's run id is
+    written to merged.jsonl next to the checkpoints *before* the run is saved,
+    so a repeated merge skips it and a merge that crashed in between saves it
+    under the same id instead of importing a second copy.
+    """
+    out_dir = SWEEPS_DIR / sid
+    index_path = out_dir / "merged.jsonl"
+    merged = {}
+    if index_path.exists():
+        with open(index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line: that cell was not saved either
+                merged[entry["cell_key"]] = entry["run_id"]
+    done = completed(sid)
+    saved = existing_runs(merged.values())
+    imported = 0
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with open(index_path, "a", encoding="utf-8") as index:
+        for key, result in done.items():
+            run_id = merged.get(key)
+            if run_id in saved:
+                continue
+            if run_id is None:
+                run_id = new_run_id()
+                index.write(json.dumps({"cell_key": key, "run_id": run_id}) + "\n")
+                index.flush()
+                os.fsync(index.fileno())
+            save_run(result, run_id=run_id)
+            imported += 1
+    return {"sweep_id": sid, "cells": len(done), "imported": imported, "already_imported": len(done) - imported, "errors": 0}
+
+def run_sharded(spec: dict, workers: int, backend: str | None = None) -> dict:
+    """Run all shards of a sweep in a local process pool (one shard per worker), then merge them."""
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        shards = list(pool.map(run_shard, [spec] * workers, range(workers), [workers] * workers, [backend] * workers))
+    merged = merge(sweep_id(spec))
+    return {
+        "sweep_id": sweep_id(spec),
+        "workers": workers,
+        "cells": sum(s["cells"] for s in shards),
+        "skipped": sum(s["skipped"] for s in shards),
+        "ran": sum(s["ran"] for s in shards),
+        "errors": sum(s["errors"] for s in shards),
+        "imported": merged["imported"],
+        "elapsed_s": round(time.perf_counter() - t0, 3),
+        "shards": shards,
+    }
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m shards", description="Run an AgentEval sweep sharded and resumable.")
+    parser.add_argument("spec", help="JSON or YAML sweep spec (same format as python -m engine)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="local worker processes")
+    parser.add_argument("--shard", help="run only shard I/N (0-based), e.g. 3/8")
+    parser.add_argument("--backend", help="module:function to use instead of generate_text (e.g. a fake backend)")
+    parser.add_argument("--merge", action="store_true", help="import the finished shards' checkpoints into the run store")
+    args = parser.parse_args(argv)
+
+    spec = load_spec(args.spec)
+    if args.merge:
+        summary = merge(sweep_id(spec))
+    elif args.shard:
+        index, count = (int(x) for x in args.shard.split("/"))
+        summary = run_shard(spec, index, count, args.backend)
+    else:
+        summary = run_sharded(spec, args.workers, args.backend)
+    print(json.dumps(summary, indent=2))
+    return 0 if summary["errors"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,238 @@
-import json, os, time
+import json, os, secrets, sqlite3, threading, time
 from pathlib import Path
 
+import blobs
+
 STORE_DIR = Path("runs")
 STORE_DIR.mkdir(exist_ok=True)
+DB_PATH = Path(os.getenv("AGENTEVAL_RUN_DB", str(STORE_DIR / "runs.sqlite")))
+
+# Indexed copies of payload fields; the full payload is kept as JSON alongside.
+_COLUMNS = ("scenario_key", "persona", "temperature", "overall_100", "rank")
+# also indexed, but internal: engine.cell_fingerprints hashes, looked up by regression runs
+_FINGERPRINTS = ("fingerprint", "agent_fingerprint")
+_INSERT = (
+    f"INTO runs(run_id, ts, {', '.join(_COLUMNS + _FINGERPRINTS)}, payload) "
+    f"VALUES ({', '.join('?' * (len(_COLUMNS) + len(_FINGERPRINTS) + 3))})"
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    ts REAL NOT NULL,
+    scenario_key TEXT,
+    persona TEXT,
+    temperature REAL,
+    overall_100 REAL,
+    rank TEXT,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_ts ON runs(ts);
+CREATE INDEX IF NOT EXISTS runs_scenario_ts ON runs(scenario_key, ts);
+CREATE INDEX IF NOT EXISTS runs_persona_ts ON runs(persona, ts);
+CREATE INDEX IF NOT EXISTS runs_temperature ON runs(temperature);
+CREATE INDEX IF NOT EXISTS runs_overall ON runs(overall_100);
+CREATE INDEX IF NOT EXISTS runs_rank ON runs(rank);
+"""
+
+def _migrate(db: sqlite3.Connection) -> None:
+    """Add columns introduced after a store was created (SQLite has no ADD COLUMN IF NOT EXISTS)."""
+    have = {r[1] for r in db.execute("PRAGMA table_info(runs)")}
+    for col in _FINGERPRINTS:
+        if col not in have:
+            db.execute(f"ALTER TABLE runs ADD COLUMN {col} TEXT")
+        db.execute(f"CREATE INDEX IF NOT EXISTS runs_{col} ON runs({col})")
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+
+def _connect() -> sqlite3.Connection:
+    """One connection per thread; WAL lets readers (the UI) run alongside sweep writers."""
+    global _initialized
+    db = getattr(_local, "db", None)
+    if db is not None:
+        return db
+    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(str(DB_PATH), timeout=30, isolation_level=None)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    _local.db = db
+    with _init_lock:
+        if not _initialized:
+            fresh = db.execute("SELECT 1 FROM sqlite_master WHERE name = 'runs'").fetchone() is None
+            db.executescript(_SCHEMA)
+            _migrate(db)
+            _initialized = True
+            if fresh:
+                migrate_json_runs()
+    return db
+
+def new_run_id() -> str:
+    # time prefix keeps ids readable and roughly ordered; the random suffix makes them collision-free
+    return f"{int(time.time())}-{secrets.token_hex(6)}"
+
+def _row(run_id: str, ts: float, payload: dict) -> tuple:
+    # scenario / agent_response texts go to the blob store; the row keeps their hashes
+    values = (payload.get(c) for c in _COLUMNS + _FINGERPRINTS)
+    return (run_id, ts, *values, json.dumps(blobs.externalize(payload), ensure_ascii=False))
+
+def _decode(payload: str, text: bool) -> dict:
+    data = json.loads(payload)
+    return blobs.resolve(data) if text else data
+
+def save_run(payload: dict, run_id: str | None = None) -> str:
+    """Insert a run under a fresh id; an explicit `run_id` is inserted at most once, so re-imports are no-ops."""
+    if run_id is not None:
+        _connect().execute("INSERT OR IGNORE " + _INSERT, _row(run_id, time.time(), payload))
+        return run_id
+    while True:
+        run_id = new_run_id()
+        try:
+            _connect().execute("INSERT " + _INSERT, _row(run_id, time.time(), payload))
+            return run_id
+        except sqlite3.IntegrityError:
+            continue  # astronomically rare id clash: draw a new suffix
+
+def _where(filters: dict) -> tuple[str, list]:
+    clauses, args = [], []
+    for col in ("scenario_key", "persona", "temperature", "rank"):
+        if filters.get(col) is not None:
+            clauses.append(f"{col} = ?")
+            args.append(filters[col])
+    if filters.get("min_overall") is not None:
+        clauses.append("overall_100 >= ?")
+        args.append(filters["min_overall"])
+    if filters.get("max_overall") is not None:
+        clauses.append("overall_100 <= ?")
+        args.append(filters["max_overall"])
+    if filters.get("since") is not None:
+        clauses.append("ts >= ?")
+        args.append(filters["since"])
+    if filters.get("until") is not None:
+        clauses.append("ts < ?")
+        args.append(filters["until"])
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", args
+
+def query_runs(limit: int | None = None, offset: int = 0, **filters) -> list[dict]:
+    """Indexed columns of matching runs, newest first (payloads are not parsed).
+
+    Filters: scenario_key, persona, temperature, rank, min_overall, max_overall, since, until.
+    """
+    where, args = _where(filters)
+    sql = f"SELECT run_id, ts, {', '.join(_COLUMNS)} FROM runs{where} ORDER BY ts DESC, run_id DESC"
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        args += [int(limit), int(offset)]
+    cur = _connect().execute(sql, args)
+    names = [d[0] for d in cur.description]
+    return [dict(zip(names, r)) for r in cur.fetchall()]
+
+def count_runs(**filters) -> int:
+    where, args = _where(filters)
+    return _connect().execute(f"SELECT COUNT(*) FROM runs{where}", args).fetchone()[0]
+
+def revision() -> int:
+    """Cheap change marker for caches: grows whenever any process writes a run."""
+    return _connect().execute("SELECT COALESCE(MAX(rowid), 0) FROM runs").fetchone()[0]
+
+def list_runs(limit: int | None = None, offset: int = 0, **filters):
+    return [r["run_id"] for r in query_runs(limit=limit, offset=offset, **filters)]
+
+def load_run(run_id: str, text: bool = True) -> dict:
+    """Stored payload; text=False leaves {"$blob": sha256} stubs instead of reading the text bodies."""
+    row = _connect().execute("SELECT payload FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+    if row is None:
+        raise KeyError(f"Unknown run_id: {run_id}")
+    return _decode(row[0], text)
+
+def existing_runs(run_ids) -> set[str]:
+    """The subset of `run_ids` that are in the store."""
+    wanted = list(dict.fromkeys(run_ids))
+    found = set()
+    db = _connect()
+    for i in range(0, len(wanted), 500):
+        chunk = wanted[i:i + 500]
+        rows = db.execute(f"SELECT run_id FROM runs WHERE run_id IN ({', '.join('?' * len(chunk))})", chunk).fetchall()
+        found.update(r[0] for r in rows)
+    return found
+
+def runs_by_fingerprint(fingerprints, agent: bool = False) -> dict[str, str]:
+    """{fingerprint: run_id of its latest run} for the fingerprints that have one.
+
+    agent=True matches agent_fingerprint instead, i.e. runs whose agent response can be re-judged.
+    """
+    col = _FINGERPRINTS[1] if agent else _FINGERPRINTS[0]
+    wanted = list(dict.fromkeys(fingerprints))
+    found = {}
+    db = _connect()
+    for i in range(0, len(wanted), 500):
+        chunk = wanted[i:i + 500]
+        rows = db.execute(
+            f"SELECT {col}, run_id FROM runs WHERE {col} IN ({', '.join('?' * len(chunk))}) ORDER BY ts, run_id", chunk
+        ).fetchall()
+        found.update(rows)  # oldest first, so the latest run wins
+    return found
+
+def iter_runs(after: tuple[float, str] | None = None, batch: int = 1000, text: bool = True):
+    """Yield (run_id, ts, payload) oldest first, strictly after the (ts, run_id) cursor.
+
+    text=False skips the blob store (see load_run), for scans that only need scores.
+    """
+    ts, run_id = after or (-1.0, "")
+    db = _connect()
+    while True:
+        rows = db.execute(
+            "SELECT run_id, ts, payload FROM runs WHERE (ts, run_id) > (?, ?) ORDER BY ts, run_id LIMIT ?",
+            (ts, run_id, batch),
+        ).fetchall()
+        if not rows:
+            return
+        for run_id, ts, payload in rows:
+            yield run_id, ts, _decode(payload, text)
+
+def migrate_json_runs(directory: Path = STORE_DIR) -> int:
+    """One-shot import of legacy runs/<id>.json files; already-imported ids are skipped."""
+    rows = []
+    for path in sorted(Path(directory).glob("*.json")):
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        head = path.stem.split("-")[0]
+        ts = float(head) if head.isdigit() else path.stat().st_mtime
+        rows.append(_row(path.stem, ts, payload))
+    db = _connect()
+    before = db.total_changes
+    db.execute("BEGIN")
+    db.executemany("INSERT OR IGNORE " + _INSERT, rows)
+    db.execute("COMMIT")
+    return db.total_changes - before
+
+def externalize_runs(batch: int = 500) -> int:
+    """Move inline texts of runs saved before the blob store into it; returns rows rewritten.
+
+    Run VACUUM afterwards (as __main__ does) to return the freed pages to the OS.
+    """
+    db = _connect()
+    changed, cursor = 0, ""
+    while True:
+        rows = db.execute("SELECT run_id, payload FROM runs WHERE run_id > ? ORDER BY run_id LIMIT ?", (cursor, batch)).fetchall()
+        if not rows:
+            return changed
+        updates = []
+        for run_id, payload in rows:
+            slim = json.dumps(blobs.externalize(json.loads(payload)), ensure_ascii=False)
+            if slim != payload:
+                updates.append((slim, run_id))
+        if updates:
+            db.execute("BEGIN")
+            db.executemany("UPDATE runs SET payload = ? WHERE run_id = ?", updates)
+            db.execute("COMMIT")
+            changed += len(updates)
+        cursor = rows[-1][0]
 
-def save_run(payload: dict) -> str:
-    run_id = f"{int(time.time())}"
-    path = STORE_DIR / f"{run_id}.json"
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, ensure_ascii=False, indent=2)
-    return run_id
-
-def list_runs():
-    files = sorted(STORE_DIR.glob("*.json"), reverse=True)
-    return [f.stem for f in files]
-
-def load_run(run_id: str) -> dict:
-    path = STORE_DIR / f"{run_id}.json"
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+if __name__ == "__main__":
+    print(f"Imported {migrate_json_runs()} run(s) into {DB_PATH}")
+    moved = externalize_runs()
+    if moved:
+        _connect().execute("VACUUM")
+    print(f"Moved texts of {moved} run(s) into {blobs.BLOB_DIR} ({blobs.disk_usage()['bytes']:,} bytes of blobs)")
@@ -0,0 +1,102 @@
+# tests/conftest.py
+"""Shared fixtures: the repo root on sys.path, a fake genai client, an isolated response cache and run store."""
+import sys
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import blobs  # noqa: E402
+import cache  # noqa: E402
+import gemini_client  # noqa: E402
+import storage  # noqa: E402
+
+class FakeModels:
+    """Stands in for genai `client.models`; replies with `reply` split into `chunks` pieces."""
+
+    def __init__(self, owner: "FakeClient"):
+        self.owner = owner
+
+    def _usage(self):
+        return SimpleNamespace(prompt_token_count=11, candidates_token_count=7)
+
+    def generate_content(self, model, contents, config):
+        self.owner.calls.append(("generate", model, config))
+        if self.owner.error is not None:
+            raise self.owner.error
+        return SimpleNamespace(text=self.owner.reply, usage_metadata=self._usage())
+
+    def generate_content_stream(self, model, contents, config):
+        self.owner.calls.append(("stream", model, config))
+        if self.owner.error is not None:
+            raise self.owner.error
+        text, n = self.owner.reply, self.owner.chunks
+        step = -(-len(text) // n)
+        pieces = [text[i:i + step] for i in range(0, len(text), step)]
+        for i, piece in enumerate(pieces):
+            last = i == len(pieces) - 1
+            yield SimpleNamespace(text=piece, usage_metadata=self._usage() if last else None)
+
+class FakeClient:
+    """genai.Client replacement for reset_clients(factory); every instance is kept in `instances`."""
+
+    instances: list = []
+    reply = "Hello from the fake model."
+    chunks = 3
+    error: Exception | None = None
+
+    def __init__(self, api_key: str, http_options: dict | None = None):
+        self.api_key = api_key
+        self.http_options = http_options
+        self.calls = []
+        self.closed = 0
+        self.models = FakeModels(self)
+        FakeClient.instances.append(self)
+
+    def close(self) -> None:
+        self.closed += 1
+
+@pytest.fixture(autouse=True)
+def no_cache(monkeypatch):
+    """Tests never touch the real response cache unless they ask for `response_cache`."""
+    monkeypatch.setenv("AGENTEVAL_CACHE", "0")
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    """Route gemini_client through FakeClient with a fresh pool and zeroed stats."""
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(FakeClient, "instances", [])
+    monkeypatch.setattr(FakeClient, "reply", FakeClient.reply)
+    monkeypatch.setattr(FakeClient, "error", None)
+    gemini_client.reset_clients(FakeClient)
+    yield FakeClient
+    gemini_client.reset_clients()
+
+@pytest.fixture
+def response_cache(monkeypatch, tmp_path):
+    """A process cache backed by a throwaway SQLite file."""
+    monkeypatch.delenv("AGENTEVAL_CACHE", raising=False)
+    rc = cache.ResponseCache(tmp_path / "responses.sqlite")
+    monkeypatch.setattr(cache, "_CACHE", rc)
+    yield rc
+    rc.close()
+
+@pytest.fixture
+def run_store(monkeypatch, tmp_path):
+    """A fresh runs.sqlite and blob store under tmp_path; the working directory moves there too,
+    so the legacy runs/*.json migration only sees what the test puts in tmp_path/runs."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "runs").mkdir()
+    monkeypatch.setattr(storage, "DB_PATH", tmp_path / "runs" / "runs.sqlite")
+    monkeypatch.setattr(storage, "_local", threading.local())
+    monkeypatch.setattr(storage, "_initialized", False)
+    monkeypatch.setattr(blobs, "BLOB_DIR", tmp_path / "runs" / "blobs")
+    monkeypatch.setattr(blobs, "_known", set())
+    blobs.get.cache_clear()
+    yield tmp_path / "runs"
+    db = getattr(storage._local, "db", None)
+    if db is not None:
+        db.close()
@@ -0,0 +1,61 @@
+# tests/test_analytics.py
+"""Parquet analytics: run kinds stay apart in the compacted frame and its aggregates."""
+import json
+
+import pytest
+
+import analytics
+import storage
+from scoring import DIMENSIONS
+
+@pytest.fixture
+def dataset(run_store, monkeypatch):
+    monkeypatch.setattr(analytics, "ANALYTICS_DIR", run_store / "analytics")
+    monkeypatch.setattr(analytics, "WATERMARK_PATH", run_store / "analytics" / "_watermark.json")
+    return run_store / "analytics"
+
+def _payload(overall, persona="Analytical", **extra) -> dict:
+    return {
+        "scenario_key": "s1",
+        "persona": persona,
+        "temperature": 0.0,
+        "overall_100": overall,
+        "scores_100": {d: overall for d in DIMENSIONS},
+        **extra,
+    }
+
+def _save_mixed():
+    storage.save_run(_payload(80.0))
+    storage.save_run(_payload(60.0))
+    storage.save_run(_payload(40.0, kind="consistency"))
+    storage.save_run(_payload(20.0, kind="episode"))
+    storage.save_run({"kind": "leaderboard", "players": []})
+
+def test_rows_carry_their_kind(dataset):
+    _save_mixed()
+    assert analytics.compact() == 4
+    frame = analytics.load_frame(columns=["kind", "overall_100"])
+    assert sorted(frame["kind"]) == ["consistency", "episode", "single", "single"]
+    assert analytics.load_frame(kind="single")["overall_100"].tolist() == [80.0, 60.0]
+
+def test_summaries_never_pool_kinds(dataset):
+    _save_mixed()
+    analytics.compact()
+    mixed = analytics.summarize(analytics.load_frame(), by="persona", metrics=["overall_100"])
+    assert mixed.index.names == ["kind", "persona"]
+    assert mixed.loc[("single", "Analytical"), ("overall_100", "mean")] == 70.0
+    assert mixed.loc[("consistency", "Analytical"), ("overall_100", "count")] == 1
+    single = analytics.persona_summary()
+    assert single.index.names == ["persona"]
+    assert single.loc["Analytical", ("overall_100", "mean")] == 70.0
+    assert analytics.scenario_summary(kind="episode").loc["s1", ("overall_100", "mean")] == 20.0
+
+def test_old_format_dataset_is_rebuilt(dataset):
+    storage.save_run(_payload(80.0))
+    analytics.compact()
+    wm = json.loads(analytics.WATERMARK_PATH.read_text())
+    del wm["version"]
+    analytics.WATERMARK_PATH.write_text(json.dumps(wm))
+    storage.save_run(_payload(40.0, kind="consistency"))
+    assert analytics.compact() == 2
+    assert sorted(analytics.load_frame()["kind"]) == ["consistency", "single"]
@@ -0,0 +1,56 @@
+# tests/test_benchmarks.py
+"""Benchmark harness: the fake Gemini server end to end, and the baseline regression check."""
+import pytest
+
+from engine import build_cells, run_sweep_sync
+from prompts import AGENT_PROFILES, DEFAULT_SCENARIOS
+from ratelimit import RateLimiter
+
+from benchmarks.common import report_and_check, save_baseline
+from benchmarks.fake_gemini import FakeGemini
+
+@pytest.fixture
+def cells():
+    scenario = next(iter(DEFAULT_SCENARIOS))
+    return build_cells(scenarios=[scenario], personas=list(AGENT_PROFILES)[:2])
+
+@pytest.fixture(autouse=True)
+def api_key(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "fake-benchmark-key")
+
+def test_sweep_against_fake_server(run_store, cells):
+    with FakeGemini(latency=0.0) as fake:
+        fake.install()
+        results = run_sweep_sync(cells, save=False)
+    assert len(results) == 2
+    assert all("error" not in r for r in results)
+    assert all(r["scores_100"] for r in results)
+    assert fake.stats["requests"] >= 4 and fake.stats["ok"] == fake.stats["requests"]
+
+def test_injected_429s_are_retried(run_store, cells):
+    limiter = RateLimiter(rpm=1_000_000, tpm=1_000_000_000, base_delay=0.01, max_delay=0.05)
+    with FakeGemini(latency=0.0, quota_rate=0.4, retry_delay=0.01, seed=3) as fake:
+        fake.install()
+        results = run_sweep_sync(cells, save=False, limiter=limiter)
+    assert all("error" not in r for r in results)
+    assert fake.stats["quota"] > 0
+
+def test_injected_errors_fail_cells_not_the_sweep(run_store, cells):
+    with FakeGemini(latency=0.0, error_rate=1.0) as fake:
+        fake.install()
+        results = run_sweep_sync(cells, save=False)
+    assert len(results) == 2
+    assert all("error" in r for r in results)
+    assert fake.stats["errors"] == fake.stats["requests"]
+
+def test_report_and_check_flags_regressions(tmp_path, capsys):
+    baseline = save_baseline("bench", {"metrics": {"cells_per_s": 10.0, "p95_latency_ms": 100.0}}, directory=tmp_path)
+    within = {"metrics": {"cells_per_s": 8.0, "p95_latency_ms": 120.0}}
+    assert report_and_check("bench", within, against=str(baseline), tolerance=0.25) == 0
+    assert within["regressions"] == []
+    slower = {"metrics": {"cells_per_s": 7.0, "p95_latency_ms": 100.0}}
+    assert report_and_check("bench", slower, against=str(baseline), tolerance=0.25) == 1
+    assert [r["metric"] for r in slower["regressions"]] == ["cells_per_s"]
+    laggier = {"metrics": {"cells_per_s": 10.0, "p95_latency_ms": 130.0}}
+    assert report_and_check("bench", laggier, against=str(baseline), tolerance=0.25) == 1
+    assert '"regressions"' in capsys.readouterr().out
@@ -0,0 +1,48 @@
+# tests/test_blobs.py
+"""Blob store: round-trip, one file per distinct text, and payload externalize/resolve."""
+import pytest
+
+import blobs
+import storage
+
+TEXT = "Stakeholder update: we pause the launch and audit the training data. " * 20
+
+def test_put_get_round_trip(run_store):
+    h = blobs.put(TEXT)
+    assert h == blobs.digest(TEXT)
+    blobs.get.cache_clear()  # read back from disk, not the decoded-text cache
+    assert blobs.get(h) == TEXT
+    unicode = "ünïcødé ✓ " * 50
+    assert blobs.get(blobs.put(unicode)) == unicode
+    with pytest.raises(KeyError):
+        blobs.get("0" * 64)
+
+def test_identical_texts_are_stored_once(run_store):
+    for _ in range(5):
+        blobs.put(TEXT)
+    blobs._known.clear()  # a fresh process only finds the file on disk
+    blobs.put(TEXT)
+    blobs.put(TEXT + " (edited)")
+    assert blobs.disk_usage()["blobs"] == 2
+    assert blobs.disk_usage()["bytes"] < len(TEXT)  # compressed
+
+def test_externalize_and_resolve_payloads(run_store):
+    payload = {
+        "scenario": TEXT,
+        "agent_response": "short",  # under BLOB_MIN_BYTES: stays inline
+        "transcript": [{"role": "agent", "utterance": TEXT}, {"role": "stakeholder", "utterance": TEXT}],
+        "scores_100": {"reasoning_quality": 80},
+    }
+    slim = blobs.externalize(payload)
+    ref = {"$blob": blobs.digest(TEXT)}
+    assert slim["scenario"] == ref
+    assert slim["agent_response"] == "short"
+    assert [t["utterance"] for t in slim["transcript"]] == [ref, ref]
+    assert blobs.refs(slim) == {ref["$blob"]}
+    assert blobs.resolve(slim) == payload
+    assert blobs.disk_usage()["blobs"] == 1
+
+def test_runs_share_blobs(run_store):
+    ids = [storage.save_run({"scenario": TEXT, "agent_response": f"{TEXT} #{i}", "scenario_key": "s"}) for i in range(3)]
+    assert blobs.disk_usage()["blobs"] == 4  # one scenario + three responses
+    assert [storage.load_run(i)["agent_response"] for i in ids] == [f"{TEXT} #{i}" for i in range(3)]
@@ -0,0 +1,41 @@
+# tests/test_cache.py
+"""Response-cache keys: each `sample` index gets its own entry; unindexed sampling is not cached."""
+from cache import ResponseCache
+from gemini_client import cache_lookup, generate_text
+
+def _key(**kw):
+    _, key, _ = cache_lookup("sys", "user", **kw)
+    return key
+
+def test_sample_index_is_part_of_the_key(response_cache):
+    keys = {_key(temperature=0.7, sample=i) for i in range(3)}
+    assert len(keys) == 3
+    assert _key(temperature=0.7, sample=1) == _key(temperature=0.7, sample=1)
+    # sample 0 and an unsampled deterministic call of the same temperature share an entry
+    assert _key(temperature=0.0, sample=0) == _key(temperature=0.0)
+
+def test_sampling_without_index_is_not_cached(response_cache):
+    assert cache_lookup("sys", "user", 0.7) == (None, None, None)
+    assert cache_lookup("sys", "user", 0.7, use_cache=True)[0] is response_cache
+    assert cache_lookup("sys", "user", 0.0, use_cache=False) == (None, None, None)
+
+def test_samples_are_cached_separately(fake_client, response_cache):
+    replies = []
+    for i in range(2):
+        fake_client.reply = f"sample {i}"
+        replies.append(generate_text("sys", "user", temperature=0.9, sample=i))
+    fake_client.reply = "unused"
+    assert [generate_text("sys", "user", temperature=0.9, sample=i) for i in range(2)] == replies == ["sample 0", "sample 1"]
+    assert len(fake_client.instances[0].calls) == 2
+
+def test_size_cap_holds_across_processes_sharing_a_file(tmp_path):
+    # two handles on one file stand in for two shard processes
+    a = ResponseCache(tmp_path / "shared.sqlite", max_bytes=1000)
+    b = ResponseCache(tmp_path / "shared.sqlite", max_bytes=1000)
+    for i in range(6):
+        (a if i % 2 else b).put(f"k{i}", "x" * 300)
+        assert a.info()["bytes"] <= 1000
+    assert b.get("k5") == "x" * 300
+    assert a.get("k0") is None
+    a.close()
+    b.close()
@@ -0,0 +1,100 @@
+# tests/test_consistency.py
+"""Adaptive sampling: early stopping, a bounded number of attempts, and limiter-routed calls."""
+import asyncio
+import json
+
+import pytest
+
+import consistency
+from gemini_client import QuotaExceededError
+from prompts import AGENT_SYSTEM
+from ratelimit import RateLimiter
+from scoring import DIMENSIONS
+from tokens import count_tokens
+
+CELL = {"scenario_key": "s", "scenario": "A launch with a known bias issue.", "persona": "Ethics-First", "temperature": 0.7}
+
+def _card(score: int) -> str:
+    return json.dumps({**{d: {"score": score, "justification": "ok"} for d in DIMENSIONS}, "overall_summary": ""})
+
+def _calls(ok_samples, scores=lambda i: 4):
+    """agent_call succeeds only for sample indexes in `ok_samples`; the judge scores sample i as scores(i)."""
+    attempted = []
+
+    async def agent_call(system_prompt, user_prompt, temperature, sample, max_output_tokens=None):
+        attempted.append(sample)
+        if sample not in ok_samples:
+            raise QuotaExceededError(None)
+        return f"answer {sample}"
+
+    async def judge_call(system_prompt, user_prompt, temperature, sample, max_output_tokens=None):
+        i = int(user_prompt.split("answer ")[1].split()[0])
+        return _card(scores(i))
+
+    return agent_call, judge_call, attempted
+
+def test_stops_when_the_ci_is_tight():
+    agent_call, judge_call, attempted = _calls(range(100))
+    agg = asyncio.run(consistency.sample_cell(CELL, agent_call, judge_call, min_samples=3, max_samples=12))
+    assert agg["stop_reason"] in ("ci_width", "rank_settled")
+    assert agg["n_samples"]["agent"] == 3
+    assert agg["overall_100"] == 80.0
+    assert attempted == [0, 1, 2]
+
+def test_persistent_failures_stop_after_max_attempts():
+    # three good samples that disagree wildly, then every sample fails
+    agent_call, judge_call, attempted = _calls({0, 1, 2}, scores=lambda i: 1 if i % 2 else 5)
+    agg = asyncio.run(consistency.sample_cell(CELL, agent_call, judge_call, min_samples=3, max_samples=12))
+    assert agg["stop_reason"] == "attempts_exhausted"
+    assert agg["n_samples"]["agent"] == 3
+    assert agg["n_samples"]["attempted"] == 24
+    assert sorted(attempted) == list(range(24))  # every index tried once
+
+def test_too_few_successes_raise():
+    agent_call, judge_call, attempted = _calls({0})
+    with pytest.raises(RuntimeError, match="Only 1 of 3 samples succeeded in 8 attempts"):
+        asyncio.run(consistency.sample_cell(CELL, agent_call, judge_call, min_samples=3, max_samples=4))
+    assert len(attempted) == 8
+
+def test_run_consistency_retries_quota_through_the_limiter():
+    failures = {"left": 2}
+
+    def generate(system_prompt, user_prompt, temperature=0.3, model=None, sample=None, use_cache=None, **kw):
+        if system_prompt == AGENT_SYSTEM:
+            if failures["left"]:
+                failures["left"] -= 1
+                raise QuotaExceededError(0.01)
+            return f"answer {sample}"
+        return _card(4)
+
+    limiter = RateLimiter(rpm=60000, tpm=100_000_000, base_delay=0.01, max_delay=0.02)
+    results = asyncio.run(consistency.run_consistency(
+        [CELL], generate=generate, limiter=limiter, save=False, min_samples=3, max_samples=6,
+    ))
+    assert "error" not in results[0]
+    assert results[0]["n_samples"]["agent"] == 3
+    assert limiter.stats["retries"] == 2
+    assert limiter.stats["granted"] >= 3 + 3 + 2
+
+def test_calls_carry_output_caps_and_judge_inputs_are_compacted():
+    caps = {"agent": set(), "judge": set()}
+    judge_inputs = []
+    budgets = {"agent_output": 300, "judge_output": 400, "judge_input": 1500}
+
+    async def agent_call(system_prompt, user_prompt, temperature, sample, max_output_tokens=None):
+        caps["agent"].add(max_output_tokens)
+        return "\n\n".join(f"Point {k}: " + "we weigh the trade-offs carefully " * 20 for k in range(40))
+
+    async def judge_call(system_prompt, user_prompt, temperature, sample, max_output_tokens=None):
+        caps["judge"].add(max_output_tokens)
+        judge_inputs.append(count_tokens(system_prompt) + count_tokens(user_prompt))
+        return _card(4)
+
+    agg = asyncio.run(consistency.sample_cell(CELL, agent_call, judge_call, budgets=budgets))
+    assert caps == {"agent": {300}, "judge": {400}}
+    assert max(judge_inputs) <= 1500
+    tokens = agg["tokens"]
+    assert tokens["budgets"]["judge_input"] == 1500
+    assert tokens["agent_max_output"] == 300
+    assert tokens["compaction"] is not None
+    assert tokens["agent_response"] > tokens["judge_input"]
@@ -0,0 +1,44 @@
+# tests/test_ensemble.py
+"""Judge ensembles: early consensus cancels stragglers, and alpha is only reported for a full panel."""
+import asyncio
+import json
+
+import pytest
+
+from ensemble import ensemble_judge, krippendorff_alpha, panel_from_config
+from prompts import EVALUATOR_SYSTEM_VARIANTS
+from scoring import DIMENSIONS
+
+def _card(scores) -> str:
+    return json.dumps({**{d: {"score": s, "justification": "ok"} for d, s in zip(DIMENSIONS, scores)}, "overall_summary": ""})
+
+PANEL = [{"model": f"m{i}", "rubric": list(EVALUATOR_SYSTEM_VARIANTS)[0], "temperature": 0.0} for i in range(3)]
+REPLIES = {"m0": ((4, 4, 3, 5, 4), 0.0), "m1": ((4, 4, 3, 5, 4), 0.01), "m2": ((2, 5, 1, 3, 2), 0.2)}
+
+async def _call(system_prompt, user_prompt, temperature, model, metrics):
+    scores, delay = REPLIES[model]
+    await asyncio.sleep(delay)
+    return _card(scores)
+
+def _judge(**options):
+    return asyncio.run(ensemble_judge("scenario", "response", "judge prompt", PANEL, _call, **options))
+
+def test_early_consensus_reports_no_alpha():
+    card, report = _judge(quorum=2)
+    assert report["consensus"] is True
+    assert report["cancelled"] == 1
+    assert report["scored"] == 2
+    assert report["alpha"] is None
+    assert [card[d]["score"] for d in DIMENSIONS] == [4, 4, 3, 5, 4]
+
+def test_full_panel_reports_alpha():
+    card, report = _judge(quorum=3)
+    assert report["cancelled"] == 0 and report["scored"] == 3
+    scores = [REPLIES[f"m{i}"][0] for i in range(3)]
+    assert report["alpha"] == pytest.approx(krippendorff_alpha(scores))
+    assert report["alpha"] < 1.0
+    assert report["spread"]["reasoning_quality"] == 2.0
+
+def test_identical_cached_judges_are_rejected():
+    with pytest.raises(ValueError):
+        panel_from_config({"judges": [{"model": "gemini-2.0-flash"}, {"model": "gemini-2.0-flash"}]})
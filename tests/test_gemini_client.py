@@ -0,0 +1,57 @@
+# tests/test_gemini_client.py
+"""Client pooling: one client per (key, model, transport options), closed exactly once."""
+import gemini_client
+from gemini_client import client_stats, close_clients, generate_text, get_client
+
+def test_same_model_reuses_one_client(fake_client):
+    first = get_client("gemini-2.0-flash")
+    for _ in range(3):
+        assert get_client("gemini-2.0-flash") is first
+
+    stats = client_stats()
+    assert stats["created"] == 1
+    assert stats["reused"] == 3
+    assert stats["open"] == 1
+    assert stats["reuse_ratio"] == 0.75
+    assert len(fake_client.instances) == 1
+
+def test_model_and_transport_options_get_their_own_clients(fake_client):
+    a = get_client("gemini-2.0-flash")
+    b = get_client("gemini-2.5-pro")
+    c = get_client("gemini-2.0-flash", {"timeout": 5000})
+    assert len({id(a), id(b), id(c)}) == 3
+    assert c.http_options == {"timeout": 5000}
+    assert get_client("gemini-2.0-flash", {"timeout": 5000}) is c
+    assert client_stats()["created"] == 3
+
+def test_generate_text_goes_through_the_pool(fake_client):
+    for _ in range(4):
+        assert generate_text("sys", "user", temperature=0.3) == "Hello from the fake model."
+    assert len(fake_client.instances) == 1
+    assert len(fake_client.instances[0].calls) == 4
+    stats = client_stats()
+    assert (stats["created"], stats["reused"]) == (1, 3)
+
+def test_close_clients_counts_each_client_once(fake_client):
+    get_client("gemini-2.0-flash")
+    get_client("gemini-2.5-pro")
+    close_clients()
+    close_clients()  # nothing left to close
+
+    assert [c.closed for c in fake_client.instances] == [1, 1]
+    stats = client_stats()
+    assert stats["closed"] == 2
+    assert stats["open"] == 0
+
+    # a closed pool starts over with a fresh client
+    get_client("gemini-2.0-flash")
+    assert client_stats()["created"] == 3
+    assert len(fake_client.instances) == 3
+
+def test_reset_clients_closes_and_zeroes_stats(fake_client):
+    client = get_client("gemini-2.0-flash")
+    get_client("gemini-2.0-flash")
+    gemini_client.reset_clients(fake_client)
+
+    assert client.closed == 1
+    assert client_stats() == {"created": 0, "reused": 0, "closed": 0, "open": 0, "reuse_ratio": 0.0}
@@ -0,0 +1,108 @@
+# tests/test_judging.py
+"""Batched judging: partial batches re-ask only the failed IDs, unparseable ones split, batchers flush."""
+import asyncio
+import json
+import re
+
+from judging import JudgeBatcher, judge_batch_async
+from scoring import DIMENSIONS
+
+SCENARIO = "A launch with a known bias issue."
+
+def _card(score: int) -> dict:
+    card = {d: {"score": score, "justification": "ok"} for d in DIMENSIONS}
+    card["overall_summary"] = f"Scored {score}."
+    return card
+
+class ScriptedJudge:
+    """Scores "answer N" as N on every dimension; `broken` IDs get a bad score the first time they are judged in a batch."""
+
+    def __init__(self, responses: dict, broken=(), garbage_batches: int = 0):
+        self.responses = responses
+        self.broken = set(broken)
+        self.garbage_batches = garbage_batches
+        self.prompts = []
+
+    def _score(self, text: str) -> int:
+        return int(re.search(r"answer (\d)", text).group(1))
+
+    async def __call__(self, system_prompt: str, user_prompt: str) -> str:
+        self.prompts.append(user_prompt)
+        ids = re.findall(r"^### Response (\S+)$", user_prompt, re.M)
+        if not ids:  # the one-response prompt
+            return json.dumps(_card(self._score(user_prompt)))
+        if self.garbage_batches:
+            self.garbage_batches -= 1
+            return "Sorry, I can only score one response at a time."
+        out = {}
+        for rid in ids:
+            card = _card(self._score(self.responses[rid]))
+            if rid in self.broken:
+                self.broken.discard(rid)
+                card["bias_awareness"] = {"score": "great"}
+            out[rid] = card
+        return json.dumps(out)
+
+def _scores(results: dict) -> dict:
+    return {rid: card["reasoning_quality"]["score"] for rid, card in results.items()}
+
+def test_partial_batch_retries_only_the_failed_ids():
+    responses = {f"r{i}": f"answer {i}" for i in range(1, 5)}
+    judge = ScriptedJudge(responses, broken={"r2", "r4"})
+    results, stats = asyncio.run(judge_batch_async(SCENARIO, responses, judge, batch_size=4))
+
+    assert _scores(results) == {"r1": 1, "r2": 2, "r3": 3, "r4": 4}
+    assert stats == {"requests": 2, "splits": 0, "retried": 2}
+    assert re.findall(r"^### Response (\S+)$", judge.prompts[1], re.M) == ["r2", "r4"]
+
+def test_unparseable_batch_is_split_down_to_single_prompts():
+    responses = {f"r{i}": f"answer {i}" for i in range(1, 5)}
+    judge = ScriptedJudge(responses, garbage_batches=3)  # the 4-batch and both 2-batches fail
+    results, stats = asyncio.run(judge_batch_async(SCENARIO, responses, judge, batch_size=4))
+
+    assert _scores(results) == {"r1": 1, "r2": 2, "r3": 3, "r4": 4}
+    assert stats["splits"] == 3
+    assert stats["requests"] == 1 + 2 + 4
+
+def test_a_response_that_never_parses_fails_alone():
+    responses = {"r1": "answer 1", "r2": "answer 2"}
+
+    async def judge(system_prompt, user_prompt):
+        if "### Response" in user_prompt:
+            return json.dumps({"r1": _card(1), "r2": {"reasoning_quality": "?"}})
+        return "no idea"
+
+    results, _ = asyncio.run(judge_batch_async(SCENARIO, responses, judge, batch_size=2))
+    assert results["r1"]["reasoning_quality"]["score"] == 1
+    assert isinstance(results["r2"], Exception)
+
+def test_batcher_flushes_when_full_and_when_the_last_agent_is_done():
+    # the batcher numbers responses r1, r2, ... in submission order
+    judge = ScriptedJudge({"r1": "answer 1", "r2": "answer 2", "r3": "answer 3"})
+
+    async def main():
+        batcher = JudgeBatcher(SCENARIO, batch_size=2, pending=4, call=judge)
+        futures = [batcher.submit("answer 1"), batcher.submit("answer 2")]
+        await asyncio.sleep(0.01)
+        assert len(judge.prompts) == 1  # full batch sent at once
+        futures.append(batcher.submit("answer 3"))
+        await asyncio.sleep(0.01)
+        assert len(judge.prompts) == 1  # one agent still outstanding: wait for a partner
+        batcher.agent_done()  # that agent failed
+        return await asyncio.gather(*futures)
+
+    cards = asyncio.run(main())
+    assert [c["reasoning_quality"]["score"] for c in cards] == [1, 2, 3]
+    assert len(judge.prompts) == 2
+
+def test_batcher_propagates_per_response_failures():
+    async def judge(system_prompt, user_prompt):
+        raise RuntimeError("judge down")
+
+    async def main():
+        batcher = JudgeBatcher(SCENARIO, batch_size=2, pending=2, call=judge)
+        futures = [batcher.submit("answer 1"), batcher.submit("answer 2")]
+        return await asyncio.gather(*futures, return_exceptions=True)
+
+    outcomes = asyncio.run(main())
+    assert [str(o) for o in outcomes] == ["judge down", "judge down"]
@@ -0,0 +1,134 @@
+# tests/test_pairwise.py
+"""Bradley-Terry leaderboard and tournaments: known orderings, informative pairs, re-asks, failed answers."""
+import asyncio
+import json
+import math
+import random
+import re
+
+import numpy as np
+import pytest
+
+import pairwise
+from gemini_client import QuotaExceededError
+from pairwise import Leaderboard
+from prompts import AGENT_SYSTEM
+from tokens import count_tokens
+
+STRENGTHS = {"strong": 1.5, "good": 0.7, "fair": 0.0, "weak": -0.8, "poor": -1.6}
+
+def _play(lb: Leaderboard, games: int, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    players = list(STRENGTHS)
+    for _ in range(games):
+        a, b = rng.sample(players, 2)
+        p = 1 / (1 + math.exp(STRENGTHS[b] - STRENGTHS[a]))
+        lb.record(a, b, 1.0 if rng.random() < p else 0.0)
+
+def test_recovers_a_known_ordering():
+    lb = Leaderboard(list(reversed(STRENGTHS)))
+    _play(lb, 600)
+    assert [r["player"] for r in lb.table()] == list(STRENGTHS)
+    assert [r["rank"] for r in lb.table()] == [1, 2, 3, 4, 5]
+    assert lb.win_probability("strong", "poor") > 0.9
+    # incremental Newton steps track a fit from scratch
+    fresh = Leaderboard(lb.players)
+    fresh.wins = lb.wins.copy()
+    fresh.fit()
+    assert np.allclose(lb.theta, fresh.theta, atol=1e-3)
+    assert lb.settled(z=1.0)
+
+def test_ties_and_unbeaten_players_stay_finite():
+    lb = Leaderboard(["a", "b", "c"])
+    for _ in range(10):
+        lb.record("a", "b", 1.0)
+        lb.record("b", "c", 0.5)
+    assert np.isfinite(lb.theta).all()
+    assert lb.theta[0] > lb.theta[1]
+    assert lb.theta[1] == pytest.approx(lb.theta[2], abs=0.3)
+    assert sum(r["games"] for r in lb.table()) == 40
+
+def test_next_pairs_prefers_unplayed_and_respects_exclude():
+    lb = Leaderboard(["a", "b", "c", "d"])
+    for _ in range(5):
+        lb.record("a", "b", 1.0)
+        lb.record("c", "d", 0.0)
+    first = lb.next_pairs(1)[0]
+    assert set(first) not in ({"a", "b"}, {"c", "d"})
+    pairs = lb.next_pairs(6, exclude={first})
+    assert first not in pairs and len(pairs) == 5
+    assert Leaderboard(["solo"]).next_pairs(3) == []
+
+def test_round_trip_and_new_players():
+    lb = Leaderboard(list(STRENGTHS))
+    _play(lb, 100)
+    copy = Leaderboard.from_dict(lb.to_dict())
+    assert copy.table() == lb.table()
+    idx = copy.add_player("newcomer")
+    assert copy.add_player("newcomer") == idx == len(STRENGTHS)
+    assert copy.wins.shape == (6, 6)
+    assert "newcomer" in copy.next_pairs(1)[0]
+
+# ------------------ tournament ------------------
+def _fake_backend(calls: list, fail_models=(), padding: str = ""):
+    rank = {"m1": 3, "m2": 2, "m3": 1}
+
+    async def agenerate_text(system_prompt, user_prompt, temperature=0.3, model=None, max_output_tokens=None):
+        calls.append((system_prompt, user_prompt, max_output_tokens))
+        if system_prompt == AGENT_SYSTEM:
+            if model in fail_models:
+                raise QuotaExceededError(1.0)
+            return f"Answer written by {model}.{padding}"
+        if "could not be read" not in user_prompt:
+            return "Both responses have merit."  # no JSON: forces the re-ask
+        a = re.search(r"Response A:\nAnswer written by (\w+)", user_prompt).group(1)
+        b = re.search(r"Response B:\nAnswer written by (\w+)", user_prompt).group(1)
+        return json.dumps({"winner": "A" if rank[a] > rank[b] else "B", "justification": "Clearer plan."})
+
+    return agenerate_text
+
+def _players(*models) -> list[dict]:
+    return [{"persona": "Ethics-First", "model": m, "temperature": 0.0} for m in models]
+
+def test_tournament_reasks_unreadable_verdicts(monkeypatch):
+    calls = []
+    monkeypatch.setattr(pairwise, "agenerate_text", _fake_backend(calls))
+    record = asyncio.run(pairwise.run_tournament({"s": "A scenario."}, _players("m3", "m1", "m2"), budget=6, save=False))
+
+    assert [r["player"].split(" · ")[1] for r in record["leaderboard"]] == ["m1", "m2", "m3"]
+    stats = record["stats"]
+    assert stats["errors"] == 0 and stats["comparisons"] == 6
+    assert stats["judge_calls"] == 2 * stats["comparisons"]  # every verdict needed its one re-ask
+    assert record["failed_answers"] == []
+
+def test_failed_answer_drops_only_that_player(monkeypatch):
+    calls = []
+    monkeypatch.setattr(pairwise, "agenerate_text", _fake_backend(calls, fail_models={"m2"}))
+    record = asyncio.run(pairwise.run_tournament({"s": "A scenario."}, _players("m1", "m2", "m3"), budget=4, save=False))
+
+    assert [f["player"].split(" · ")[1] for f in record["failed_answers"]] == ["m2"]
+    assert "QuotaExceededError" in record["failed_answers"][0]["error"]
+    assert [r["player"].split(" · ")[1] for r in record["leaderboard"]] == ["m1", "m3"]
+    assert record["stats"]["agent_errors"] == 1
+    assert record["stats"]["errors"] == 0
+    assert all("m2" not in c["a"] + c["b"] for c in record["comparisons"])
+    assert record["stats"]["comparisons"] == 2  # both A/B orders of the one remaining pair
+
+def test_tournament_calls_are_capped_and_answers_compacted(monkeypatch):
+    calls = []
+    padding = "".join(f"\n\nPoint {k}: " + "we weigh the trade-offs carefully " * 20 for k in range(40))
+    monkeypatch.setattr(pairwise, "agenerate_text", _fake_backend(calls, padding=padding))
+    budgets = {"agent_output": 300, "judge_output": 200, "judge_input": 2000}
+    record = asyncio.run(pairwise.run_tournament(
+        {"s": "A scenario."}, _players("m1", "m2"), budget=2, save=False, budgets=budgets,
+    ))
+
+    assert record["stats"]["comparisons"] == 2
+    assert {cap for system, _, cap in calls if system == AGENT_SYSTEM} == {300}
+    judge_calls = [(system, user, cap) for system, user, cap in calls if system != AGENT_SYSTEM]
+    assert {cap for _, _, cap in judge_calls} == {200}
+    first_asks = [(system, user) for system, user, _ in judge_calls if "could not be read" not in user]
+    assert len(first_asks) == 2
+    assert all(count_tokens(system) + count_tokens(user) <= 2000 for system, user in first_asks)
+    assert record["tokens"]["budgets"]["judge_input"] == 2000
+    assert record["tokens"]["compacted_answers"] == 2
@@ -0,0 +1,129 @@
+# tests/test_ratelimit.py
+"""RateLimiter: priority grants and 429 backoff driven by the server's retry hint."""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from gemini_client import QuotaExceededError, _quota_error, _retry_after, generate_text
+from ratelimit import AGENT, JUDGE, RateLimiter
+
+class _ApiError(Exception):
+    """Shaped like a google-genai APIError: a message plus the HTTP response."""
+
+    def __init__(self, message: str, headers: dict | None = None):
+        super().__init__(message)
+        self.response = SimpleNamespace(headers=headers or {})
+
+def _drained(rpm: float = 600) -> RateLimiter:
+    limiter = RateLimiter(rpm=rpm, tpm=1_000_000, base_delay=0.01, max_delay=0.05)
+    limiter.requests.level = 0.0  # next grant waits ~60/rpm seconds
+    return limiter
+
+# ------------------ priority ------------------
+def test_judge_is_granted_before_an_earlier_agent():
+    limiter = _drained()
+    order = []
+
+    async def take(name, priority, delay):
+        await asyncio.sleep(delay)
+        await limiter.acquire(1, priority)
+        order.append(name)
+
+    async def main():
+        await asyncio.gather(
+            take("agent-1", AGENT, 0.0),
+            take("agent-2", AGENT, 0.005),
+            take("judge", JUDGE, 0.01),
+        )
+
+    asyncio.run(main())
+    assert order == ["judge", "agent-1", "agent-2"]
+    assert limiter.stats["granted"] == 3
+    assert limiter.stats["throttled"] > 0
+
+def test_same_priority_is_first_come_first_served():
+    limiter = _drained()
+    order = []
+
+    async def take(i):
+        await asyncio.sleep(0.002 * i)
+        await limiter.acquire(1, JUDGE)
+        order.append(i)
+
+    async def main():
+        await asyncio.gather(*(take(i) for i in range(4)))
+
+    asyncio.run(main())
+    assert order == [0, 1, 2, 3]
+
+# ------------------ 429 backoff ------------------
+def test_retry_after_prefers_the_header():
+    e = _ApiError("429 RESOURCE_EXHAUSTED. {'retryDelay': '3s'}", {"retry-after": "7"})
+    assert _retry_after(e) == 7.0
+
+@pytest.mark.parametrize("message, expected", [
+    ("429 RESOURCE_EXHAUSTED. {'@type': 'type.googleapis.com/google.rpc.RetryInfo', 'retryDelay': '3s'}", 3.0),
+    ('{"retryDelay": "12.5s"}', 12.5),
+    ("Quota exceeded, please retry in 1.5s.", 1.5),
+    ("500 INTERNAL", None),
+])
+def test_retry_after_parses_the_message(message, expected):
+    assert _retry_after(_ApiError(message, {"retry-after": "soon"})) == expected
+    assert _retry_after(Exception(message)) == expected
+
+def test_retry_after_tolerates_a_response_without_headers():
+    e = _ApiError("429 RESOURCE_EXHAUSTED. {'retryDelay': '3s'}")
+    e.response = SimpleNamespace(headers=None)
+    assert _retry_after(e) == 3.0
+    e.response = None
+    assert _retry_after(e) == 3.0
+
+def test_quota_error_carries_the_hint():
+    quota = _quota_error(_ApiError("429 RESOURCE_EXHAUSTED", {"retry-after": "4"}))
+    assert isinstance(quota, QuotaExceededError)
+    assert quota.retry_after == 4.0
+    assert _quota_error(_ApiError("500 INTERNAL")) is None
+
+def test_generate_text_raises_quota_with_retry_after(fake_client):
+    fake_client.error = _ApiError("429 RESOURCE_EXHAUSTED. {'retryDelay': '2s'}")
+    with pytest.raises(QuotaExceededError) as info:
+        generate_text("sys", "user", temperature=0.3)
+    assert info.value.retry_after == 2.0
+
+def test_backoff_never_undercuts_retry_after():
+    limiter = RateLimiter(rpm=60, tpm=1_000_000, base_delay=0.01, max_delay=0.05)
+    for attempt in range(5):
+        assert limiter.backoff(attempt, 5.0) >= 5.0
+        assert 0.0 <= limiter.backoff(attempt, None) <= 0.05
+
+def test_call_retries_quota_and_pauses_for_the_hint():
+    limiter = RateLimiter(rpm=6000, tpm=1_000_000, base_delay=0.01, max_delay=0.05)
+    attempts = []
+    metrics = {}
+
+    async def fn():
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise QuotaExceededError(0.1)
+        return "ok"
+
+    assert asyncio.run(limiter.call(fn, tokens=10, priority=JUDGE, metrics=metrics)) == "ok"
+    assert len(attempts) == 3
+    assert limiter.stats["retries"] == 2
+    assert metrics["retries"] == 2
+    # every retry waited out the server's hint
+    assert all(b - a >= 0.09 for a, b in zip(attempts, attempts[1:]))
+    assert limiter.scale < limiter.target
+
+def test_call_gives_up_after_max_retries():
+    limiter = RateLimiter(rpm=6000, tpm=1_000_000, max_retries=2, base_delay=0.001, max_delay=0.002)
+
+    async def fn():
+        raise QuotaExceededError(None)
+
+    with pytest.raises(QuotaExceededError):
+        asyncio.run(limiter.call(fn))
+    assert limiter.stats["retries"] == 2
+    assert limiter.stats["gave_up"] == 1
@@ -0,0 +1,59 @@
+# tests/test_regression.py
+"""Regression mode: fingerprint-based reuse / re-judge / re-run planning and the permutation tests."""
+import asyncio
+
+import numpy as np
+
+import regression
+from engine import build_cells
+from prompts import AGENT_PROFILES, DEFAULT_SCENARIOS
+
+SETTINGS = {"model": "local:rules", "judge_model": "local:rules"}
+
+def _cells() -> list[dict]:
+    cells = build_cells(list(DEFAULT_SCENARIOS)[:2], list(AGENT_PROFILES)[:2], [0.0], 1)
+    return [{**c, "scenario": DEFAULT_SCENARIOS[c["scenario_key"]]} for c in cells]
+
+def _statuses(steps: list[dict]) -> list[str]:
+    return [s["status"] for s in steps]
+
+def test_plan_reuses_rejudges_and_reruns(run_store):
+    cells = _cells()
+    assert _statuses(regression.plan(cells, SETTINGS)) == ["ran"] * 4
+
+    first = asyncio.run(regression.evaluate(cells, SETTINGS))
+    assert [e["status"] for e in first] == ["ran"] * 4
+    assert all("error" not in e for e in first)
+
+    # unchanged inputs: every cell maps to its stored run, no model calls
+    steps = regression.plan(cells, SETTINGS)
+    assert _statuses(steps) == ["reused"] * 4
+    assert {s["source"] for s in steps} == {e["run_id"] for e in first}
+
+    # a judge-side change keeps the agent responses
+    judge_change = {**SETTINGS, "budgets": {"judge_output": 1024}}
+    assert _statuses(regression.plan(cells, judge_change)) == ["rejudged"] * 4
+
+    # an agent-side change for one cell re-runs just that cell
+    edited = [dict(c) for c in cells]
+    edited[0]["scenario"] += "\nThe board meets tomorrow."
+    assert _statuses(regression.plan(edited, SETTINGS)) == ["ran", "reused", "reused", "reused"]
+
+    # the re-judged results are stored too, so the same change is free the next time
+    again = asyncio.run(regression.evaluate(cells, judge_change))
+    assert sorted(e["status"] for e in again) == ["rejudged"] * 4
+    assert _statuses(regression.plan(cells, judge_change)) == ["reused"] * 4
+
+def test_permutation_pvalue_detects_a_known_shift():
+    rng = np.random.default_rng(7)
+    a = 60 + rng.normal(0, 3, size=8)
+    assert regression.permutation_pvalue(a, a + 15) < 0.01
+    assert regression.permutation_pvalue(a, rng.permutation(a)) == 1.0
+    assert regression.permutation_pvalue(a, a + 0.5) > 0.05
+    assert regression.permutation_pvalue([60], [70, 80]) is None
+
+def test_sign_flip_pvalue():
+    assert regression.sign_flip_pvalue([5, 6, 4, 7, 5, 6, 5, 4]) < 0.01
+    assert regression.sign_flip_pvalue([0, 0, 0]) == 1.0
+    assert regression.sign_flip_pvalue([3, -3, 2, -2]) == 1.0
+    assert regression.sign_flip_pvalue([4]) is None
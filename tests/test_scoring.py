@@ -0,0 +1,73 @@
+# tests/test_scoring.py
+"""Judge-reply parsing: fences, prose, trailing commas, cut-off replies and loose score formats."""
+import json
+
+import pytest
+
+from scoring import DIMENSIONS, ScorecardError, complete_scorecard, parse_scorecard, safe_parse_json
+
+def _card(scores=(4, 3, 5, 2, 4)) -> dict:
+    card = {d: {"score": s, "justification": f"{d} note."} for d, s in zip(DIMENSIONS, scores)}
+    card["overall_summary"] = "Solid."
+    return card
+
+def _scores(card: dict) -> list:
+    return [card[d]["score"] for d in DIMENSIONS]
+
+def test_fenced_reply():
+    text = "```json\n" + json.dumps(_card(), indent=2) + "\n```"
+    assert _scores(safe_parse_json(text)) == [4, 3, 5, 2, 4]
+
+def test_prose_around_the_object():
+    text = "Here is my evaluation of the response:\n" + json.dumps(_card()) + "\nLet me know if you need more."
+    card = safe_parse_json(text)
+    assert _scores(card) == [4, 3, 5, 2, 4]
+    assert card["overall_summary"] == "Solid."
+
+def test_quoted_object_before_the_scorecard():
+    text = 'The rubric example {"note": 1} is not the answer. ' + json.dumps(_card())
+    assert _scores(safe_parse_json(text)) == [4, 3, 5, 2, 4]
+
+def test_trailing_commas():
+    text = json.dumps(_card(), indent=2).replace('"\n  }', '",\n  }').replace("}\n}", "},\n}")
+    assert ",\n  }" in text
+    assert _scores(safe_parse_json(text)) == [4, 3, 5, 2, 4]
+
+def test_truncated_reply_keeps_the_parsed_dimensions():
+    full = json.dumps(_card(), indent=2)
+    cut = full[:full.index('"bias_awareness"') + len('"bias_awareness": {"sc')]
+    with pytest.raises(ScorecardError) as info:
+        safe_parse_json(cut)
+    err = info.value
+    assert set(err.errors) == {"bias_awareness", "failure_handling"}
+    assert [err.partial[d]["score"] for d in DIMENSIONS[:3]] == [4, 3, 5]
+
+    # a re-ask for just the missing dimensions completes the card
+    patch = json.dumps({"bias_awareness": {"score": 2, "justification": "x"}, "failure_handling": {"score": 4, "justification": "y"}})
+    assert _scores(complete_scorecard(err, patch)) == [4, 3, 5, 2, 4]
+
+@pytest.mark.parametrize("raw, expected", [(4, 4), ("4/5", 4), (" 3 / 5 ", 3), ("5", 5), (3.5, 4), ("2.0/5.0", 2)])
+def test_loose_score_formats(raw, expected):
+    card, errors = parse_scorecard({d: {"score": raw} for d in DIMENSIONS})
+    assert errors == {}
+    assert _scores(card) == [expected] * len(DIMENSIONS)
+
+def test_bare_scores_and_loose_keys():
+    data = {"Reasoning Quality": 4, "decision-consistency": "3/5", "collaborationMindset": {"score": 5}, "BIAS_AWARENESS": 2, "failure handling": 4}
+    card, errors = parse_scorecard(data)
+    assert errors == {}
+    assert _scores(card) == [4, 3, 5, 2, 4]
+    assert card["overall_summary"] == ""
+
+@pytest.mark.parametrize("raw", [0, 6, "great", True, None])
+def test_bad_scores_are_reported_per_dimension(raw):
+    data = _card()
+    data["bias_awareness"] = {"score": raw}
+    with pytest.raises(ScorecardError) as info:
+        safe_parse_json(json.dumps(data))
+    assert list(info.value.errors) == ["bias_awareness"]
+
+def test_no_json_at_all():
+    with pytest.raises(ScorecardError) as info:
+        safe_parse_json("I cannot evaluate this response.")
+    assert set(info.value.errors) == set(DIMENSIONS)
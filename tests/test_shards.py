@@ -0,0 +1,78 @@
+# tests/test_shards.py
+"""Sharded sweeps: restarts skip checkpointed cells, and merge imports each cell exactly once."""
+import pytest
+
+import shards
+import storage
+from prompts import AGENT_PROFILES, DEFAULT_SCENARIOS
+
+SPEC = {
+    "scenarios": list(DEFAULT_SCENARIOS)[:2],
+    "personas": list(AGENT_PROFILES)[:2],
+    "temperatures": [0.0],
+    "repeats": 2,
+    "model": "local:rules",
+    "judge_model": "local:rules",
+    "concurrency": 4,
+}
+
+@pytest.fixture
+def sweeps(monkeypatch, run_store):
+    monkeypatch.setattr(shards, "SWEEPS_DIR", run_store / "sweeps")
+    return run_store / "sweeps"
+
+def test_shards_split_the_matrix_without_overlap():
+    cells = shards.cells_from_spec(SPEC)
+    parts = [shards.shard_cells(cells, i, 3) for i in range(3)]
+    keys = [shards.cell_key(c) for part in parts for c in part]
+    assert sorted(keys) == sorted(shards.cell_key(c) for c in cells)
+    assert len(set(keys)) == len(cells) == 8
+
+def test_restart_skips_completed_cells(sweeps):
+    sid = shards.sweep_id(SPEC)
+    first = shards.run_shard(SPEC, 0, 2)
+    assert first["errors"] == 0 and first["skipped"] == 0
+    assert first["ran"] == first["cells"]
+    assert len(shards.completed(sid)) == first["cells"]
+
+    again = shards.run_shard(SPEC, 0, 2)
+    assert (again["ran"], again["skipped"]) == (0, first["cells"])
+
+    shards.run_shard(SPEC, 1, 2)
+    # a different shard count still sees every finished cell, whichever shard wrote it
+    regrouped = shards.run_shard(SPEC, 0, 1)
+    assert (regrouped["cells"], regrouped["skipped"], regrouped["ran"]) == (8, 8, 0)
+    # shards only checkpoint; nothing reaches the run store before merge
+    assert storage.count_runs() == 0
+
+def test_merge_is_idempotent(sweeps):
+    shards.run_shard(SPEC, 0, 1)
+    sid = shards.sweep_id(SPEC)
+
+    merged = shards.merge(sid)
+    assert (merged["cells"], merged["imported"], merged["already_imported"]) == (8, 8, 0)
+    assert shards.merge(sid)["imported"] == 0
+    assert storage.count_runs() == 8
+
+def test_merge_resumes_after_a_crash_without_duplicates(sweeps, monkeypatch):
+    shards.run_shard(SPEC, 0, 1)
+    sid = shards.sweep_id(SPEC)
+    real_save = shards.save_run
+    calls = []
+
+    def crash_after_third_save(payload, run_id=None):
+        calls.append(run_id)
+        saved = real_save(payload, run_id=run_id)
+        if len(calls) == 3:
+            raise KeyboardInterrupt  # killed after the row landed, before the merge moved on
+        return saved
+
+    monkeypatch.setattr(shards, "save_run", crash_after_third_save)
+    with pytest.raises(KeyboardInterrupt):
+        shards.merge(sid)
+    assert storage.count_runs() == 3
+
+    monkeypatch.setattr(shards, "save_run", real_save)
+    resumed = shards.merge(sid)
+    assert (resumed["imported"], resumed["already_imported"]) == (5, 3)
+    assert storage.count_runs() == 8
@@ -0,0 +1,62 @@
+# tests/test_storage.py
+"""Indexed run store: save/load/query round-trip and the one-shot import of legacy JSON runs."""
+import json
+
+import pytest
+
+import storage
+
+def _payload(scenario_key="s1", persona="Analytical", temperature=0.0, overall=72.0, rank="B", **extra) -> dict:
+    return {
+        "scenario_key": scenario_key,
+        "persona": persona,
+        "temperature": temperature,
+        "overall_100": overall,
+        "rank": rank,
+        "agent_response": "An answer. " * 40,
+        "scores_100": {"reasoning_quality": overall},
+        **extra,
+    }
+
+def test_save_load_round_trip(run_store):
+    payload = _payload(notes={"nested": [1, 2, 3]})
+    run_id = storage.save_run(payload)
+    assert storage.load_run(run_id) == payload
+    # text=False leaves blob stubs for the long texts
+    assert storage.load_run(run_id, text=False)["agent_response"].keys() == {"$blob"}
+    with pytest.raises(KeyError):
+        storage.load_run("no-such-run")
+
+def test_query_filters_and_order(run_store):
+    ids = [
+        storage.save_run(_payload("s1", "Analytical", 0.0, 80.0, "A")),
+        storage.save_run(_payload("s1", "Cautious", 0.7, 55.0, "C")),
+        storage.save_run(_payload("s2", "Analytical", 0.7, 65.0, "B")),
+    ]
+    rows = storage.query_runs()
+    assert [r["run_id"] for r in rows] == ids[::-1]  # newest first
+    assert storage.list_runs(persona="Analytical") == [r["run_id"] for r in rows if r["persona"] == "Analytical"]
+    assert [r["scenario_key"] for r in storage.query_runs(temperature=0.7)] == ["s2", "s1"]
+    assert [r["overall_100"] for r in storage.query_runs(min_overall=60)] == [65.0, 80.0]
+    assert storage.count_runs(scenario_key="s1", max_overall=60) == 1
+    assert len(storage.query_runs(limit=2)) == 2
+    assert storage.query_runs(limit=2, offset=2)[0]["run_id"] == rows[2]["run_id"]
+
+def test_revision_grows_with_every_write(run_store):
+    before = storage.revision()
+    storage.save_run(_payload())
+    assert storage.revision() > before
+
+def test_legacy_json_runs_are_imported_once(run_store):
+    legacy = {"1700000000-abc": _payload("s9", overall=40.0, rank="D"), "1700000100": _payload("s9", overall=90.0, rank="A")}
+    for run_id, payload in legacy.items():
+        (run_store / f"{run_id}.json").write_text(json.dumps(payload), encoding="utf-8")
+
+    # the first connection to a fresh store imports them
+    rows = storage.query_runs(scenario_key="s9")
+    assert [r["run_id"] for r in rows] == ["1700000100", "1700000000-abc"]
+    assert [r["ts"] for r in rows] == [1700000100.0, 1700000000.0]
+    assert storage.load_run("1700000000-abc") == legacy["1700000000-abc"]
+
+    assert storage.migrate_json_runs(run_store) == 0
+    assert storage.count_runs() == 2
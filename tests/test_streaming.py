@@ -0,0 +1,44 @@
+# tests/test_streaming.py
+"""generate_text_stream: chunks as they arrive, TTFT/latency/token metrics, one-chunk cache hits."""
+from gemini_client import generate_text, generate_text_stream
+
+def test_stream_yields_chunks_and_fills_metrics(fake_client):
+    metrics = {}
+    chunks = list(generate_text_stream("sys", "user", temperature=0.3, metrics=metrics))
+
+    assert len(chunks) == fake_client.chunks
+    assert "".join(chunks) == fake_client.reply
+    assert metrics["model"] == "gemini-2.0-flash"
+    assert metrics["cached"] is False
+    assert metrics["ttft_s"] is not None and metrics["latency_s"] is not None
+    assert 0.0 <= metrics["ttft_s"] <= metrics["latency_s"]
+    # token counts come from the final chunk's usage metadata
+    assert (metrics["input_tokens"], metrics["output_tokens"]) == (11, 7)
+
+def test_ttft_is_set_before_the_stream_ends(fake_client):
+    metrics = {}
+    stream = generate_text_stream("sys", "user", temperature=0.3, metrics=metrics)
+    next(stream)
+    assert metrics["ttft_s"] is not None
+    assert metrics["latency_s"] is None
+    list(stream)
+    assert metrics["latency_s"] >= metrics["ttft_s"]
+
+def test_cache_hit_is_one_chunk(fake_client, response_cache):
+    first = {}
+    assert "".join(generate_text_stream("sys", "user", temperature=0, metrics=first)) == fake_client.reply
+    assert first["cached"] is False
+
+    again = {}
+    chunks = list(generate_text_stream("sys", "user", temperature=0, metrics=again))
+    assert chunks == [fake_client.reply]
+    assert again["cached"] is True
+    assert again["ttft_s"] is not None and again["latency_s"] is not None
+    assert len(fake_client.instances[0].calls) == 1
+
+def test_stream_and_generate_share_cache_entries(fake_client, response_cache):
+    text = generate_text("sys", "user", temperature=0)
+    metrics = {}
+    assert list(generate_text_stream("sys", "user", temperature=0, metrics=metrics)) == [text]
+    assert metrics["cached"] is True
+    assert [c[0] for c in fake_client.instances[0].calls] == ["generate"]
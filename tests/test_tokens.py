@@ -0,0 +1,31 @@
+# tests/test_tokens.py
+"""Output caps: `max_output_tokens` splits the cache key; uncapped calls keep their old keys."""
+from cache import cache_key
+from gemini_client import cache_lookup, generate_text
+
+def _key(**kw):
+    _, key, _ = cache_lookup("sys", "user", **kw)
+    return key
+
+def test_max_output_tokens_splits_the_key(response_cache):
+    uncapped = _key(temperature=0.0)
+    capped = _key(temperature=0.0, max_output_tokens=256)
+    assert capped != uncapped
+    assert capped != _key(temperature=0.0, max_output_tokens=512)
+    assert uncapped == cache_key("gemini-2.0-flash", "sys", "user", 0.0, 0)
+    assert capped == cache_key("gemini-2.0-flash|max_output_tokens=256", "sys", "user", 0.0, 0)
+
+def test_capped_and_uncapped_calls_do_not_share_replies(fake_client, response_cache):
+    fake_client.reply = "full reply"
+    assert generate_text("sys", "user", temperature=0) == "full reply"
+    fake_client.reply = "short"
+    assert generate_text("sys", "user", temperature=0, max_output_tokens=16) == "short"
+
+    metrics = {}
+    assert generate_text("sys", "user", temperature=0, metrics=metrics) == "full reply"
+    assert metrics["cached"] is True
+    assert generate_text("sys", "user", temperature=0, max_output_tokens=16, metrics=metrics) == "short"
+    assert metrics["cached"] is True
+
+    configs = [c[2] for c in fake_client.instances[0].calls]
+    assert configs == [{"temperature": 0.0}, {"temperature": 0.0, "max_output_tokens": 16}]
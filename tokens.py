@@ -0,0 +1,195 @@
+# tokens.py
+"""Local token counting, per-stage token budgets and deterministic judge-input compaction.
+
+Counts come from tiktoken (o200k_base, or AGENTEVAL_TOKENIZER) when it is
+installed and its encoding is available, else from a word-piece estimator
+tuned to BPE tokenizers on English text. Either way nothing is sent to count.
+
+Budgets, in tokens, per stage (override any key with a "budgets" dict in a
+sweep spec or the engine's `budgets=`):
+
+    agent_input    system + user prompt to the agent; over budget raises TokenBudgetError
+    agent_output   max_output_tokens for the agent; None uses the persona's AGENT_OUTPUT_TOKENS
+    judge_input    system + user prompt to the judge; an oversized response is compacted to fit
+                   (a pairwise prompt splits it evenly between its two responses)
+    judge_output   max_output_tokens for each judge call (per response in a batch)
+    history        conversation each turn of a multi-turn episode sees (see episodes.py); older agent turns are compacted
+
+Compaction is a pure function of (text, budget). Paragraphs and list items
+are taken alternately from both ends (the decision up front, the risks at the
+end), first as their lead sentences, then whole, while they fit; the middle
+goes first. Omitted spans are marked "[…]".
+The judge scores the compacted text; the payload keeps the full response and
+records what was cut under payload["tokens"]["compaction"].
+"""
+import hashlib
+import math
+import os
+import re
+from functools import lru_cache
+
+from prompts import AGENT_OUTPUT_TOKENS
+
+try:
+    import tiktoken
+except ImportError:  # optional: the estimator below needs nothing
+    tiktoken = None
+
+DEFAULT_BUDGETS = {"agent_input": 6000, "agent_output": None, "judge_input": 8000, "judge_output": 1536, "history": 3000}
+DEFAULT_AGENT_OUTPUT = 1200  # personas without an AGENT_OUTPUT_TOKENS entry
+MIN_RESPONSE_TOKENS = 200    # compaction floor when the scenario alone nearly fills the judge budget
+OMITTED = "[…]"
+
+class TokenBudgetError(ValueError):
+    """A prompt is over its stage budget and cannot be compacted (e.g. a very long scenario)."""
+
+# ------------------ COUNTING ------------------
+@lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(os.getenv("AGENTEVAL_TOKENIZER", "o200k_base"))
+    except Exception:  # encodings are downloaded on first use; offline hosts fall back to the estimate
+        return None
+
+def counter_name() -> str:
+    enc = _encoding()
+    return f"tiktoken:{enc.name}" if enc is not None else "estimate"
+
+# letters, digits, single symbols; whitespace is mostly absorbed into the following word piece
+_PIECES = re.compile(r"[A-Za-z]+|\d+|\n+|[^\sA-Za-z\d]")
+
+def estimate_tokens(text: str) -> int:
+    """BPE-like estimate: ~1 token per 6 letters of a word, per 3 digits, per symbol or newline run."""
+    n = 0
+    for piece in _PIECES.findall(text):
+        c = piece[0]
+        if c.isascii() and c.isalpha():
+            n += math.ceil(len(piece) / 6)
+        elif c.isdigit():
+            n += math.ceil(len(piece) / 3)
+        else:
+            n += 1
+    return n
+
+@lru_cache(maxsize=1024)
+def count_tokens(text: str) -> int:
+    """Tokens in `text`; cached, since scenarios and templates are counted once per cell."""
+    enc = _encoding()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return estimate_tokens(text)
+
+# ------------------ BUDGETS ------------------
+def resolve_budgets(overrides: dict | None = None) -> dict:
+    unknown = set(overrides or {}) - set(DEFAULT_BUDGETS)
+    if unknown:
+        raise ValueError(f"Unknown budget(s) {sorted(unknown)}; known: {', '.join(DEFAULT_BUDGETS)}")
+    return {**DEFAULT_BUDGETS, **(overrides or {})}
+
+def agent_output_tokens(persona: str, budgets: dict) -> int:
+    return int(budgets.get("agent_output") or AGENT_OUTPUT_TOKENS.get(persona, DEFAULT_AGENT_OUTPUT))
+
+def check_input(stage: str, *texts: str, budgets: dict) -> int:
+    """Token count of a prompt; TokenBudgetError when it is over the stage's input budget."""
+    n = sum(count_tokens(t) for t in texts)
+    limit = budgets.get(f"{stage}_input")
+    if limit is not None and n > limit:
+        raise TokenBudgetError(f"{stage} prompt is {n} tokens, over its {limit}-token budget")
+    return n
+
+# ------------------ COMPACTION ------------------
+# blank lines, or a new line that starts a bullet / numbered item
+_BLOCKS = re.compile(r"\n\s*\n|\n(?=\s*(?:[-*•]|\d+[.)])\s)")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+LEAD_MIN_WORDS = 12  # so "1." or "Decision: pause." is not a whole lead
+
+def _lead(block: str) -> str:
+    """Opening sentences of a block, at least LEAD_MIN_WORDS words (or the whole block)."""
+    lead, words = [], 0
+    for sentence in _SENTENCE_END.split(block.strip()):
+        lead.append(sentence)
+        words += len(sentence.split())
+        if words >= LEAD_MIN_WORDS:
+            break
+    return " ".join(lead)
+
+def _clip(text: str, max_tokens: int) -> str:
+    """Longest word prefix of `text` within max_tokens (binary search over word boundaries)."""
+    words = text.split(" ")
+    lo, hi = 0, len(words)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(" ".join(words[:mid])) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return " ".join(words[:lo])
+
+def compact(text: str, max_tokens: int) -> tuple[str, dict | None]:
+    """`text` cut to at most max_tokens, deterministically; (text, None) when it already fits."""
+    original = count_tokens(text)
+    if original <= max_tokens:
+        return text, None
+    blocks = [b.strip() for b in _BLOCKS.split(text) if b.strip()]
+    marker = count_tokens(OMITTED) + 1
+    leads = [_lead(b) for b in blocks]
+    cost_full = [count_tokens(b) + 1 for b in blocks]
+    cost_lead = [count_tokens(l) + 1 + (marker if l != b else 0) for l, b in zip(leads, blocks)]
+
+    # blocks alternately from the start and the end: the decision and the closing risks go first, the middle last
+    order = list(dict.fromkeys(i for pair in zip(range(len(blocks)), reversed(range(len(blocks)))) for i in pair))
+    # 1) lead sentences while they fit, 2) then whole blocks in the same order
+    level = ["drop"] * len(blocks)
+    room = max_tokens
+    for i in order:
+        if cost_lead[i] > room:
+            break
+        level[i] = "lead"
+        room -= cost_lead[i]
+    for i in order:
+        if level[i] == "lead":
+            extra = cost_full[i] - cost_lead[i]
+            if extra <= room:
+                level[i] = "full"
+                room -= extra
+
+    out, gap = [], False
+    for b, l, lv in zip(blocks, leads, level):
+        if lv == "drop":
+            gap = True
+            continue
+        if gap:
+            out.append(OMITTED)
+            gap = False
+        out.append(b if lv == "full" else (l if l == b else f"{l} {OMITTED}"))
+    if gap:
+        out.append(OMITTED)
+    result = "\n\n".join(out)
+    if not any(lv != "drop" for lv in level) or count_tokens(result) > max_tokens:
+        # not even the first lead sentence fits (or join overhead tipped it over): hard word cut
+        result = _clip(text, max_tokens - marker) + f" {OMITTED}"
+
+    return result, {
+        "method": "lead-sentences+ends",
+        "budget": max_tokens,
+        "original_tokens": original,
+        "compacted_tokens": count_tokens(result),
+        "blocks": len(blocks),
+        "blocks_full": level.count("full"),
+        "blocks_lead": level.count("lead"),
+        "blocks_dropped": level.count("drop"),
+        "original_sha256": hashlib.sha256(text.encode("utf-8")).hexdigest(),
+    }
+
+def fit_response(prompt_without_response: str, response: str, budgets: dict, share: int = 1) -> tuple[str, dict | None]:
+    """Compact `response` so prompt + response stays inside the judge_input budget.
+
+    `share` > 1 is for prompts that embed that many responses (pairwise judging): each gets 1/share of the room.
+    """
+    limit = budgets.get("judge_input")
+    if limit is None:
+        return response, None
+    room = max(MIN_RESPONSE_TOKENS, (limit - count_tokens(prompt_without_response)) // share)
+    return compact(response, room)
@@ -0,0 +1,290 @@
+# tracing.py
+"""Per-run spans (format → agent → judge → parse → persist) with token and cost accounting.
+
+A span is a plain dict, so it can be handed straight to generate_text as its
+`metrics` argument and come back filled with model, token counts, cache hit
+and latency:
+
+    trace = Trace()
+    with trace.span("agent") as s:
+        text = generate_text(..., metrics=s)
+    payload["trace"] = trace.to_dict()
+    export(trace)
+
+Finished traces go to every configured sink. AGENTEVAL_TRACE_SINKS picks them
+from the environment, comma-separated:
+    jsonl   runs/traces.jsonl, one trace per line (AGENTEVAL_TRACE_PATH)
+    otlp    runs/traces.otlp.jsonl in OTLP/JSON, readable by an OpenTelemetry
+            collector's otlpjsonfile receiver (AGENTEVAL_OTLP_PATH)
+    otel    the opentelemetry-api tracer, if that package is installed
+"""
+import asyncio
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+# USD per 1M tokens (input, output), matched by model-name prefix; longest prefix wins.
+# List prices at the time of writing; override with AGENTEVAL_PRICING='{"model": [in, out]}'.
+PRICING = {
+    "gemini-2.5-pro": (1.25, 10.00),
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-1.5-pro": (1.25, 5.00),
+    "gemini-1.5-flash": (0.075, 0.30),
+    "local:": (0.0, 0.0),      # in-process models cost no API spend
+    "llamacpp:": (0.0, 0.0),
+}
+if os.getenv("AGENTEVAL_PRICING"):
+    PRICING.update({k: tuple(v) for k, v in json.loads(os.environ["AGENTEVAL_PRICING"]).items()})
+
+STAGES = ("format", "agent", "stakeholder", "judge", "reask", "parse", "persist")
+
+# innermost open span of this thread / asyncio task, so nested spans get a parent
+_current: ContextVar = ContextVar("agenteval_span", default=None)
+
+def cost_usd(model: str | None, input_tokens: int | None, output_tokens: int | None) -> float | None:
+    """Estimated list-price cost of one call; None for unknown models."""
+    if not model:
+        return None
+    matches = [p for p in PRICING if model.startswith(p)]
+    if not matches:
+        return None
+    price_in, price_out = PRICING[max(matches, key=len)]
+    return ((input_tokens or 0) * price_in + (output_tokens or 0) * price_out) / 1_000_000
+
+class Trace:
+    """Spans of one run; safe to add spans from several threads."""
+
+    def __init__(self, name: str = "run", **attrs):
+        self.trace_id = secrets.token_hex(16)
+        self.name = name
+        self.attrs = attrs
+        self.start = time.time()
+        self.spans: list[dict] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """Time a block; the yielded dict is the span and may be filled in (e.g. as generate_text metrics).
+
+        A span opened inside another gets `parent_id`, and the parent's `self_s`
+        excludes it, so a re-ask made while parsing is not billed to parse.
+        """
+        parent = _current.get()
+        s = {"name": name, "span_id": secrets.token_hex(8), "start": time.time(), **attrs}
+        if parent is not None:
+            s["parent_id"] = parent["span_id"]
+        token = _current.set(s)
+        t0 = time.perf_counter()
+        try:
+            yield s
+        except asyncio.CancelledError:
+            s["cancelled"] = True  # e.g. an ensemble judge stopped early: not an error
+            raise
+        except BaseException as e:
+            s["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current.reset(token)
+            s["duration_s"] = time.perf_counter() - t0
+            s["self_s"] = s["duration_s"] - s.pop("_children_s", 0.0)
+            if parent is not None:
+                parent["_children_s"] = parent.get("_children_s", 0.0) + s["duration_s"]
+            s.setdefault("retries", 0)
+            if s.get("input_tokens") is not None or s.get("output_tokens") is not None:
+                s["cost_usd"] = None if s.get("cached") else cost_usd(s.get("model"), s.get("input_tokens"), s.get("output_tokens"))
+            with self._lock:
+                self.spans.append(s)
+
+    def totals(self) -> dict:
+        spans = list(self.spans)
+        costs = [s["cost_usd"] for s in spans if s.get("cost_usd") is not None]
+        return {
+            "duration_s": max((s["start"] + s["duration_s"] for s in spans), default=self.start) - self.start,
+            "input_tokens": sum(s.get("input_tokens") or 0 for s in spans),
+            "output_tokens": sum(s.get("output_tokens") or 0 for s in spans),
+            "cost_usd": sum(costs) if costs else None,
+            "retries": sum(s.get("retries") or 0 for s in spans),
+            "cache_hits": sum(1 for s in spans if s.get("cached")),
+            "errors": sum(1 for s in spans if s.get("error")),
+            "cancelled": sum(1 for s in spans if s.get("cancelled")),
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "start": self.start,
+            "attrs": self.attrs,
+            "spans": list(self.spans),
+            "totals": self.totals(),
+        }
+
+def find_span(trace: dict | None, name: str) -> dict:
+    """First span called `name` in a saved trace, or {}."""
+    return next((s for s in (trace or {}).get("spans", []) if s["name"] == name), {})
+
+def stage_summary(trace: dict | None) -> dict:
+    """{stage: self time, wall time, tokens, cost, calls, retries, cache hits} summed over a trace's spans."""
+    out = {}
+    for s in (trace or {}).get("spans", []):
+        row = out.setdefault(s["name"], {
+            "spans": 0, "self_s": 0.0, "duration_s": 0.0, "input_tokens": 0, "output_tokens": 0,
+            "cost_usd": 0.0, "retries": 0, "cache_hits": 0,
+        })
+        row["spans"] += 1
+        row["self_s"] += s.get("self_s", s.get("duration_s", 0.0))
+        row["duration_s"] += s.get("duration_s", 0.0)
+        row["input_tokens"] += s.get("input_tokens") or 0
+        row["output_tokens"] += s.get("output_tokens") or 0
+        row["cost_usd"] += s.get("cost_usd") or 0.0
+        row["retries"] += s.get("retries") or 0
+        row["cache_hits"] += 1 if s.get("cached") else 0
+    return out
+
+# ------------------ SINKS ------------------
+class JsonlSink:
+    """One JSON trace per line."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def export(self, trace: dict) -> None:
+        line = json.dumps(trace, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+def _otlp_value(v) -> dict:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+_SPAN_FIELDS = {"name", "span_id", "parent_id", "start", "duration_s", "error"}
+
+def to_otlp(trace: dict) -> dict:
+    """A trace as an OTLP/JSON ExportTraceServiceRequest: a root span plus one child per stage."""
+    root_id = secrets.token_hex(8)
+    attrs = [{"key": f"agenteval.{k}", "value": _otlp_value(v)} for k, v in trace["attrs"].items() if v is not None]
+    end = trace["start"] + trace["totals"]["duration_s"]
+    spans = [{
+        "traceId": trace["trace_id"],
+        "spanId": root_id,
+        "name": trace["name"],
+        "kind": 1,
+        "startTimeUnixNano": str(int(trace["start"] * 1e9)),
+        "endTimeUnixNano": str(int(end * 1e9)),
+        "attributes": attrs + [
+            {"key": f"agenteval.{k}", "value": _otlp_value(v)} for k, v in trace["totals"].items() if v is not None
+        ],
+    }]
+    for s in trace["spans"]:
+        span = {
+            "traceId": trace["trace_id"],
+            "spanId": s["span_id"],
+            "parentSpanId": s.get("parent_id") or root_id,
+            "name": s["name"],
+            "kind": 3 if s["name"] in ("agent", "stakeholder", "judge", "reask") else 1,  # CLIENT for model calls
+            "startTimeUnixNano": str(int(s["start"] * 1e9)),
+            "endTimeUnixNano": str(int((s["start"] + s["duration_s"]) * 1e9)),
+            "attributes": [
+                {"key": f"agenteval.{k}", "value": _otlp_value(v)} for k, v in s.items() if k not in _SPAN_FIELDS and v is not None
+            ],
+        }
+        if s.get("error"):
+            span["status"] = {"code": 2, "message": s["error"]}
+        spans.append(span)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "agenteval"}}]},
+        "scopeSpans": [{"scope": {"name": "agenteval.tracing"}, "spans": spans}],
+    }]}
+
+class OtlpJsonSink(JsonlSink):
+    """OTLP/JSON lines, the format of the OpenTelemetry collector's file exporter/receiver."""
+
+    def export(self, trace: dict) -> None:
+        super().export(to_otlp(trace))
+
+def _ns(t: float) -> int:
+    return int(t * 1e9)
+
+class OtelSink:
+    """Replays finished traces through the opentelemetry-api tracer (optional dependency)."""
+
+    def __init__(self):
+        from opentelemetry import trace as otel_trace  # lazy: only needed when this sink is configured
+        self._otel = otel_trace
+        self._tracer = otel_trace.get_tracer("agenteval.tracing")
+
+    def export(self, trace: dict) -> None:
+        end = trace["start"] + trace["totals"]["duration_s"]
+        root = self._tracer.start_span(trace["name"], start_time=_ns(trace["start"]), attributes={
+            f"agenteval.{k}": v for k, v in {**trace["attrs"], **trace["totals"]}.items() if v is not None
+        })
+        ctx = self._otel.set_span_in_context(root)
+        for s in trace["spans"]:
+            child = self._tracer.start_span(s["name"], context=ctx, start_time=_ns(s["start"]), attributes={
+                f"agenteval.{k}": v for k, v in s.items()
+                if k not in _SPAN_FIELDS and isinstance(v, (str, bool, int, float))
+            })
+            if s.get("error"):
+                child.set_status(self._otel.Status(self._otel.StatusCode.ERROR, s["error"]))
+            child.end(end_time=_ns(s["start"] + s["duration_s"]))
+        root.end(end_time=_ns(end))
+
+_SINKS: list = []
+_SINKS_LOCK = threading.Lock()
+_configured = False
+
+def add_sink(sink) -> None:
+    with _SINKS_LOCK:
+        _SINKS.append(sink)
+
+def clear_sinks() -> None:
+    global _configured
+    with _SINKS_LOCK:
+        _SINKS.clear()
+        _configured = True  # an explicit setup wins over the environment
+
+def _configure_from_env() -> None:
+    global _configured
+    with _SINKS_LOCK:
+        if _configured:
+            return
+        _configured = True
+        names = [n.strip() for n in os.getenv("AGENTEVAL_TRACE_SINKS", "").split(",") if n.strip()]
+        for n in names:
+            if n == "jsonl":
+                _SINKS.append(JsonlSink(os.getenv("AGENTEVAL_TRACE_PATH", "runs/traces.jsonl")))
+            elif n == "otlp":
+                _SINKS.append(OtlpJsonSink(os.getenv("AGENTEVAL_OTLP_PATH", "runs/traces.otlp.jsonl")))
+            elif n == "otel":
+                try:
+                    _SINKS.append(OtelSink())
+                except ImportError:
+                    pass
+
+def export(trace: Trace | dict) -> None:
+    """Send a finished trace to every sink; a failing sink never fails the run."""
+    _configure_from_env()
+    data = trace.to_dict() if isinstance(trace, Trace) else trace
+    with _SINKS_LOCK:
+        sinks = list(_SINKS)
+    for sink in sinks:
+        try:
+            sink.export(data)
+        except Exception:
+            pass